@@ -1,10 +1,15 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Student, LibraryHistory, FeeHistory
+from .authentication import revoke_user_tokens
+from .cache import CacheVersionAdminMixin
+from .counters import StudentCountersAdminMixin
+from .models import User, Student, LibraryHistory, LibraryHistoryArchive, FeeHistory, FeeHistoryArchive, Job
+from .search import FullTextSearchAdminMixin
+from .summaries import FeeSummaryAdminMixin
 
 
 # Customize User admin
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(FeeSummaryAdminMixin, CacheVersionAdminMixin, UserAdmin):
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
         ('Personal Info', {'fields': ('first_name', 'last_name', 'email')}),
@@ -15,29 +20,89 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ('user_type', 'is_active', 'is_staff')
     search_fields = ('username', 'email', 'first_name', 'last_name')
     ordering = ('-date_joined',)
+    cache_models = ('user', 'student')
+    student_lookup = 'user'
+
+    # Stateless tokens carry user_type, so role changes and deletes must revoke them
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and {'user_type', 'is_active'} & set(form.changed_data):
+            revoke_user_tokens(obj.pk)
+
+    def delete_model(self, request, obj):
+        revoke_user_tokens(obj.pk)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        revoke_user_tokens(*queryset.values_list('pk', flat=True))
+        super().delete_queryset(request, queryset)
 
 
 # Customize Student admin
-class StudentAdmin(admin.ModelAdmin):
-    list_display = ('id','name', 'roll_number', 'class_name', 'user')
+class StudentAdmin(FeeSummaryAdminMixin, FullTextSearchAdminMixin, CacheVersionAdminMixin, admin.ModelAdmin):
+    list_display = ('id','name', 'roll_number', 'class_name', 'user', 'active_loans', 'fees_paid', 'last_payment_date')
     search_fields = ('name', 'roll_number', 'class_name')
+    fts_search = (('pk', 'students'),)
     list_filter = ('class_name',)
+    list_select_related = ('user',)
+    cache_models = ('student', 'user')
 
 
 # Customize LibraryHistory admin
-class LibraryHistoryAdmin(admin.ModelAdmin):
+class LibraryHistoryAdmin(StudentCountersAdminMixin, FullTextSearchAdminMixin, admin.ModelAdmin):
     list_display = ('id','book_name', 'student', 'borrow_date', 'return_date', 'status')
     search_fields = ('book_name', 'student__name')
+    fts_search = (('pk', 'books'), ('student', 'students'))
     list_filter = ('status', 'borrow_date', 'return_date')
     ordering = ('-borrow_date',)
+    list_select_related = ('student',)
 
 
 # Customize FeeHistory admin
-class FeeHistoryAdmin(admin.ModelAdmin):
+class FeeHistoryAdmin(StudentCountersAdminMixin, admin.ModelAdmin):
     list_display = ('id','student', 'fee_type', 'amount', 'payment_date', 'remarks', 'created_at', 'updated_at')
     search_fields = ('student__name', 'fee_type', 'remarks')
     list_filter = ('fee_type', 'payment_date')
     ordering = ('-payment_date',)
+    # The row checkbox label renders FeeHistory.__str__, which reaches student.user
+    list_select_related = ('student__user',)
+
+
+# Archived years (app.archive) are read-only
+class ArchiveAdmin(admin.ModelAdmin):
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class LibraryHistoryArchiveAdmin(ArchiveAdmin):
+    list_display = ('id', 'book_name', 'student', 'borrow_date', 'return_date', 'status')
+    list_filter = ('status', 'borrow_date')
+    ordering = ('-borrow_date',)
+    list_select_related = ('student',)
+
+
+class FeeHistoryArchiveAdmin(ArchiveAdmin):
+    list_display = ('id', 'student', 'fee_type', 'amount', 'payment_date', 'remarks')
+    list_filter = ('fee_type', 'payment_date')
+    ordering = ('-payment_date',)
+    list_select_related = ('student__user',)
+
+
+# Background jobs (app.jobs) are queued and updated by the API and the workers only
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'total', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    ordering = ('-id',)
+    list_select_related = ('created_by',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 # Register models with admin site
@@ -45,3 +110,6 @@ admin.site.register(User, CustomUserAdmin)
 admin.site.register(Student, StudentAdmin)
 admin.site.register(LibraryHistory, LibraryHistoryAdmin)
 admin.site.register(FeeHistory, FeeHistoryAdmin)
+admin.site.register(LibraryHistoryArchive, LibraryHistoryArchiveAdmin)
+admin.site.register(FeeHistoryArchive, FeeHistoryArchiveAdmin)
+admin.site.register(Job, JobAdmin)
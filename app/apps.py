@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+
+        from .changes import install_change_log
+        from .instrumentation import install_query_recorder
+        from .search import install_search_index
+
+        connection_created.connect(install_query_recorder, dispatch_uid='app.install_query_recorder')
+        post_migrate.connect(install_change_log, sender=self, dispatch_uid='app.install_change_log')
+        post_migrate.connect(install_search_index, sender=self, dispatch_uid='app.install_search_index')
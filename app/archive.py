@@ -0,0 +1,106 @@
+"""
+Hot/archive split of the record tables.
+
+Fee and library records of closed academic years are moved into
+FeeHistoryArchive / LibraryHistoryArchive, so the tables every list, admin
+changelist and index scan works on only hold the current year. Loans still
+out stay in the hot table whatever their date. The list endpoints read the
+archive only when asked with `?include_archive=true`.
+
+Rows keep their ids when they move, and FeeSummary already counts archived
+fees, so archiving leaves the summary report unchanged. Students' `fees_paid`
+only counts the current table and drops the archived amounts.
+"""
+import time
+from dataclasses import dataclass
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .counters import student_fees_archived
+from .models import FeeHistory, FeeHistoryArchive, LibraryHistory, LibraryHistoryArchive
+
+ARCHIVE_PARAM = 'include_archive'
+
+
+@dataclass
+class ArchivedTable:
+    name: str
+    model: type
+    archive_model: type
+    date_field: str  # rows dated before the cutoff are archived
+    condition: Q = Q()  # further rows to keep hot regardless of date
+    before_move: object = None  # called with each batch of ids inside its transaction
+
+
+TABLES = [
+    ArchivedTable('fees', FeeHistory, FeeHistoryArchive, 'payment_date', before_move=student_fees_archived),
+    ArchivedTable('library', LibraryHistory, LibraryHistoryArchive, 'borrow_date', Q(status='returned')),
+]
+
+ARCHIVE_MODELS = {table.model: table.archive_model for table in TABLES}
+
+
+def include_archive(request):
+    return request.query_params.get(ARCHIVE_PARAM, 'false').lower() == 'true'
+
+
+def record_sources(request, model, build):
+    """
+    [build(model)], plus build(archive model) with ?include_archive=true.
+    `build` returns the scoped, filtered queryset for either table.
+    """
+    if not include_archive(request):
+        return [build(model)]
+    return [build(model), build(ARCHIVE_MODELS[model])]
+
+
+def current_year_start(today=None):
+    """First day of the running academic year (ACADEMIC_YEAR_START_MONTH)."""
+    today = today or date.today()
+    start_month = getattr(settings, 'ACADEMIC_YEAR_START_MONTH', 6)
+    return date(today.year if today.month >= start_month else today.year - 1, start_month, 1)
+
+
+def _move(table, ids):
+    ops = connection.ops
+    columns = ', '.join(ops.quote_name(field.column) for field in table.model._meta.concrete_fields)
+    placeholders = ', '.join(['%s'] * len(ids))
+    source, target = ops.quote_name(table.model._meta.db_table), ops.quote_name(table.archive_model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {target} ({columns}) SELECT {columns} FROM {source} WHERE id IN ({placeholders})', ids)
+        cursor.execute(f'DELETE FROM {source} WHERE id IN ({placeholders})', ids)
+
+
+def archive_closed_years(before=None, batch_size=500, pause=0.0, progress=None):
+    """
+    Move records dated before `before` (default: the start of the current
+    academic year) to the archive tables, `batch_size` rows per transaction.
+    Returns {table name: rows moved}.
+    """
+    before = before or current_year_start()
+    batch_size = min(batch_size, 500)  # bound the number of query parameters
+    progress = progress or (lambda table, moved: None)
+    counts = {}
+    for table in TABLES:
+        pending = (
+            table.model.objects.filter(table.condition, **{f'{table.date_field}__lt': before})
+            .order_by(table.date_field, 'id').values_list('id', flat=True)
+        )
+        counts[table.name] = 0
+        while True:
+            with transaction.atomic():
+                ids = list(pending[:batch_size])
+                if ids:
+                    if table.before_move:
+                        table.before_move(ids)
+                    _move(table, ids)
+            if not ids:
+                break
+            counts[table.name] += len(ids)
+            progress(table.name, counts[table.name])
+            if pause:
+                time.sleep(pause)
+    return counts
@@ -0,0 +1,149 @@
+"""
+Async read endpoints for ASGI deployments. They mirror the GET paths of
+ManageStudents, ManageLibrary and ManageFees using Django's async ORM, so a
+request never parks a worker thread while it waits on the database. Lists
+build their querysets with the same helpers as the sync views and come in
+the same formats (see app.renderers). Writes stay on the DRF views in
+app.views.
+"""
+import json
+
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound, PermissionDenied
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .archive import record_sources
+from .authentication import authenticate_async
+from .conditional import anot_modified_response, joined_versions
+from .fieldsets import ValuesListing, requested_fields
+from .filters import filter_records, filter_students
+from .instrumentation import timed
+from .models import FeeHistory, LibraryHistory, Student
+from .pagination import KeysetPagination
+from .renderers import ColumnarJSONRenderer, NDJSONRenderer, alisting_response, rendered_response
+from .replica import replica_reads
+from .scoping import visible_records
+from .serializers import FeeHistorySerializer, LibrarySerializer, StudentSerializer
+
+
+def json_response(data, status=200, headers=None):
+    return HttpResponse(
+        json.dumps(data, cls=JSONEncoder), content_type='application/json', status=status, headers=headers,
+    )
+
+
+# LIST_RENDERERS without the browsable API, which needs a DRF view
+LIST_RENDERERS = [JSONRenderer, NDJSONRenderer, ColumnarJSONRenderer]
+
+
+class AsyncReadView(View):
+    http_method_names = ['get']
+    allowed_roles = ()
+    denied_message = ''
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Shared helpers read DRF-style query_params
+        request.query_params = request.GET
+        try:
+            with timed('auth'):
+                request.user = await authenticate_async(request)
+            if request.user.user_type not in self.allowed_roles:
+                raise PermissionDenied(self.denied_message)
+            with replica_reads():
+                return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            headers = None
+            if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+                headers = {'WWW-Authenticate': 'Bearer realm="api"'}
+            return json_response({'detail': exc.detail}, status=exc.status_code, headers=headers)
+
+    async def list_response(self, request, sources, serializer_class, ordering, conditional=True, joined=None):
+        """
+        `sources` holds one queryset per table the list reads (see
+        app.archive.record_sources); `joined` maps output fields read through
+        a join to their table's listing version (see app.conditional).
+        """
+        # Before the validators: the ETag depends on the format
+        request.accepted_renderer, request.accepted_media_type = DefaultContentNegotiation().select_renderer(
+            request, [renderer() for renderer in LIST_RENDERERS],
+        )
+        fields = requested_fields(request, serializer_class)
+        validators = None
+        if conditional:
+            versions = joined_versions(fields, joined or {})
+            not_modified, validators = await anot_modified_response(request, *sources, versions=versions)
+            if not_modified:
+                return not_modified
+
+        listing = ValuesListing(serializer_class, fields)
+        paginator = KeysetPagination(ordering)
+        if paginator.is_requested(request):
+            pages = [
+                [row async for row in paginator.get_page_queryset(listing.queryset(records, ordering), request)]
+                for records in sources
+            ]
+            data = paginator.get_paginated_data(listing.represent(paginator.merge_pages(pages)))
+            return rendered_response(request.accepted_renderer, data, headers=validators)
+        return await alisting_response(request, listing, sources, headers=validators)
+
+    async def detail(self, sources, pk):
+        for records in sources:
+            record = await records.filter(pk=pk).afirst()
+            if record is not None:
+                return record
+        return None
+
+
+class AsyncStudentsView(AsyncReadView):
+    allowed_roles = ('office_staff', 'librarian', 'admin')
+    denied_message = "You do not have permission to view student details."
+
+    async def get(self, request, pk=None):
+        if pk:
+            try:
+                student = await Student.objects.aget(pk=pk)
+            except Student.DoesNotExist:
+                raise NotFound("Student not found.")
+            return json_response(StudentSerializer(student, fields=requested_fields(request, StudentSerializer)).data)
+
+        students, ordering = filter_students(Student.objects.all(), request.GET)
+        return await self.list_response(request, [students], StudentSerializer, ordering, conditional=False)
+
+
+class AsyncLibraryView(AsyncReadView):
+    allowed_roles = ('student', 'office_staff', 'librarian', 'admin')
+    denied_message = "You do not have permission to view library records."
+
+    async def get(self, request, pk=None):
+        if pk:
+            record = await self.detail(record_sources(request, LibraryHistory, lambda model: visible_records(model, request.user)), pk)
+            if record is None:
+                raise NotFound("Library record not found.")
+            return json_response(LibrarySerializer(record, fields=requested_fields(request, LibrarySerializer)).data)
+
+        sources = record_sources(request, LibraryHistory, lambda model: filter_records(
+            visible_records(model, request.user), request.GET, 'borrow_date', fields=['student', 'status'],
+        ))
+        return await self.list_response(request, sources, LibrarySerializer, ('borrow_date', 'id'))
+
+
+class AsyncFeesView(AsyncReadView):
+    allowed_roles = ('student', 'office_staff', 'admin')
+    denied_message = "You do not have permission to view fee records."
+
+    async def get(self, request, pk=None):
+        if pk:
+            record = await self.detail(record_sources(
+                request, FeeHistory, lambda model: visible_records(model, request.user).select_related('student'),
+            ), pk)
+            if record is None:
+                raise NotFound("fee record not found.")
+            return json_response(FeeHistorySerializer(record, fields=requested_fields(request, FeeHistorySerializer)).data)
+
+        sources = record_sources(request, FeeHistory, lambda model: filter_records(
+            visible_records(model, request.user), request.GET, 'payment_date', fields=['student', 'fee_type'],
+        ))
+        return await self.list_response(request, sources, FeeHistorySerializer, ('payment_date', 'id'), joined={'student_name': 'student'})
@@ -0,0 +1,129 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotAuthenticated, NotFound
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import Student, User
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Issues tokens that carry what the views need to authorize a request."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # When the user signed in, to the microsecond; unlike iat (whole seconds)
+        # it is copied into the access tokens the refresh token mints
+        token['auth_time'] = token.current_time.timestamp()
+        token['username'] = user.username
+        token['user_type'] = user.user_type
+        token['student_id'] = Student.objects.filter(user=user).values_list('id', flat=True).first()
+        return token
+
+
+class ClaimsUser(TokenUser):
+    """A request user built from token claims; never touches the database."""
+
+    @cached_property
+    def user_type(self):
+        return self.token.get('user_type')
+
+    @cached_property
+    def student_id(self):
+        return self.token.get('student_id')
+
+
+def student_id_for(user):
+    """The caller's Student id: from the token claim when there is one, else one lookup."""
+    student_id = getattr(user, 'student_id', None)
+    if student_id is None:
+        student_id = Student.objects.filter(user_id=user.id).values_list('id', flat=True).first()
+    if student_id is None:
+        raise NotFound("Student profile not found for the current user.")
+    return student_id
+
+
+# Revocation
+
+def _denylist():
+    return caches[getattr(settings, 'JWT_DENYLIST_CACHE_ALIAS', 'default')]
+
+
+def revoke_token(token):
+    """Deny one token (by jti) until it would have expired anyway."""
+    ttl = max(1, int(token['exp'] - time.time()))
+    _denylist().set(f"jwt-deny:{token[api_settings.JTI_CLAIM]}", True, timeout=ttl)
+
+
+def revoke_user_tokens(*user_ids):
+    """Deny every token already issued to these users, e.g. after a role change or delete."""
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+    now = time.time()
+    _denylist().set_many({f'jwt-deny-before:{user_id}': now for user_id in user_ids}, timeout=int(lifetime.total_seconds()) + 1)
+
+
+def is_revoked(token):
+    """
+    Whether `token` was denied by jti, or was issued from a sign-in before
+    its user's tokens were revoked. Tokens without `auth_time` only have a
+    whole-second iat, so those from the second of the revocation are denied too.
+    """
+    jti_key = f"jwt-deny:{token.get(api_settings.JTI_CLAIM)}"
+    user_key = f"jwt-deny-before:{token.get(api_settings.USER_ID_CLAIM)}"
+    found = _denylist().get_many([jti_key, user_key])
+    if jti_key in found:
+        return True
+    if user_key not in found:
+        return False
+    revoked_at = found[user_key]
+    if 'auth_time' in token:
+        return token['auth_time'] < revoked_at
+    return token.get('iat', 0) <= revoked_at
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication without the per-request User SELECT. Tokens issued by
+    ClaimsTokenObtainPairSerializer authenticate as a ClaimsUser; older tokens
+    without the claims fall back to the database lookup. Both are checked
+    against the revocation denylist.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token):
+            raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+        return token
+
+    def get_user(self, validated_token):
+        if 'user_type' not in validated_token:
+            return super().get_user(validated_token)
+        return ClaimsUser(validated_token)
+
+
+async def authenticate_async(request):
+    """
+    Authenticate a plain Django request inside an async view. Claims tokens
+    need no I/O beyond the denylist; older tokens fall back to an async User
+    lookup.
+    """
+    backend = StatelessJWTAuthentication()
+    header = backend.get_header(request)
+    raw_token = backend.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        raise NotAuthenticated()
+    token = backend.get_validated_token(raw_token)
+    if 'user_type' in token:
+        return ClaimsUser(token)
+
+    user = await User.objects.filter(pk=token.get(api_settings.USER_ID_CLAIM), is_active=True).afirst()
+    if user is None:
+        raise AuthenticationFailed('User not found', code='user_not_found')
+    return user
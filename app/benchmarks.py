@@ -0,0 +1,248 @@
+"""
+In-process endpoint benchmarks. Every GET route in app.urls is requested as
+one user of each role through Django's test client, against whatever data
+the configured database holds (see `manage.py seed_data`). Results are plain
+JSON so two runs, e.g. from two commits, can be diffed with
+`manage.py benchmark --compare`.
+"""
+import inspect
+import logging
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+
+from . import urls
+from .authentication import ClaimsTokenObtainPairSerializer
+from .cache import listing_cache
+from .models import FeeHistory, LibraryHistory, Student, User
+from .scoping import visible_records
+
+ROLES = ('admin', 'office_staff', 'librarian', 'student')
+
+# Which sample row fills the <pk> of each detail route
+DETAIL_SAMPLES = {
+    'manage_student_detail': 'student',
+    'async_student_detail': 'student',
+    'manage_library_details': 'library',
+    'async_library_details': 'library',
+    'manage_fees_details': 'fee',
+    'async_fees_details': 'fee',
+}
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(percent / 100 * (len(values) - 1)))]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def routes():
+    """[(path template, url name)] for every route with a GET handler, in urls.py order."""
+    found = []
+    for pattern in urls.urlpatterns:
+        view_class = getattr(pattern.callback, 'view_class', None) if isinstance(pattern, URLPattern) else None
+        if view_class is None or not hasattr(view_class, 'get'):
+            continue
+        if pattern.pattern.converters and (
+            pattern.name not in DETAIL_SAMPLES or 'pk' not in inspect.signature(view_class.get).parameters
+        ):
+            # e.g. delete-users/<pk>/ shares ManageUsers but has no GET of its own
+            continue
+        found.append((f'/api/{pattern.pattern}', pattern.name))
+    return found
+
+
+def role_users():
+    """One active user per role; the student is the owner of the newest fee record."""
+    users = {role: User.objects.filter(user_type=role, is_active=True).order_by('id').first() for role in ROLES}
+    owner = FeeHistory.objects.order_by('-id').values_list('student__user_id', flat=True).first()
+    if owner is not None:
+        users['student'] = User.objects.filter(pk=owner, is_active=True).first() or users['student']
+    return {role: user for role, user in users.items() if user is not None}
+
+
+def sample_ids(student_user):
+    """Detail-route ids the student can see, so every role hits a real row."""
+    samples = {
+        'student': Student.objects.filter(user=student_user).values_list('id', flat=True).first(),
+        'library': visible_records(LibraryHistory, student_user).values_list('id', flat=True).first(),
+        'fee': visible_records(FeeHistory, student_user).values_list('id', flat=True).first(),
+    }
+    samples['student'] = samples['student'] or Student.objects.values_list('id', flat=True).first()
+    samples['library'] = samples['library'] or LibraryHistory.objects.values_list('id', flat=True).first()
+    samples['fee'] = samples['fee'] or FeeHistory.objects.values_list('id', flat=True).first()
+    return samples
+
+
+def _measure(client, path, headers, iterations, warmup, warm_cache):
+    def request():
+        if not warm_cache:
+            listing_cache().clear()
+        return client.get(path, headers=headers)
+
+    for _ in range(warmup):
+        request()
+
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = request()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    with ExitStack() as stack:
+        captured = [stack.enter_context(CaptureQueriesContext(connection)) for connection in connections.all()]
+        request()
+    queries = sum(len(context.captured_queries) for context in captured)
+
+    # Separate pass: tracemalloc slows allocation-heavy code down too much to time under it
+    tracemalloc.start()
+    try:
+        request()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'bytes': len(response.content),
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(_percentile(timings, 95), 3),
+        'p99_ms': round(_percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': queries,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(iterations=20, warmup=2, query='page_size=50', roles=ROLES, warm_cache=False, progress=None):
+    """
+    Benchmark every GET route for each role. `query` is appended to every
+    path (list endpoints return everything without a page size). The
+    listing cache is cleared before each request unless `warm_cache`.
+    """
+    users = role_users()
+    if 'student' not in users:
+        raise ValueError('No active users to benchmark with; seed the database first (manage.py seed_data).')
+    samples = sample_ids(users['student'])
+    client = Client()
+    results = {}
+    # 4xx answers for refused roles are expected; logging each one would be timed too
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+
+    try:
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for template, name in routes():
+                path = template.replace('<int:pk>', str(samples[DETAIL_SAMPLES[name]])) if name in DETAIL_SAMPLES else template
+                if query:
+                    path = f'{path}?{query}'
+                for role in roles:
+                    if role not in users:
+                        continue
+                    token = ClaimsTokenObtainPairSerializer.get_token(users[role]).access_token
+                    key = f'{role} GET {template}'
+                    results[key] = _measure(client, path, {'Authorization': f'Bearer {token}'}, iterations, warmup, warm_cache)
+                    if progress:
+                        progress(key, results[key])
+    finally:
+        request_logger.setLevel(level)
+
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connections['default'].vendor,
+            'rows': {
+                'users': User.objects.count(),
+                'students': Student.objects.count(),
+                'library': LibraryHistory.objects.count(),
+                'fees': FeeHistory.objects.count(),
+            },
+            'iterations': iterations,
+            'query': query,
+            'warm_cache': warm_cache,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current):
+    """Rows of (key, baseline p50, current p50, change in %, baseline queries, current queries)."""
+    rows = []
+    for key, result in current['results'].items():
+        before = baseline['results'].get(key)
+        if before is None:
+            continue
+        change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+        rows.append((key, before['p50_ms'], result['p50_ms'], change, before['queries'], result['queries']))
+    return rows
+
+
+def serializer_throughput(rows=5000, repeat=3, fields=None):
+    """
+    Rows per second for the list serializers against the values() fast path,
+    each including its query, on the first `rows` rows of each table.
+    `fields` maps a serializer name to a sparse fieldset to time as well.
+    """
+    from rest_framework.renderers import JSONRenderer
+
+    from .fieldsets import ValuesListing
+    from .serializers import FeeHistorySerializer, LibrarySerializer, StudentSerializer
+
+    cases = [
+        (StudentSerializer, Student.objects.order_by('id')),
+        (LibrarySerializer, LibraryHistory.objects.order_by('borrow_date', 'id')),
+        (FeeHistorySerializer, FeeHistory.objects.select_related('student').order_by('payment_date', 'id')),
+    ]
+    renderer = JSONRenderer()
+
+    def best(build):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            renderer.render(build())
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    results = {}
+    for serializer_class, queryset in cases:
+        queryset = queryset[:rows]
+        count = queryset.count()
+        if not count:
+            continue
+        variants = {'all fields': None}
+        if fields and serializer_class.__name__ in fields:
+            variants[f"fields={','.join(fields[serializer_class.__name__])}"] = fields[serializer_class.__name__]
+        for label, subset in variants.items():
+            listing = ValuesListing(serializer_class, subset)
+            serializer_seconds = best(lambda: serializer_class(queryset, many=True, fields=subset).data)
+            values_seconds = best(lambda: listing.represent(listing.queryset(queryset)))
+            results[f'{serializer_class.__name__} ({label})'] = {
+                'rows': count,
+                'serializer_rows_per_s': round(count / serializer_seconds),
+                'values_rows_per_s': round(count / values_seconds),
+                'speedup': round(serializer_seconds / values_seconds, 2),
+            }
+    return results
@@ -0,0 +1,145 @@
+import functools
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from .replica import primary_reads, replica_configured
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def listing_cache():
+    return caches[getattr(settings, 'LISTING_CACHE_ALIAS', 'default')]
+
+
+def _version_key(model):
+    return f'listing-version:{model}'
+
+
+def _bumped_key(model):
+    return f'listing-bumped:{model}'
+
+
+REPLICA_REFRESHED_KEY = 'replica-refreshed-at'
+
+
+def get_versions(models):
+    cache = listing_cache()
+    keys = [_version_key(model) for model in models]
+    found = cache.get_many(keys)
+    versions = []
+    for model, key in zip(models, keys):
+        if key not in found:
+            # A missing version (first use, or evicted) restarts from the clock so
+            # it can never reuse a number that older cached entries were stored under.
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+def bump_version(*models):
+    """Invalidate every cached listing built from `models` once the current transaction commits."""
+    def bump():
+        cache = listing_cache()
+        # After the commit, so a replica copy started later has the change, and
+        # before the new version, so no request sees that without this
+        cache.set_many({_bumped_key(model): time.time() for model in models}, timeout=None)
+        for model in models:
+            try:
+                cache.incr(_version_key(model))
+            except ValueError:
+                cache.set(_version_key(model), time.time_ns(), timeout=None)
+    transaction.on_commit(bump)
+
+
+def replica_refreshed(started):
+    """Record that the replica holds everything committed before `started` (a time.time())."""
+    listing_cache().set(REPLICA_REFRESHED_KEY, started, timeout=None)
+
+
+def replica_current(models):
+    """Whether no write to `models` was bumped since the replica copy began, so it may fill the cache."""
+    cache = listing_cache()
+    refreshed = cache.get(REPLICA_REFRESHED_KEY)
+    if refreshed is None:
+        return False
+    return all(bumped < refreshed for bumped in cache.get_many([_bumped_key(model) for model in models]).values())
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else None
+    return stats
+
+
+def cache_response(*models, depends_on=None):
+    """
+    Cache successful GET responses of an APIView handler, keyed by the caller's
+    role, the full path and the current version of each model in `models`.
+    `depends_on` maps further version names to a predicate on the request;
+    only the responses it holds for are keyed (and invalidated) by them.
+    Roles that are refused by the handler never get an entry, so the handler's
+    own permission checks still decide who sees what. A miss reads from the
+    primary while the replica lags a bumped version, so the new version is
+    never stored with the replica's older rows.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            cache = listing_cache()
+            keyed = models + tuple(name for name, applies in (depends_on or {}).items() if applies(request))
+            versions = get_versions(keyed)
+            path = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+            # Only the data is cached; it is built differently for each response format
+            media = getattr(getattr(request, 'accepted_renderer', None), 'format', '')
+            key = f"listing:{':'.join(keyed)}:{'.'.join(map(str, versions))}:{request.user.user_type}:{media}:{path}"
+
+            data = cache.get(key)
+            if data is not None:
+                _record('hits')
+                return Response(data, status=status.HTTP_200_OK, headers={'X-Cache': 'HIT'})
+
+            _record('misses')
+            if replica_configured() and not replica_current(keyed):
+                with primary_reads():
+                    response = handler(self, request, *args, **kwargs)
+            else:
+                response = handler(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK and isinstance(response, Response):
+                cache.set(key, response.data)
+                response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+class CacheVersionAdminMixin:
+    """Bumps `cache_models` on every admin save and delete."""
+    cache_models = ()
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        bump_version(*self.cache_models)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_version(*self.cache_models)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_version(*self.cache_models)
@@ -0,0 +1,207 @@
+"""
+Change feeds (`GET /students/changes/?since=`, `/library/changes/`,
+`/fees/changes/`) for clients that keep a local copy.
+
+SQLite triggers append one ChangeLog row per insert, update or delete of a
+student, library or fee record, so bulk inserts, queryset updates, the
+overdue sweep and the purge are logged like API writes. The ChangeLog id is
+the change sequence: a feed page reads the entries after `since` through the
+(resource, id) index, or (resource, student_id, id) for a student, and loads
+the current state of the rows they name, so a sync costs O(changes).
+
+`manage.py prune_change_log` keeps the newest CHANGE_FEED_RETENTION entries;
+a client whose `since` falls before them gets 410 Gone and downloads the
+list again.
+
+Rows moved to the archive tables are not deletions and leave no tombstone.
+A student marked for purging gets its tombstone at once; the purge later
+logs tombstones for their records, archived ones included (app.purge logs
+those itself, as the archive tables have no triggers). Copying or remaking the tables (SQLite
+ALTERs) drops the triggers; they are recreated after every `migrate`.
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import ChangeLog, FeeHistory, LibraryHistory, Student
+from .scoping import visible_records
+from .serializers import FeeHistorySerializer, LibrarySerializer, StudentSerializer
+
+SINCE_PARAM = 'since'
+LIMIT_PARAM = 'limit'
+
+_LOG = "INSERT INTO app_changelog (resource, object_id, student_id, deleted)"
+
+
+def _record_triggers(resource, table, archive):
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table} BEGIN
+            {_LOG} VALUES ('{resource}', new.id, new.student_id, 0);
+        END""",
+        # A record moved to another student is gone from the first student's feed
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table} BEGIN
+            {_LOG} SELECT '{resource}', old.id, old.student_id, 1 WHERE old.student_id IS NOT new.student_id;
+            {_LOG} VALUES ('{resource}', new.id, new.student_id, 0);
+        END""",
+        # The archiver copies rows into the archive table before deleting them
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table}
+        WHEN NOT EXISTS (SELECT 1 FROM {archive} WHERE id = old.id) BEGIN
+            {_LOG} VALUES ('{resource}', old.id, old.student_id, 1);
+        END""",
+    ]
+
+
+SCHEMA = [
+    f"""CREATE TRIGGER IF NOT EXISTS app_student_changes_insert AFTER INSERT ON app_student BEGIN
+        {_LOG} VALUES ('students', new.id, new.id, 0);
+    END""",
+    # Marking a student for purging is its deletion as far as clients go
+    f"""CREATE TRIGGER IF NOT EXISTS app_student_changes_update AFTER UPDATE ON app_student
+    WHEN old.deleted_at IS NULL BEGIN
+        {_LOG} VALUES ('students', new.id, new.id, new.deleted_at IS NOT NULL);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS app_student_changes_delete AFTER DELETE ON app_student
+    WHEN old.deleted_at IS NULL BEGIN
+        {_LOG} VALUES ('students', old.id, old.id, 1);
+    END""",
+    *_record_triggers('library', 'app_libraryhistory', 'app_libraryhistoryarchive'),
+    *_record_triggers('fees', 'app_feehistory', 'app_feehistoryarchive'),
+]
+
+DROP = [
+    f'DROP TRIGGER IF EXISTS {table}_changes_{event}'
+    for table in ('app_student', 'app_libraryhistory', 'app_feehistory')
+    for event in ('insert', 'update', 'delete')
+]
+
+
+def ensure_change_log(connection):
+    """Create the triggers if missing; False when the database isn't SQLite or isn't migrated yet."""
+    if connection.vendor != 'sqlite' or ChangeLog._meta.db_table not in connection.introspection.table_names():
+        return False
+    with connection.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+    return True
+
+
+def drop_change_log(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in DROP:
+            cursor.execute(statement)
+
+
+def install_change_log(sender, using, **kwargs):
+    """post_migrate receiver: migrations that remake a table drop its triggers."""
+    ensure_change_log(connections[using])
+
+
+@dataclass
+class ChangeFeed:
+    resource: str
+    model: type
+    serializer: type
+    roles: tuple
+    owned: bool = True  # rows belong to a student, who only sees their own
+
+    def visible(self, user):
+        return visible_records(self.model, user) if self.owned else self.model.objects.all()
+
+
+FEEDS = {
+    feed.resource: feed
+    for feed in [
+        ChangeFeed('students', Student, StudentSerializer, ('office_staff', 'librarian', 'admin'), owned=False),
+        ChangeFeed('library', LibraryHistory, LibrarySerializer, ('student', 'office_staff', 'librarian', 'admin')),
+        ChangeFeed('fees', FeeHistory, FeeHistorySerializer, ('student', 'office_staff', 'admin')),
+    ]
+}
+
+
+class ChangesPruned(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Changes after this sequence are no longer kept; download the list again.'
+    default_code = 'gone'
+
+
+def pruned_after(since):
+    """Whether log entries after the sequence `since` were pruned."""
+    oldest = ChangeLog.objects.order_by('id').values_list('id', flat=True).first()
+    return oldest is not None and oldest > since + 1
+
+
+def prune_change_log(keep=None, chunk_size=5000):
+    """Delete all but the newest `keep` (default CHANGE_FEED_RETENTION) log entries. Returns how many."""
+    keep = getattr(settings, 'CHANGE_FEED_RETENTION', None) if keep is None else keep
+    head = ChangeLog.objects.order_by('-id').values_list('id', flat=True).first()
+    if keep is None or head is None:
+        return 0
+    # The newest entry always stays, so pruned_after can tell what was dropped
+    cutoff, removed = head - max(keep, 1), 0
+    while True:
+        with transaction.atomic():
+            ids = list(ChangeLog.objects.filter(id__lte=cutoff).order_by('id').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                return removed
+            removed += ChangeLog.objects.filter(id__lte=ids[-1]).delete()[0]
+
+
+def _int_param(params, name, default=None, minimum=0):
+    raw = params.get(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValidationError({name: 'A valid integer is required.'})
+    if value < minimum:
+        raise ValidationError({name: f'Must be at least {minimum}.'})
+    return value
+
+
+def change_page(feed, listing, user, params, student_id=None):
+    """
+    The changes to `feed` after ?since=, at most ?limit= log entries:
+    the current rows (through the ValuesListing `listing`, plus `id`) of
+    records changed since, and the ids of records deleted since. Without
+    `since`, no changes and the current sequence to start from.
+    Raises ChangesPruned when entries after `since` were pruned.
+    """
+    entries = ChangeLog.objects.filter(resource=feed.resource)
+    if student_id is not None:
+        entries = entries.filter(student_id=student_id)
+    since = _int_param(params, SINCE_PARAM)
+    if since is None:
+        head = entries.order_by('-id').values_list('id', flat=True).first() or 0
+        return {'since': None, 'next_since': head, 'has_more': False, 'results': [], 'deleted': []}
+    if pruned_after(since):
+        raise ChangesPruned()
+
+    page_size = getattr(settings, 'CHANGE_FEED_PAGE_SIZE', 500)
+    limit = min(_int_param(params, LIMIT_PARAM, page_size, minimum=1), getattr(settings, 'CHANGE_FEED_MAX_PAGE_SIZE', 5000))
+    rows = list(entries.filter(id__gt=since).order_by('id').values_list('id', 'object_id', 'deleted')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # The last entry per record decides. A changed row that is not found was archived (no
+    # deletion), or is gone or hidden since, which a later entry (or the purge) tombstones
+    latest = {object_id: deleted for _, object_id, deleted in rows}
+    changed = [object_id for object_id, deleted in latest.items() if not deleted]
+    found = {}
+    visible = feed.visible(user)
+    for start in range(0, len(changed), 500):
+        for row in listing.queryset(visible.filter(id__in=changed[start:start + 500]), ('id',)):
+            found[row['id']] = row
+    results = [found[object_id] for object_id in changed if object_id in found]
+    return {
+        'since': since,
+        'next_since': rows[-1][0] if rows else since,
+        'has_more': has_more,
+        'results': [{'id': row['id'], **values} for row, values in zip(results, listing.represent(results))],
+        'deleted': [object_id for object_id, deleted in latest.items() if deleted],
+    }
@@ -0,0 +1,68 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from .cache import get_versions
+
+
+VALIDATOR_AGGREGATES = {'last_modified': Max('updated_at'), 'count': Count('id')}
+
+
+def list_validators(request, meta):
+    """
+    ETag for a list response, from one aggregate over the caller's visible
+    rows (max updated_at plus row count) instead of the payload itself. The
+    path is part of the tag because filters and cursors change the payload.
+    No Last-Modified: deleting a row leaves max(updated_at) where it was, so
+    If-Modified-Since would answer a stale 304; the row count in the tag
+    catches it. Columns joined from other tables don't move updated_at; their
+    listing cache versions (meta['versions']) are part of the tag instead.
+    """
+    last_modified = meta['last_modified']
+    scope = request.user.user_type
+    if scope == 'student':
+        scope = f'student:{request.user.pk}'
+    media = getattr(request, 'accepted_media_type', '')
+    digest = hashlib.sha1(
+        f"{scope}|{media}|{request.get_full_path()}|{meta['count']}|{last_modified.isoformat() if last_modified else ''}|{meta['versions']}".encode()
+    ).hexdigest()
+    return {'ETag': f'"{digest}"'}
+
+
+def not_modified_response(request, *querysets, versions=()):
+    """
+    Returns (response, headers). `response` is a 304 when the client's
+    If-None-Match still matches, otherwise None and the
+    caller should attach `headers` to its own response. A list read from
+    several tables passes one queryset per table, and `versions` names the
+    listing cache versions (see app.cache) of the tables it joins.
+    """
+    meta = _combine([queryset.order_by().aggregate(**VALIDATOR_AGGREGATES) for queryset in querysets])
+    return _check(request, {**meta, 'versions': get_versions(versions) if versions else []})
+
+
+async def anot_modified_response(request, *querysets, versions=()):
+    meta = _combine([await queryset.order_by().aaggregate(**VALIDATOR_AGGREGATES) for queryset in querysets])
+    return _check(request, {**meta, 'versions': await sync_to_async(get_versions)(versions) if versions else []})
+
+
+def joined_versions(fields, joined):
+    """The listing versions in `joined` ({output field: version}) of the `fields` a response shows (None: all)."""
+    return tuple(sorted({version for name, version in joined.items() if fields is None or name in fields}))
+
+
+def _combine(metas):
+    modified = [meta['last_modified'] for meta in metas if meta['last_modified']]
+    return {'last_modified': max(modified, default=None), 'count': sum(meta['count'] for meta in metas)}
+
+
+def _check(request, meta):
+    headers = list_validators(request, meta)
+    skeleton = HttpResponse(headers=headers)
+    response = get_conditional_response(request, etag=headers['ETag'], response=skeleton)
+    if response is not skeleton:
+        return response, headers
+    return None, headers
@@ -0,0 +1,249 @@
+"""
+Per-student counters on Student: `active_loans` (borrowed or overdue),
+`fees_paid` (fees in the current table, i.e. this academic year once
+`archive_history` has run) and `last_payment_date` (over the archive too).
+
+Every write to a library or fee record updates its student's row with F()
+expressions in the same transaction, so "how many books does this student
+have out" is a column read, and the student list filters and sorts on
+indexed columns. Batches (bulk posting, archiving) update each chunk of
+students with one statement. `manage.py check_student_counters`
+recomputes the counters from the records to find and repair drift.
+
+Counter writes bump their own listing version, 'student_counters', so only
+the cached student listings that show, filter or sort by the counters are
+invalidated by every loan and fee write.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from .cache import bump_version
+from .fieldsets import FIELDS_PARAM
+from .models import FeeHistory, FeeHistoryArchive, LibraryHistory, Student
+
+OPEN_LOAN_STATUSES = ('borrowed', 'overdue')
+COUNTER_FIELDS = ('active_loans', 'fees_paid', 'last_payment_date')
+COUNTERS_VERSION = 'student_counters'
+
+
+def uses_counters(request):
+    """Whether a student listing request shows, filters or sorts by the counters (see cache_response)."""
+    params = request.query_params
+    fields = params.get(FIELDS_PARAM)
+    shown = fields is None or any(name.strip() in COUNTER_FIELDS for name in fields.split(','))
+    ordered = params.get('ordering', '').lstrip('-') in COUNTER_FIELDS
+    filtered = any(f'{field}_{suffix}' in params for field in COUNTER_FIELDS for suffix in ('min', 'max'))
+    return shown or ordered or filtered
+
+
+def _update(student_ids, **values):
+    if student_ids:
+        Student.all_objects.filter(pk__in=student_ids).update(**values)
+        bump_version(COUNTERS_VERSION)
+
+
+def _bump_fees(groups):
+    """
+    Add to fees_paid and advance last_payment_date; `groups` maps student id
+    -> (amount, latest date or None). One UPDATE ... FROM (VALUES ...) per 300
+    students: building a CASE per student through the ORM costs more than
+    the update itself.
+    """
+    ops = connection.ops
+    rows = [
+        (pk, str(amount), ops.adapt_datefield_value(latest))
+        for pk, (amount, latest) in groups.items() if (amount, latest) != (0, None)
+    ]
+    table = ops.quote_name(Student._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), 300):
+            chunk = rows[start:start + 300]
+            cursor.execute(
+                f"""UPDATE {table} SET
+                    fees_paid = fees_paid + changes.column2,
+                    last_payment_date = CASE
+                        WHEN changes.column3 > last_payment_date OR last_payment_date IS NULL THEN changes.column3
+                        ELSE last_payment_date END
+                FROM (VALUES {', '.join(['(%s, %s, %s)'] * len(chunk))}) AS changes
+                WHERE {table}.id = changes.column1""",
+                [value for row in chunk for value in row],
+            )
+    if rows:
+        bump_version(COUNTERS_VERSION)
+
+
+def _last_payment():
+    """last_payment_date recomputed from the fee tables, as an expression for update()."""
+    def latest(model):
+        return Subquery(model.objects.filter(student=OuterRef('pk')).order_by('-payment_date').values('payment_date')[:1])
+    hot, archived = latest(FeeHistory), latest(FeeHistoryArchive)
+    return Coalesce(Greatest(hot, archived), hot, archived)
+
+
+def _refresh_last_payment(student_ids):
+    """Recompute last_payment_date after the latest payment may have gone."""
+    _update(student_ids, last_payment_date=_last_payment())
+
+
+def counter_state(record):
+    """The fields of a fee or library record that its student's counters depend on."""
+    if isinstance(record, FeeHistory):
+        return record.student_id, record.amount, record.payment_date
+    return record.student_id, record.status
+
+
+def student_fees_added(records):
+    groups = {}
+    for record in records:
+        amount, latest = groups.get(record.student_id, (0, None))
+        groups[record.student_id] = (amount + record.amount, max(latest or record.payment_date, record.payment_date))
+    _bump_fees(groups)
+
+
+def student_fee_removed(record):
+    _bump_fees({record.student_id: (-record.amount, None)})
+    _refresh_last_payment([record.student_id])
+
+
+def student_fee_changed(record, old):
+    old_student_id, old_amount, old_date = old
+    if record.student_id != old_student_id:
+        _bump_fees({old_student_id: (-old_amount, None), record.student_id: (record.amount, record.payment_date)})
+        _refresh_last_payment([old_student_id])
+    elif record.payment_date >= old_date:
+        _bump_fees({record.student_id: (record.amount - old_amount, record.payment_date if record.payment_date > old_date else None)})
+    else:
+        _bump_fees({record.student_id: (record.amount - old_amount, None)})
+        _refresh_last_payment([record.student_id])
+
+
+def student_fees_archived(ids):
+    """Take fees about to move to the archive out of fees_paid; last_payment_date still covers them."""
+    rows = FeeHistory.objects.filter(id__in=ids).values('student').annotate(total=Sum('amount')).order_by()
+    _bump_fees({row['student']: (-row['total'], None) for row in rows})
+
+
+def student_loan_added(record):
+    if record.status in OPEN_LOAN_STATUSES:
+        _update([record.student_id], active_loans=F('active_loans') + 1)
+
+
+def student_loan_removed(record):
+    if record.status in OPEN_LOAN_STATUSES:
+        _update([record.student_id], active_loans=F('active_loans') - 1)
+
+
+def student_loan_changed(record, old):
+    old_student_id, old_status = old
+    was_open, is_open = old_status in OPEN_LOAN_STATUSES, record.status in OPEN_LOAN_STATUSES
+    if record.student_id == old_student_id and was_open == is_open:
+        return
+    if was_open:
+        _update([old_student_id], active_loans=F('active_loans') - 1)
+    if is_open:
+        _update([record.student_id], active_loans=F('active_loans') + 1)
+
+
+class StudentCountersAdminMixin:
+    """Keeps the students' counters in step with admin edits of fee or library records."""
+
+    def save_model(self, request, obj, form, change):
+        old = counter_state(type(obj).objects.get(pk=obj.pk)) if change else None
+        super().save_model(request, obj, form, change)
+        added, changed, _ = _HANDLERS[type(obj)]
+        if old is None:
+            added(obj)
+        else:
+            changed(obj, old)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            _HANDLERS[type(obj)][2](obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            student_ids = set(queryset.values_list('student_id', flat=True))
+            super().delete_queryset(request, queryset)
+            recount_students(student_ids)
+
+
+_HANDLERS = {
+    FeeHistory: (lambda record: student_fees_added([record]), student_fee_changed, student_fee_removed),
+    LibraryHistory: (student_loan_added, student_loan_changed, student_loan_removed),
+}
+
+
+# Verification and repair
+
+def expected_counters(student_ids):
+    """{student id: (active_loans, fees_paid, last_payment_date)} recomputed from the records."""
+    expected = {pk: [0, 0, None] for pk in student_ids}
+    loans = (
+        LibraryHistory.objects.filter(student_id__in=student_ids, status__in=OPEN_LOAN_STATUSES)
+        .values('student').annotate(count=Count('id')).order_by()
+    )
+    for row in loans:
+        expected[row['student']][0] = row['count']
+    for row in FeeHistory.objects.filter(student_id__in=student_ids).values('student').annotate(total=Sum('amount'), latest=Max('payment_date')).order_by():
+        expected[row['student']][1:] = [row['total'], row['latest']]
+    for row in FeeHistoryArchive.objects.filter(student_id__in=student_ids).values('student').annotate(latest=Max('payment_date')).order_by():
+        latest = expected[row['student']][2]
+        expected[row['student']][2] = row['latest'] if latest is None else max(latest, row['latest'])
+    return {pk: tuple(values) for pk, values in expected.items()}
+
+
+def _recount(students):
+    """Overwrite the counters of the `students` queryset with subqueries over their records."""
+    open_loans = (
+        LibraryHistory.objects.filter(student=OuterRef('pk'), status__in=OPEN_LOAN_STATUSES)
+        .values('student').annotate(count=Count('id')).values('count').order_by()
+    )
+    paid = FeeHistory.objects.filter(student=OuterRef('pk')).values('student').annotate(total=Sum('amount')).values('total').order_by()
+    students.update(
+        active_loans=Coalesce(Subquery(open_loans), 0),
+        fees_paid=Coalesce(Subquery(paid), 0, output_field=Student._meta.get_field('fees_paid')),
+        last_payment_date=_last_payment(),
+    )
+
+
+def recount_students(student_ids=None):
+    """Overwrite the counters of `student_ids` (every student by default) with values recomputed from their records."""
+    if student_ids is None:
+        _recount(Student.all_objects.all())
+    else:
+        student_ids = list(student_ids)
+        for start in range(0, len(student_ids), 500):
+            _recount(Student.all_objects.filter(pk__in=student_ids[start:start + 500]))
+    bump_version(COUNTERS_VERSION)
+
+
+def check_student_counters(repair=False, batch_size=500, progress=None):
+    """
+    Compare every student's counters with their records, `batch_size`
+    students per transaction, and with `repair` overwrite the ones that
+    drifted. Returns [(student id, stored, expected)] for the drifted ones.
+    """
+    batch_size = min(batch_size, 500)  # bound the number of query parameters
+    progress = progress or (lambda checked, drifted: None)
+    drifted, checked, after = [], 0, 0
+    while True:
+        with transaction.atomic():
+            stored = {
+                pk: (loans, paid, latest)
+                for pk, loans, paid, latest in Student.all_objects.filter(pk__gt=after).order_by('pk')
+                .values_list('pk', *COUNTER_FIELDS)[:batch_size]
+            }
+            if not stored:
+                return drifted
+            found = [
+                (pk, stored[pk], values)
+                for pk, values in expected_counters(list(stored)).items() if values != stored[pk]
+            ]
+            if repair and found:
+                recount_students(pk for pk, _, _ in found)
+        drifted.extend(found)
+        checked += len(stored)
+        after = max(stored)
+        progress(checked, len(drifted))
@@ -0,0 +1,84 @@
+"""
+The student portal's home page in one call (`GET /me/dashboard/`): the
+profile, loans still out, recent payments and this academic year's fee
+totals per fee type.
+
+A dashboard is built with four queries whatever the student's history
+holds: the profile with its open loans and latest payments prefetched (the
+payments through a sliced Prefetch, i.e. one windowed query), and one
+GROUP BY for the totals, over payments since the running academic year
+began (ACADEMIC_YEAR_START_MONTH). It is cached per student and day under
+the newest ChangeLog entry for the student and their records (see
+app.changes), so any write to them, bulk posts and the overdue sweep
+included, starts a new entry. Checking that costs one indexed MAX query.
+"""
+from django.conf import settings
+from django.db.models import Count, Max, Prefetch, Sum
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+
+from .archive import current_year_start
+from .cache import listing_cache
+from .counters import OPEN_LOAN_STATUSES
+from .models import ChangeLog, FeeHistory, LibraryHistory, Student
+from .serializers import FeeHistorySerializer, FeeTotalSerializer, LibrarySerializer, StudentSerializer
+
+
+def dashboard_version(student_id):
+    """The newest change sequence touching the student, their loans or their fees."""
+    latest = (
+        ChangeLog.objects.filter(resource__in=['students', 'library', 'fees'], student_id=student_id)
+        .aggregate(latest=Max('id'))['latest']
+    )
+    return latest or 0
+
+
+def build_dashboard(student_id, today=None):
+    recent = getattr(settings, 'DASHBOARD_RECENT_PAYMENTS', 10)
+    student = (
+        Student.objects.filter(pk=student_id)
+        .prefetch_related(
+            Prefetch(
+                'library_history',
+                queryset=LibraryHistory.objects.filter(status__in=OPEN_LOAN_STATUSES).order_by('return_date', 'id'),
+                to_attr='open_loans',
+            ),
+            Prefetch(
+                'fee_records',
+                queryset=FeeHistory.objects.order_by('-payment_date', '-id')[:recent],
+                to_attr='recent_payments',
+            ),
+        )
+        .first()
+    )
+    if student is None:
+        raise NotFound("Student profile not found for the current user.")
+
+    by_type = list(
+        FeeHistory.objects.filter(student_id=student_id, payment_date__gte=current_year_start(today))
+        .values('fee_type').annotate(total=Sum('amount'), count=Count('id')).order_by('fee_type')
+    )
+    return {
+        'profile': {'id': student.pk, **StudentSerializer(student).data},
+        'borrowed': LibrarySerializer(student.open_loans, many=True).data,
+        'overdue': sum(1 for loan in student.open_loans if loan.status == 'overdue'),
+        'recent_payments': FeeHistorySerializer(student.recent_payments, many=True).data,
+        'fee_totals': {
+            'total': FeeTotalSerializer().fields['total'].to_representation(sum(row['total'] for row in by_type)),
+            'count': sum(row['count'] for row in by_type),
+            'by_type': FeeTotalSerializer(by_type, many=True).data,
+        },
+    }
+
+
+def student_dashboard(student_id):
+    """(dashboard data, whether it came from the cache)."""
+    cache = listing_cache()
+    today = timezone.localdate()
+    key = f'dashboard:{student_id}:{dashboard_version(student_id)}:{today:%Y%m%d}'
+    data = cache.get(key)
+    if data is not None:
+        return data, True
+    data = build_dashboard(student_id, today)
+    cache.set(key, data, timeout=getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 3600))
+    return data, False
@@ -0,0 +1,83 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .counters import COUNTER_FIELDS
+
+
+def _parse_date_param(params, name):
+    raw = params.get(name)
+    if not raw:
+        return None
+    try:
+        value = parse_date(raw)
+    except ValueError:
+        value = None
+    if value is None:
+        raise ValidationError({name: 'Date has wrong format. Use YYYY-MM-DD.'})
+    return value
+
+
+def filter_records(queryset, params, date_field=None, fields=()):
+    """
+    Narrow a list queryset with the simple query-string filters shared by the
+    list endpoints: exact matches on `fields` plus `date_from` / `date_to`
+    (inclusive) on `date_field`.
+    """
+    for field in fields:
+        value = params.get(field)
+        if value not in (None, ''):
+            try:
+                queryset = queryset.filter(**{field: value})
+            except (ValueError, DjangoValidationError):
+                raise ValidationError({field: 'Invalid value.'})
+
+    if date_field:
+        date_from = _parse_date_param(params, 'date_from')
+        date_to = _parse_date_param(params, 'date_to')
+        if date_from:
+            queryset = queryset.filter(**{f'{date_field}__gte': date_from})
+        if date_to:
+            queryset = queryset.filter(**{f'{date_field}__lte': date_to})
+    return queryset
+
+
+def filter_ranges(queryset, params, fields):
+    """`<field>_min` / `<field>_max` (inclusive) bounds for each of `fields`."""
+    for field in fields:
+        for suffix, lookup in (('min', 'gte'), ('max', 'lte')):
+            name = f'{field}_{suffix}'
+            value = params.get(name)
+            if value not in (None, ''):
+                try:
+                    queryset = queryset.filter(**{f'{field}__{lookup}': value})
+                except (ValueError, DjangoValidationError):
+                    raise ValidationError({name: 'Invalid value.'})
+    return queryset
+
+
+def requested_ordering(params, fields, default=('id',)):
+    """
+    The keyset ordering for `?ordering=<field>` or `?ordering=-<field>`, one of
+    `fields`, with id as the tie-breaker in the same direction; `default`
+    without the parameter.
+    """
+    raw = params.get('ordering')
+    if not raw:
+        return tuple(default)
+    if raw.lstrip('-') not in fields:
+        raise ValidationError({'ordering': f"Choose from: {', '.join(fields)} (prefix '-' for descending)."})
+    return (raw, '-id') if raw.startswith('-') else (raw, 'id')
+
+
+def filter_students(queryset, params):
+    """
+    The `/students/` list filters and `?ordering=`, shared by the sync and
+    async views. Returns (the filtered queryset in that order, the keyset
+    ordering).
+    """
+    queryset = filter_records(queryset, params, fields=['class_name', 'roll_number'])
+    # Counter columns are indexed on the student row itself; no join to the records
+    queryset = filter_ranges(queryset, params, COUNTER_FIELDS)
+    ordering = requested_ordering(params, COUNTER_FIELDS)
+    return queryset.order_by(*ordering), ordering
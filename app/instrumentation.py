@@ -0,0 +1,233 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware samples a fraction of requests (PERF_SAMPLE_RATE).
+For a sampled request it records the total time, the query count and time
+spent in the database (through an execute wrapper installed on every
+connection), and the time spent in authentication and in serializers. The
+figures go into rolling per-route histograms, exposed to admins at
+/api/perf/stats/, and out in a Server-Timing header for staff users (or
+anyone with DEBUG on). Unsampled requests only pay for a random() call and
+a ContextVar lookup per query.
+"""
+import bisect
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.views import APIView
+
+PHASES = ('db', 'auth', 'serialize')
+# Upper bounds of the latency histogram buckets, in milliseconds; the last bucket is open-ended
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BUCKET_LABELS = [f'le_{bound}ms' for bound in BUCKETS_MS] + [f'gt_{BUCKETS_MS[-1]}ms']
+SLOT_SECONDS = 60
+# Roles that see their own timings in the Server-Timing header
+TIMING_ROLES = ('office_staff', 'librarian', 'admin')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('durations', 'queries', 'depth')
+
+    def __init__(self):
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.depth = dict.fromkeys(PHASES, 0)
+
+
+@contextmanager
+def timed(phase):
+    """Add the block's duration to `phase` of the sampled request, counting nested blocks once."""
+    metrics = _current.get()
+    if metrics is None or metrics.depth[phase]:
+        yield
+        return
+    metrics.depth[phase] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.durations[phase] += time.perf_counter() - started
+        metrics.depth[phase] -= 1
+
+
+def record_query(execute, sql, params, many, context):
+    """Connection execute wrapper; installed on every new connection by AppConfig.ready()."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    metrics.queries += 1
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class InstrumentedAPIView(APIView):
+    """APIView that reports authentication time to PerformanceMiddleware."""
+
+    def perform_authentication(self, request):
+        with timed('auth'):
+            super().perform_authentication(request)
+
+
+class TimedSerializerMixin:
+    """Reports serializer output and validation time to PerformanceMiddleware."""
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+    def run_validation(self, *args, **kwargs):
+        with timed('serialize'):
+            return super().run_validation(*args, **kwargs)
+
+
+# Rolling per-route histograms
+
+class RouteWindow:
+    """Per-minute slots of one route's samples, covering the last PERF_WINDOW_SECONDS."""
+
+    def __init__(self):
+        self.slots = deque()  # [slot number, bucket counts, sums by metric, sample count]
+
+    def add(self, slot, total_ms, durations_ms, queries, keep):
+        if not self.slots or self.slots[-1][0] != slot:
+            self.slots.append([slot, [0] * (len(BUCKETS_MS) + 1), dict.fromkeys(('total', *PHASES, 'queries'), 0.0), 0])
+        while self.slots and self.slots[0][0] <= slot - keep:
+            self.slots.popleft()
+        _, counts, sums, _ = entry = self.slots[-1]
+        counts[bisect.bisect_left(BUCKETS_MS, total_ms)] += 1
+        sums['total'] += total_ms
+        sums['queries'] += queries
+        for phase, value in durations_ms.items():
+            sums[phase] += value
+        entry[3] += 1
+
+    def summary(self, slot, keep):
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        sums = dict.fromkeys(('total', *PHASES, 'queries'), 0.0)
+        samples = 0
+        for number, slot_counts, slot_sums, slot_samples in self.slots:
+            if number <= slot - keep:
+                continue
+            counts = [a + b for a, b in zip(counts, slot_counts)]
+            for key, value in slot_sums.items():
+                sums[key] += value
+            samples += slot_samples
+        if not samples:
+            return None
+        return {
+            'samples': samples,
+            'p50_ms': _bucket_percentile(counts, samples, 0.50),
+            'p95_ms': _bucket_percentile(counts, samples, 0.95),
+            'p99_ms': _bucket_percentile(counts, samples, 0.99),
+            'mean_ms': {key: round(sums[key] / samples, 3) for key in ('total', *PHASES)},
+            'mean_queries': round(sums['queries'] / samples, 2),
+            'histogram': dict(zip(BUCKET_LABELS, counts)),
+        }
+
+
+def _bucket_percentile(counts, samples, fraction):
+    """Upper bound of the bucket holding the percentile; None when it falls past the last bound."""
+    seen = 0
+    for bound, count in zip((*BUCKETS_MS, None), counts):
+        seen += count
+        if seen >= samples * fraction:
+            return bound
+    return None
+
+
+_lock = threading.Lock()
+_routes = {}
+
+
+def _window_slots():
+    return max(1, getattr(settings, 'PERF_WINDOW_SECONDS', 600) // SLOT_SECONDS)
+
+
+def record_request(route, total_ms, durations_ms, queries):
+    slot = int(time.time() // SLOT_SECONDS)
+    with _lock:
+        _routes.setdefault(route, RouteWindow()).add(slot, total_ms, durations_ms, queries, _window_slots())
+
+
+def route_stats():
+    slot, keep = int(time.time() // SLOT_SECONDS), _window_slots()
+    with _lock:
+        summaries = {route: window.summary(slot, keep) for route, window in _routes.items()}
+    return {
+        'sample_rate': getattr(settings, 'PERF_SAMPLE_RATE', 0.1),
+        'window_seconds': keep * SLOT_SECONDS,
+        'routes': {route: summary for route, summary in sorted(summaries.items()) if summary},
+    }
+
+
+def reset_route_stats():
+    with _lock:
+        _routes.clear()
+
+
+# Middleware
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+        metrics, started = RequestMetrics(), time.perf_counter()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+        metrics, started = RequestMetrics(), time.perf_counter()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    def _sampled(self):
+        rate = getattr(settings, 'PERF_SAMPLE_RATE', 0.1)
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def _finish(self, request, response, metrics, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        durations_ms = {phase: seconds * 1000 for phase, seconds in metrics.durations.items()}
+        timings = [f'{phase};dur={value:.2f}' for phase, value in durations_ms.items()]
+        timings[0] += f';desc="{metrics.queries} queries"'
+        timings.append(f'total;dur={total_ms:.2f}')
+        if settings.DEBUG or getattr(getattr(request, 'user', None), 'user_type', None) in TIMING_ROLES:
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = ', '.join(([existing] if existing else []) + timings)
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            record_request(f'{request.method} /{match.route}', total_ms, durations_ms, metrics.queries)
+        return response
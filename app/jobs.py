@@ -0,0 +1,270 @@
+"""
+Background jobs for work too slow for a request: purging deleted students
+and bulk provisioning or fee imports. The view stores a Job row and answers
+202 with its id; `manage.py run_jobs` claims queued jobs and runs them on a
+pool of threads. Clients poll `GET /jobs/<id>/progress/` and
+`GET /jobs/<id>/`, and cancel with `POST /jobs/<id>/cancel/`.
+
+A job is claimed with a conditional UPDATE (status still 'queued'), so
+several `run_jobs` processes can share the queue. A failed attempt of a
+kind that is safe to run again (the purge) is retried after
+JOB_RETRY_DELAY seconds, doubled per attempt, up to its `max_attempts`.
+A cancelled job stops at its next progress report. Workers refresh the
+heartbeat of the jobs they run; a running job whose heartbeat is older
+than JOB_STALE_AFTER (its worker died) is retried or failed.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job, Student
+from .provisioning import post_fees, provision_users
+from .purge import purge_deleted_students
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass
+class JobKind:
+    name: str
+    handler: object  # handler(context, **params) -> JSON-serializable result
+    max_attempts: int = 1  # more only for handlers that can safely run again
+    singleton: bool = False  # one queued job does all the pending work; enqueue() reuses it
+
+
+KINDS = {}
+
+
+def job_kind(name, max_attempts=1, singleton=False):
+    def register(handler):
+        KINDS[name] = JobKind(name, handler, max_attempts, singleton)
+        return handler
+    return register
+
+
+def enqueue(kind, params=None, user=None):
+    """Queue a job of a registered `kind` for `user` (a User or a token ClaimsUser); returns the Job."""
+    job_kind = KINDS[kind]
+    if job_kind.singleton:
+        queued = Job.objects.filter(kind=kind, status=QUEUED).order_by('id').first()
+        if queued is not None:
+            return queued
+    return Job.objects.create(kind=kind, params=params or {}, created_by_id=user.id if user is not None else None, max_attempts=job_kind.max_attempts)
+
+
+def visible_jobs(user):
+    """Jobs `user` may see and act on: their own, or every job for admins."""
+    return Job.objects.all() if user.user_type == 'admin' else Job.objects.filter(created_by_id=user.id)
+
+
+def cancel(job):
+    """Cancel a queued job at once, or ask a running one to stop. Returns False if it already finished."""
+    if Job.objects.filter(pk=job.pk, status=QUEUED).update(status=CANCELLED, cancel_requested=True, finished_at=timezone.now()):
+        return True
+    return bool(Job.objects.filter(pk=job.pk, status=RUNNING).update(cancel_requested=True))
+
+
+def retry(job):
+    """Queue a failed or cancelled job again with a fresh set of attempts. Returns False otherwise."""
+    return bool(
+        Job.objects.filter(pk=job.pk, status__in=[FAILED, CANCELLED]).update(
+            status=QUEUED, attempts=0, cancel_requested=False, error='', result=None, progress=0,
+            run_after=timezone.now(), started_at=None, finished_at=None, worker='',
+        )
+    )
+
+
+class JobContext:
+    """Handed to a job's handler: its parameters, and progress reports that double as cancellation points."""
+
+    def __init__(self, job):
+        self.job = job
+        self.done, self.total = 0, None
+        self._reported = None
+
+    def progress(self, done, total=None):
+        """Record `done` of `total` units; raises JobCancelled if the job was cancelled."""
+        self.done = done
+        if total is not None:
+            self.total = total
+        now = time.monotonic()
+        if self._reported is not None and now - self._reported < getattr(settings, 'JOB_PROGRESS_INTERVAL', 1.0):
+            return
+        self._reported = now
+        Job.objects.filter(pk=self.job.pk).update(progress=self.done, total=self.total)
+        if Job.objects.filter(pk=self.job.pk, cancel_requested=True).exists():
+            raise JobCancelled
+
+
+def claim_next(worker):
+    """Mark the oldest due queued job as running on `worker`; None when there is none."""
+    while True:
+        now = timezone.now()
+        pk = Job.objects.filter(status=QUEUED, run_after__lte=now).order_by('run_after', 'id').values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+        claimed = Job.objects.filter(pk=pk, status=QUEUED).update(
+            status=RUNNING, worker=worker, attempts=F('attempts') + 1, started_at=now, heartbeat_at=now,
+        )
+        if claimed:  # otherwise another worker got it first
+            return Job.objects.get(pk=pk)
+
+
+def _failed_attempt(job, error):
+    """Queue `job` again after a backoff, or fail it when out of attempts."""
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        delay = getattr(settings, 'JOB_RETRY_DELAY', 30) * 2 ** (job.attempts - 1)
+        requeued = Job.objects.filter(pk=job.pk, status=RUNNING, cancel_requested=False).update(
+            status=QUEUED, error=error, worker='', run_after=now + timedelta(seconds=delay),
+        )
+        if requeued:
+            return
+    Job.objects.filter(pk=job.pk).update(status=FAILED, error=error, finished_at=now)
+
+
+def run_job(job):
+    """Run a claimed job to its next status."""
+    context = JobContext(job)
+    try:
+        result = KINDS[job.kind].handler(context, **job.params)
+    except JobCancelled:
+        Job.objects.filter(pk=job.pk).update(status=CANCELLED, progress=context.done, total=context.total, finished_at=timezone.now())
+    except Exception as exc:
+        logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.kind, job.attempts)
+        Job.objects.filter(pk=job.pk).update(progress=context.done, total=context.total)
+        _failed_attempt(job, f'{type(exc).__name__}: {exc}')
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            status=SUCCEEDED, result=result, error='', progress=context.done, total=context.total, finished_at=timezone.now(),
+        )
+
+
+def run_next(worker='local'):
+    """Claim and run the next due job. Returns False when there was none."""
+    job = claim_next(worker)
+    if job is None:
+        return False
+    run_job(job)
+    return True
+
+
+def drain(worker='local'):
+    """Run due jobs in this thread until none is left. Returns how many ran."""
+    count = 0
+    while run_next(worker):
+        count += 1
+    return count
+
+
+def recover_stale_jobs():
+    """Retry or fail running jobs whose worker stopped sending heartbeats. Returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'JOB_STALE_AFTER', 300))
+    stale = list(Job.objects.filter(status=RUNNING, heartbeat_at__lt=cutoff))
+    for job in stale:
+        _failed_attempt(job, f'Worker {job.worker} stopped responding.')
+    return len(stale)
+
+
+def prune_finished_jobs():
+    """Delete jobs that finished more than JOB_RETENTION_DAYS ago. Returns how many."""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'JOB_RETENTION_DAYS', 7))
+    deleted, _ = Job.objects.filter(status__in=FINISHED, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def _work(worker, stop, poll_interval):
+    """A pool thread: run jobs until `stop` is set, or until the queue is empty without a `poll_interval`."""
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            if not run_next(worker):
+                if poll_interval is None:
+                    return
+                stop.wait(poll_interval)
+    finally:
+        connection.close()
+
+
+def run_worker(threads=4, once=False, poll_interval=None, maintenance_interval=60, stop=None):
+    """
+    Run jobs on `threads` threads until `stop` is set or, with `once`, until
+    the queue is empty. The calling thread keeps the heartbeats of the
+    running jobs fresh and periodically recovers stale jobs and prunes old
+    ones. Returns the worker name.
+    """
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    stop = stop or threading.Event()
+    poll_interval = poll_interval or getattr(settings, 'JOB_POLL_INTERVAL', 1.0)
+    heartbeat = min(getattr(settings, 'JOB_STALE_AFTER', 300) / 3, maintenance_interval)
+    pool = [
+        threading.Thread(target=_work, args=(worker, stop, None if once else poll_interval), name=f'job-worker-{n}', daemon=True)
+        for n in range(threads)
+    ]
+    maintained = None
+    try:
+        for thread in pool:
+            thread.start()
+        while alive := [thread for thread in pool if thread.is_alive()]:
+            if maintained is None or time.monotonic() - maintained >= maintenance_interval:
+                recover_stale_jobs()
+                prune_finished_jobs()
+                maintained = time.monotonic()
+            Job.objects.filter(worker=worker, status=RUNNING).update(heartbeat_at=timezone.now())
+            alive[0].join(heartbeat)
+    finally:
+        # Jobs already running are finished; nothing new is claimed
+        stop.set()
+        for thread in pool:
+            thread.join()
+        connection.close()
+    return worker
+
+
+# Job kinds
+
+@job_kind('purge_students', max_attempts=3, singleton=True)
+def _purge_students(context, chunk_size=500, pause=0.0):
+    total = Student.all_objects.filter(deleted_at__isnull=False).count()
+    context.progress(0, total)
+    return purge_deleted_students(
+        chunk_size=chunk_size, pause=pause,
+        progress=lambda counts: context.progress(counts['students'], max(total, counts['students'])),
+    )
+
+
+def _import_result(results):
+    created = sum(1 for result in results if result['status'] == 'created')
+    return {'created': created, 'failed': len(results) - created, 'results': results}
+
+
+@job_kind('provision_students')
+def _provision_students(context, rows, hashed=False):
+    context.progress(0, len(rows))
+    results = provision_users(rows, hashed=hashed)
+    context.done = len(rows)
+    return _import_result(results)
+
+
+@job_kind('post_fees')
+def _post_fees(context, rows, student_id=None):
+    context.progress(0, len(rows))
+    results = post_fees(rows, student_id=student_id)
+    context.done = len(rows)
+    return _import_result(results)
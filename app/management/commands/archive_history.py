@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from app.archive import archive_closed_years, current_year_start
+
+
+class Command(BaseCommand):
+    help = 'Move fee and library records of closed academic years to the archive tables, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', metavar='YYYY-MM-DD',
+                            help='Archive records dated before this day (default: start of the current academic year).')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows moved per transaction (at most 500).')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches so writers can get in.')
+
+    def handle(self, *args, **options):
+        before = current_year_start()
+        if options['before']:
+            try:
+                before = parse_date(options['before'])
+            except ValueError:
+                before = None
+            if before is None:
+                raise CommandError('--before must be a date (YYYY-MM-DD).')
+
+        def progress(table, moved):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{table}: {moved}')
+
+        counts = archive_closed_years(before, batch_size=options['batch_size'], pause=options['pause'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived records before {before}: {counts['fees']} fee and {counts['library']} library records."
+        ))
@@ -0,0 +1,50 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmarks import ROLES, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Time every GET route for each role in-process and write latency, query and memory figures as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark.json', help='Where to write the results.')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--query', default='page_size=50', help="Query string for every request ('' for full lists).")
+        parser.add_argument('--roles', nargs='+', choices=ROLES, default=list(ROLES))
+        parser.add_argument('--warm-cache', action='store_true', help='Keep the listing cache between requests.')
+        parser.add_argument('--compare', help='Earlier results file to print p50 and query changes against.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = json.loads(Path(options['compare']).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Could not read {options['compare']}: {exc}")
+
+        def progress(key, result):
+            self.stdout.write(
+                f"{key:<50} {result['status']}  p50 {result['p50_ms']:8.2f}ms  p99 {result['p99_ms']:8.2f}ms  "
+                f"{result['queries']:3d} queries  {result['peak_kb']:9.1f} KiB"
+            )
+
+        try:
+            report = run_benchmarks(
+                iterations=options['iterations'], warmup=options['warmup'], query=options['query'],
+                roles=options['roles'], warm_cache=options['warm_cache'], progress=progress,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        Path(options['output']).write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(report['results'])} results to {options['output']}."))
+
+        if baseline:
+            self.stdout.write(f"\nAgainst {options['compare']} (commit {baseline['meta'].get('commit')}):")
+            for key, before, after, change, queries_before, queries_after in compare(baseline, report):
+                self.stdout.write(
+                    f'{key:<50} p50 {before:8.2f} -> {after:8.2f}ms ({change:+6.1f}%)  queries {queries_before} -> {queries_after}'
+                )
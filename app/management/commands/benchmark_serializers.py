@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from app.benchmarks import serializer_throughput
+
+SPARSE = {
+    'StudentSerializer': ['name'],
+    'LibrarySerializer': ['id', 'book_name', 'status'],
+    'FeeHistorySerializer': ['id', 'amount', 'payment_date'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare list serialization throughput of the DRF serializers and the values() fast path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        results = serializer_throughput(options['rows'], options['repeat'], fields=SPARSE)
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for label, result in results.items():
+            self.stdout.write(
+                f"{label:<60} {result['rows']:>6} rows  serializer {result['serializer_rows_per_s']:>8,}/s  "
+                f"values {result['values_rows_per_s']:>8,}/s  x{result['speedup']}"
+            )
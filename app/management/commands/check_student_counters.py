@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.counters import COUNTER_FIELDS, check_student_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute every student's loan and fee counters from their records and report (or repair) drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='Overwrite the counters that drifted.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Students checked per transaction (at most 500).')
+        parser.add_argument('--limit', type=int, default=20, help='Drifted students to list (0 for none).')
+
+    def handle(self, *args, **options):
+        def progress(checked, drifted):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{checked} students checked, {drifted} drifted')
+
+        drifted = check_student_counters(repair=options['repair'], batch_size=options['batch_size'], progress=progress)
+        for student_id, stored, expected in drifted[:options['limit']]:
+            changes = ', '.join(
+                f'{field} {old} -> {new}' for field, old, new in zip(COUNTER_FIELDS, stored, expected) if old != new
+            )
+            self.stdout.write(f'Student {student_id}: {changes}')
+
+        if options['repair']:
+            self.stdout.write(self.style.SUCCESS(f'Repaired the counters of {len(drifted)} students.'))
+        elif drifted:
+            raise CommandError(f'{len(drifted)} students have drifted counters; run with --repair to fix them.')
+        else:
+            self.stdout.write(self.style.SUCCESS('Every student counter matches its records.'))
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.snapshot import TABLES, export_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Write fee, library and student snapshots (CSV and columnar) partitioned by academic year. '
+        'Later runs append the rows changed since the previous run, and tombstones for deleted ones, '
+        'from the change log; schedule it nightly from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.SNAPSHOT_DIR), help='Snapshot directory.')
+        parser.add_argument('--format', action='append', choices=['csv', 'columnar'], dest='formats',
+                            help='Repeat to write several formats (default: both).')
+        parser.add_argument('--table', action='append', choices=[table.name for table in TABLES], dest='tables')
+        parser.add_argument('--full', action='store_true', help='Discard existing snapshot files and start over.')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        written = export_snapshot(
+            options['output'],
+            formats=tuple(options['formats'] or ('csv', 'columnar')),
+            full=options['full'],
+            chunk_size=options['chunk_size'],
+            tables=options['tables'],
+        )
+        for table, rows in written.items():
+            self.stdout.write(f'{table}: {rows} rows')
+        self.stdout.write(self.style.SUCCESS(f"Snapshot written to {options['output']}"))
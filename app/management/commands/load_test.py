@@ -0,0 +1,109 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+        headers['connection'] = 'close'
+    return status, headers.get('connection', '').lower() == 'close'
+
+
+async def _client(host, port, request, deadline, latencies, errors):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            status, closed = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors.append(1)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.01)
+            continue
+        latencies.append(time.perf_counter() - started)
+        if status >= 400:
+            errors.append(status)
+        if closed:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_level(url, headers, concurrency, duration):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    lines = [f'GET {path} HTTP/1.1', f'Host: {parts.netloc}', 'Connection: keep-alive'] + headers
+    request = ('\r\n'.join(lines) + '\r\n\r\n').encode()
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, request, deadline, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else None,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else None,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Closed-loop HTTP load test against a running server: N clients each send GETs back to back '
+        'for --duration seconds. Run it against the WSGI and ASGI deployments to compare them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Full URL, e.g. http://127.0.0.1:8000/api/async/fees/')
+        parser.add_argument('--concurrency', default='50,200,1000', help='Comma separated client counts.')
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--token', help='JWT access token sent as a Bearer Authorization header.')
+        parser.add_argument('--header', action='append', default=[], help='Extra "Name: value" header.')
+
+    def handle(self, *args, **options):
+        if urlsplit(options['url']).scheme != 'http':
+            raise CommandError('Only plain http:// URLs are supported.')
+        headers = list(options['header'])
+        if options['token']:
+            headers.append(f"Authorization: Bearer {options['token']}")
+
+        self.stdout.write(f"{'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+        for concurrency in [int(level) for level in options['concurrency'].split(',')]:
+            result = asyncio.run(run_level(options['url'], headers, concurrency, options['duration']))
+            self.stdout.write(
+                f"{result['concurrency']:>8} {result['requests']:>9} {result['errors']:>7} {result['rps']:>9.1f} "
+                f"{result['p50_ms'] or 0:>9.1f} {result['p99_ms'] or 0:>9.1f}"
+            )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from app.models import LibraryHistory
+from app.overdue import overdue_summary, sweep_overdue
+
+
+class Command(BaseCommand):
+    help = 'Flag library loans past their return date as overdue (run daily, e.g. from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='Students to list in the summary (0 for none).')
+
+    def handle(self, *args, **options):
+        flagged, cleared = sweep_overdue()
+        self.stdout.write(self.style.SUCCESS(f'Flagged {flagged} loans as overdue, cleared {cleared}.'))
+
+        summary = overdue_summary(LibraryHistory.objects.all())
+        self.stdout.write(f"{sum(row['overdue'] for row in summary)} overdue loans across {len(summary)} students.")
+        for row in summary[:options['limit']]:
+            self.stdout.write(
+                f"{row['class_name'] or '-':<8} {row['roll_number'] or '-':<10} {row['name'] or '-':<30} "
+                f"{row['overdue']:>3} overdue, oldest due {row['oldest_return_date']} ({row['days_overdue']} days)"
+            )
@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.provisioning import parse_csv, parse_json, provision_users
+
+
+class Command(BaseCommand):
+    help = 'Create users and student profiles in bulk from a CSV file or a JSON array.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or JSON file to import.')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Defaults to the file extension.')
+        parser.add_argument('--workers', type=int, help='Password hashing processes (default: one per CPU).')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        fmt = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'json')
+        try:
+            text = path.read_text(encoding='utf-8-sig')
+            rows = parse_csv(text) if fmt == 'csv' else parse_json(text)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Could not read {path}: {exc}')
+
+        results = provision_users(rows, workers=options['workers'])
+        failed = [result for result in results if result['status'] == 'error']
+        for result in failed:
+            self.stderr.write(f"row {result['row']}: {result['errors']}")
+        self.stdout.write(self.style.SUCCESS(f'Created {len(results) - len(failed)} users, {len(failed)} rows failed.'))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.changes import prune_change_log
+
+
+class Command(BaseCommand):
+    help = 'Delete change feed log entries beyond the newest CHANGE_FEED_RETENTION (run daily, e.g. from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=None,
+                            help=f'Entries to keep (default: CHANGE_FEED_RETENTION, {settings.CHANGE_FEED_RETENTION}).')
+
+    def handle(self, *args, **options):
+        removed = prune_change_log(keep=options['keep'])
+        self.stdout.write(self.style.SUCCESS(f'Pruned {removed} change log entries.'))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.models import Student
+from app.purge import mark_deleted, purge_deleted_students
+
+
+class Command(BaseCommand):
+    help = 'Delete students marked for deletion, with their fee and library records, in small chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--graduate', metavar='CLASS', action='append', default=[],
+                            help='Mark every student of this class for deletion first (repeatable).')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Records deleted per transaction (at most 500).')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between chunks so writers can get in.')
+        parser.add_argument('--watch', type=float, metavar='SECONDS',
+                            help='Keep running, looking for newly deleted students every SECONDS.')
+
+    def handle(self, *args, **options):
+        for class_name in options['graduate']:
+            marked = mark_deleted(Student.objects.filter(class_name=class_name))
+            self.stdout.write(f'Marked {marked} students of {class_name} for deletion.')
+
+        while True:
+            counts = purge_deleted_students(chunk_size=options['chunk_size'], pause=options['pause'])
+            if counts['students'] or not options['watch']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Purged {counts['students']} students, {counts['fees']} fee and {counts['library']} library records."
+                ))
+            if not options['watch']:
+                return
+            time.sleep(options['watch'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app.summaries import rebuild_fee_summary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the fee summary table from FeeHistory (backfills, or after bulk imports).'
+
+    def handle(self, *args, **options):
+        groups = rebuild_fee_summary()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {groups} fee summary groups.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from app.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Recreate the FTS5 search tables and triggers if missing and reindex every student and library record.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--optimize', action='store_true', help='Merge the index b-trees afterwards.')
+
+    def handle(self, *args, **options):
+        if not rebuild_search_index(connections[options['database']], optimize=options['optimize']):
+            raise CommandError('Full-text search needs SQLite with FTS5; searches fall back to icontains.')
+        self.stdout.write(self.style.SUCCESS('Rebuilt the search index.'))
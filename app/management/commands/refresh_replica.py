@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.cache import replica_refreshed
+from app.replica import REPLICA_ALIAS, refresh_replica, replica_configured
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into the read replica with the online backup API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1024, help='Pages copied per backup step.')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between steps so writers can get in.')
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError(f"No '{REPLICA_ALIAS}' database is configured; set DJANGO_DB_PROFILE=production.")
+        started = time.time()
+        pages = refresh_replica(pages=options['pages'], pause=options['pause'])
+        # Cached listings whose versions were bumped before the copy began may now fill from it
+        replica_refreshed(started)
+        self.stdout.write(self.style.SUCCESS(f'Copied {pages} pages to the replica.'))
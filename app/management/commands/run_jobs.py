@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from app.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (purges, bulk imports) on a pool of threads. Run several for more throughput.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Jobs run at the same time by this process.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty instead of polling for new jobs.')
+        parser.add_argument('--poll', type=float, help='Seconds an idle thread waits before looking again (default JOB_POLL_INTERVAL).')
+
+    def handle(self, *args, **options):
+        if not options['once']:
+            self.stdout.write(f"Running jobs on {options['threads']} threads; Ctrl-C stops after the running jobs finish.")
+        try:
+            worker = run_worker(threads=max(options['threads'], 1), once=options['once'], poll_interval=options['poll'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped.')
+            return
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker} finished.'))
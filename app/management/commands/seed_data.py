@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import User
+from app.seeding import seed_data
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with deterministic synthetic users, students, library and fee records.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10000)
+        parser.add_argument('--library', type=int, help='Library records (default: 3 per student).')
+        parser.add_argument('--fees', type=int, help='Fee records (default: 5 per student).')
+        parser.add_argument('--staff', type=int, default=3, help='Users per staff role.')
+        parser.add_argument('--prefix', default='seed', help='Username prefix; must not be in use yet.')
+        parser.add_argument('--password', default='password', help='Password shared by every seeded user.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--days', type=int, default=730, help='Spread record dates over this many past days.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--defer-indexes', action='store_true',
+                            help='Build library/fee indexes after the load (faster into empty tables).')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Users named '{prefix}_*' already exist; pass a different --prefix.")
+        students = options['students']
+        library = options['library'] if options['library'] is not None else students * 3
+        fees = options['fees'] if options['fees'] is not None else students * 5
+
+        def progress(table, done, total):
+            if options['verbosity'] > 1 or done == total:
+                self.stdout.write(f'{table}: {done}/{total}')
+
+        started = time.perf_counter()
+        try:
+            counts = seed_data(
+                students, library, fees, staff=options['staff'], prefix=prefix, password=options['password'],
+                seed=options['seed'], days=options['days'], batch_size=options['batch_size'],
+                defer_indexes=options['defer_indexes'], progress=progress,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {', '.join(f'{count} {table}' for table, count in counts.items())} "
+            f'in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s).'
+        ))
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_alter_user_date_joined'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feehistory',
+            index=models.Index(fields=['student', 'payment_date'], name='fee_student_payment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feehistory',
+            index=models.Index(fields=['fee_type', 'payment_date'], name='fee_type_payment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feehistory',
+            index=models.Index(fields=['payment_date', 'id'], name='fee_payment_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libraryhistory',
+            index=models.Index(fields=['student', 'status', 'borrow_date'], name='library_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libraryhistory',
+            index=models.Index(fields=['status', 'borrow_date'], name='library_status_borrow_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libraryhistory',
+            index=models.Index(fields=['borrow_date', 'id'], name='library_borrow_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['roll_number'], name='student_roll_number_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='student',
+            constraint=models.UniqueConstraint(fields=('class_name', 'roll_number'), name='unique_roll_number_per_class'),
+        ),
+    ]
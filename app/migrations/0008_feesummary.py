@@ -0,0 +1,51 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:07
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_fee_summary(apps, schema_editor):
+    FeeHistory = apps.get_model('app', 'FeeHistory')
+    FeeSummary = apps.get_model('app', 'FeeSummary')
+    merged = {}
+    groups = (
+        FeeHistory.objects
+        .annotate(month=TruncMonth('payment_date'))
+        .values('student__class_name', 'fee_type', 'month')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    for group in groups:
+        key = (group['student__class_name'] or '', group['fee_type'], group['month'])
+        total, count = merged.get(key, (0, 0))
+        merged[key] = (total + group['total'], count + group['count'])
+    FeeSummary.objects.bulk_create([
+        FeeSummary(class_name=class_name, fee_type=fee_type, month=month, total=total, count=count)
+        for (class_name, fee_type, month), (total, count) in merged.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('class_name', models.CharField(blank=True, default='', max_length=100)),
+                ('fee_type', models.CharField(max_length=100)),
+                ('month', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('class_name', 'fee_type', 'month'), name='unique_fee_summary_group')],
+            },
+        ),
+        migrations.RunPython(backfill_fee_summary, migrations.RunPython.noop),
+    ]
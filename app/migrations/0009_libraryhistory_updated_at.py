@@ -0,0 +1,26 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_feesummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libraryhistory',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='libraryhistory',
+            index=models.Index(fields=['updated_at', 'id'], name='library_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feehistory',
+            index=models.Index(fields=['updated_at', 'id'], name='fee_updated_id_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_libraryhistory_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='libraryhistory',
+            name='status',
+            field=models.CharField(choices=[('borrowed', 'Borrowed'), ('overdue', 'Overdue'), ('returned', 'Returned')], default='borrowed', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='libraryhistory',
+            index=models.Index(fields=['status', 'return_date'], name='library_status_return_idx'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+# A copy of app.search.SCHEMA / DROP as of this migration, so later changes
+# to the live module don't change what it does
+SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS app_student_fts USING fts5(
+        name, roll_number, class_name,
+        content='app_student', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS app_student_fts_insert AFTER INSERT ON app_student BEGIN
+        INSERT INTO app_student_fts(rowid, name, roll_number, class_name)
+        VALUES (new.id, new.name, new.roll_number, new.class_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS app_student_fts_delete AFTER DELETE ON app_student BEGIN
+        INSERT INTO app_student_fts(app_student_fts, rowid, name, roll_number, class_name)
+        VALUES ('delete', old.id, old.name, old.roll_number, old.class_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS app_student_fts_update AFTER UPDATE OF name, roll_number, class_name ON app_student BEGIN
+        INSERT INTO app_student_fts(app_student_fts, rowid, name, roll_number, class_name)
+        VALUES ('delete', old.id, old.name, old.roll_number, old.class_name);
+        INSERT INTO app_student_fts(rowid, name, roll_number, class_name)
+        VALUES (new.id, new.name, new.roll_number, new.class_name);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS app_library_fts USING fts5(
+        book_name,
+        content='app_libraryhistory', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS app_library_fts_insert AFTER INSERT ON app_libraryhistory BEGIN
+        INSERT INTO app_library_fts(rowid, book_name) VALUES (new.id, new.book_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS app_library_fts_delete AFTER DELETE ON app_libraryhistory BEGIN
+        INSERT INTO app_library_fts(app_library_fts, rowid, book_name) VALUES ('delete', old.id, old.book_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS app_library_fts_update AFTER UPDATE OF book_name ON app_libraryhistory BEGIN
+        INSERT INTO app_library_fts(app_library_fts, rowid, book_name) VALUES ('delete', old.id, old.book_name);
+        INSERT INTO app_library_fts(rowid, book_name) VALUES (new.id, new.book_name);
+    END""",
+    "INSERT INTO app_student_fts(app_student_fts) VALUES ('rebuild')",
+    "INSERT INTO app_library_fts(app_library_fts) VALUES ('rebuild')",
+]
+
+DROP = [
+    'DROP TRIGGER IF EXISTS app_student_fts_insert',
+    'DROP TRIGGER IF EXISTS app_student_fts_delete',
+    'DROP TRIGGER IF EXISTS app_student_fts_update',
+    'DROP TABLE IF EXISTS app_student_fts',
+    'DROP TRIGGER IF EXISTS app_library_fts_insert',
+    'DROP TRIGGER IF EXISTS app_library_fts_delete',
+    'DROP TRIGGER IF EXISTS app_library_fts_update',
+    'DROP TABLE IF EXISTS app_library_fts',
+]
+
+
+def create_search_index(apps, schema_editor):
+    # Without FTS5 (another database, or a SQLite build without it) searches fall back to icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)')
+        except OperationalError:
+            return
+        cursor.execute('DROP TABLE temp.fts5_probe')
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in DROP:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_overdue_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_student_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeHistoryArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fee_type', models.CharField(max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_date', models.DateField()),
+                ('remarks', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', 'payment_date'], name='fee_arch_student_idx'), models.Index(fields=['payment_date', 'id'], name='fee_arch_payment_id_idx'), models.Index(fields=['updated_at', 'id'], name='fee_arch_updated_id_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LibraryHistoryArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('book_name', models.CharField(max_length=255)),
+                ('borrow_date', models.DateField()),
+                ('return_date', models.DateField()),
+                ('status', models.CharField(choices=[('borrowed', 'Borrowed'), ('overdue', 'Overdue'), ('returned', 'Returned')], max_length=10)),
+                ('updated_at', models.DateTimeField()),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', 'borrow_date'], name='library_arch_student_idx'), models.Index(fields=['borrow_date', 'id'], name='library_arch_borrow_id_idx'), models.Index(fields=['updated_at', 'id'], name='library_arch_updated_id_idx')],
+            },
+        ),
+    ]
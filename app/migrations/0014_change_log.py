@@ -0,0 +1,87 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+# A copy of app.changes.SCHEMA / DROP as of this migration, so later changes
+# to the live module don't change what it does
+_LOG = "INSERT INTO app_changelog (resource, object_id, student_id, deleted)"
+
+
+def _record_triggers(resource, table, archive):
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table} BEGIN
+            {_LOG} VALUES ('{resource}', new.id, new.student_id, 0);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table} BEGIN
+            {_LOG} SELECT '{resource}', old.id, old.student_id, 1 WHERE old.student_id IS NOT new.student_id;
+            {_LOG} VALUES ('{resource}', new.id, new.student_id, 0);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table}
+        WHEN NOT EXISTS (SELECT 1 FROM {archive} WHERE id = old.id) BEGIN
+            {_LOG} VALUES ('{resource}', old.id, old.student_id, 1);
+        END""",
+    ]
+
+
+SCHEMA = [
+    f"""CREATE TRIGGER IF NOT EXISTS app_student_changes_insert AFTER INSERT ON app_student BEGIN
+        {_LOG} VALUES ('students', new.id, new.id, 0);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS app_student_changes_update AFTER UPDATE ON app_student
+    WHEN old.deleted_at IS NULL BEGIN
+        {_LOG} VALUES ('students', new.id, new.id, new.deleted_at IS NOT NULL);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS app_student_changes_delete AFTER DELETE ON app_student
+    WHEN old.deleted_at IS NULL BEGIN
+        {_LOG} VALUES ('students', old.id, old.id, 1);
+    END""",
+    *_record_triggers('library', 'app_libraryhistory', 'app_libraryhistoryarchive'),
+    *_record_triggers('fees', 'app_feehistory', 'app_feehistoryarchive'),
+]
+
+DROP = [
+    f'DROP TRIGGER IF EXISTS {table}_changes_{event}'
+    for table in ('app_student', 'app_libraryhistory', 'app_feehistory')
+    for event in ('insert', 'update', 'delete')
+]
+
+
+def create_change_log(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+
+def drop_change_log(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in DROP:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_history_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('student_id', models.BigIntegerField(null=True)),
+                ('deleted', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resource', 'id'], name='changelog_resource_idx'), models.Index(fields=['resource', 'student_id', 'id'], name='changelog_student_idx')],
+            },
+        ),
+        migrations.RunPython(create_change_log, drop_change_log),
+    ]
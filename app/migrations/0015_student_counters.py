@@ -0,0 +1,68 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+
+def fill_counters(apps, schema_editor):
+    # The recount of app.counters as of this migration, over the historical models
+    Student = apps.get_model('app', 'Student')
+    LibraryHistory = apps.get_model('app', 'LibraryHistory')
+    FeeHistory = apps.get_model('app', 'FeeHistory')
+    FeeHistoryArchive = apps.get_model('app', 'FeeHistoryArchive')
+
+    def latest(model):
+        return Subquery(model.objects.filter(student=OuterRef('pk')).order_by('-payment_date').values('payment_date')[:1])
+
+    open_loans = (
+        LibraryHistory.objects.filter(student=OuterRef('pk'), status__in=['borrowed', 'overdue'])
+        .values('student').annotate(count=Count('id')).values('count').order_by()
+    )
+    paid = FeeHistory.objects.filter(student=OuterRef('pk')).values('student').annotate(total=Sum('amount')).values('total').order_by()
+    hot, archived = latest(FeeHistory), latest(FeeHistoryArchive)
+    Student.objects.update(
+        active_loans=Coalesce(Subquery(open_loans), 0),
+        fees_paid=Coalesce(Subquery(paid), 0, output_field=Student._meta.get_field('fees_paid')),
+        last_payment_date=Coalesce(Greatest(hot, archived), hot, archived),
+    )
+    # Adding NOT NULL columns remakes app_student, which drops its search and
+    # change log triggers; the app's post_migrate receivers put them back
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='active_loans',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='fees_paid',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='last_payment_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['active_loans', 'id'], name='student_active_loans_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['fees_paid', 'id'], name='student_fees_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['last_payment_date', 'id'], name='student_last_payment_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
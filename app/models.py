@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
 class User(AbstractUser):
     USER_TYPES = (
@@ -12,11 +14,40 @@ class User(AbstractUser):
     user_type = models.CharField(max_length=20, choices=USER_TYPES)
 
 
+class ActiveStudentManager(models.Manager):
+    """Students not yet marked for purging; see app.purge."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Student(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='student_profile', null=True, blank=True)  # Optional, for students
     name = models.CharField(max_length=255,null=True, blank=True)
     roll_number = models.CharField(max_length=20,null=True, blank=True)
     class_name = models.CharField(max_length=100,null=True, blank=True)
+    # Set when the student is deleted; the purge worker removes the row and its records later
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    # Kept in step with their records by app.counters; `manage.py check_student_counters` repairs drift
+    active_loans = models.PositiveIntegerField(default=0, editable=False)  # borrowed or overdue
+    fees_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)  # current (unarchived) fees
+    last_payment_date = models.DateField(null=True, blank=True, editable=False)
+
+    objects = ActiveStudentManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['class_name', 'roll_number'], name='unique_roll_number_per_class'),
+        ]
+        indexes = [
+            models.Index(fields=['roll_number'], name='student_roll_number_idx'),
+            models.Index(fields=['deleted_at'], name='student_deleted_at_idx', condition=models.Q(deleted_at__isnull=False)),
+            # Filtering and sorting the student list by its counters
+            models.Index(fields=['active_loans', 'id'], name='student_active_loans_idx'),
+            models.Index(fields=['fees_paid', 'id'], name='student_fees_paid_idx'),
+            models.Index(fields=['last_payment_date', 'id'], name='student_last_payment_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.roll_number}"
@@ -25,6 +56,7 @@ class Student(models.Model):
 class LibraryHistory(models.Model):
     STATUS_CHOICES = (
         ('borrowed', 'Borrowed'),
+        ('overdue', 'Overdue'),
         ('returned', 'Returned'),
     )
 
@@ -33,7 +65,20 @@ class LibraryHistory(models.Model):
     borrow_date = models.DateField()
     return_date = models.DateField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='borrowed')
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # A student's own records, optionally narrowed by status, in date order
+            models.Index(fields=['student', 'status', 'borrow_date'], name='library_student_status_idx'),
+            # Admin status filter and cursor pagination over all records
+            models.Index(fields=['status', 'borrow_date'], name='library_status_borrow_idx'),
+            models.Index(fields=['borrow_date', 'id'], name='library_borrow_date_id_idx'),
+            # Overdue detection: open loans past their return date
+            models.Index(fields=['status', 'return_date'], name='library_status_return_idx'),
+            # Change detection: conditional GETs and incremental snapshots
+            models.Index(fields=['updated_at', 'id'], name='library_updated_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.book_name} - {self.student.name} - {self.status}"
@@ -47,5 +92,134 @@ class FeeHistory(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'payment_date'], name='fee_student_payment_idx'),
+            models.Index(fields=['fee_type', 'payment_date'], name='fee_type_payment_idx'),
+            models.Index(fields=['payment_date', 'id'], name='fee_payment_date_id_idx'),
+            models.Index(fields=['updated_at', 'id'], name='fee_updated_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.user.username} - {self.fee_type} - {self.amount}"
+
+
+# Closed academic years, moved out of the tables above by `manage.py archive_history`
+# (see app.archive). Same columns, rows keep their ids, and nothing writes to them
+# except the archiver and the student purge.
+
+class LibraryHistoryArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    student = models.ForeignKey(Student, related_name='+', on_delete=models.CASCADE)
+    book_name = models.CharField(max_length=255)
+    borrow_date = models.DateField()
+    return_date = models.DateField()
+    status = models.CharField(max_length=10, choices=LibraryHistory.STATUS_CHOICES)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'borrow_date'], name='library_arch_student_idx'),
+            models.Index(fields=['borrow_date', 'id'], name='library_arch_borrow_id_idx'),
+            models.Index(fields=['updated_at', 'id'], name='library_arch_updated_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_name} - {self.student.name} - {self.status}"
+
+
+class FeeHistoryArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    student = models.ForeignKey(Student, related_name='+', on_delete=models.CASCADE)
+    fee_type = models.CharField(max_length=100)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_date = models.DateField()
+    remarks = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'payment_date'], name='fee_arch_student_idx'),
+            models.Index(fields=['payment_date', 'id'], name='fee_arch_payment_id_idx'),
+            models.Index(fields=['updated_at', 'id'], name='fee_arch_updated_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.user.username} - {self.fee_type} - {self.amount}"
+
+
+class FeeSummary(models.Model):
+    # Running totals per (class, fee type, month), kept in step by ManageFees.
+    # Students without a class are grouped under '' so the unique key holds.
+    class_name = models.CharField(max_length=100, blank=True, default='')
+    fee_type = models.CharField(max_length=100)
+    month = models.DateField()  # first day of the month
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['class_name', 'fee_type', 'month'], name='unique_fee_summary_group'),
+        ]
+
+    def __str__(self):
+        return f"{self.class_name} - {self.fee_type} - {self.month:%Y-%m}: {self.total}"
+
+
+class ChangeLog(models.Model):
+    # One row per insert, update or delete of a student, library or fee record,
+    # written by the SQLite triggers in app.changes. The id is the change sequence.
+    resource = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    student_id = models.BigIntegerField(null=True)  # a plain column: entries outlive purged students
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'id'], name='changelog_resource_idx'),
+            # A student's own library and fee changes
+            models.Index(fields=['resource', 'student_id', 'id'], name='changelog_student_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id}: {self.resource} {self.object_id}{' (deleted)' if self.deleted else ''}"
+
+
+class Job(models.Model):
+    # A unit of background work, queued by the views and run by `manage.py run_jobs`; see app.jobs
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    )
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    created_by = models.ForeignKey(User, related_name='jobs', on_delete=models.SET_NULL, null=True, blank=True)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=1)
+    cancel_requested = models.BooleanField(default=False)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    run_after = models.DateTimeField(default=timezone.now)  # retries wait until then
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest due job; also finds stale running jobs and old finished ones
+            models.Index(fields=['status', 'run_after', 'id'], name='job_queue_idx'),
+            models.Index(fields=['created_by', 'id'], name='job_owner_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.student.user.username} - {self.fee_type} - {self.amount}"
\ No newline at end of file
+        return f"{self.kind} #{self.id} ({self.status})"
@@ -0,0 +1,50 @@
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import LibraryHistory
+
+
+def overdue_q(today):
+    """
+    Loans past their return date: already flagged, or still `borrowed` because
+    the sweep hasn't run since they fell due. SQLite walks the
+    (status, return_date) index once per status.
+    """
+    return Q(status__in=['borrowed', 'overdue'], return_date__lt=today)
+
+
+def sweep_overdue(today=None):
+    """
+    Flag borrowed loans past due as overdue, and put overdue loans whose
+    return date moved into the future back to borrowed. One UPDATE each;
+    updated_at is set by hand because update() skips auto_now.
+    Returns (flagged, cleared).
+    """
+    today = today or timezone.localdate()
+    now = timezone.now()
+    flagged = LibraryHistory.objects.filter(status='borrowed', return_date__lt=today).update(status='overdue', updated_at=now)
+    cleared = LibraryHistory.objects.filter(status='overdue', return_date__gte=today).update(status='borrowed', updated_at=now)
+    return flagged, cleared
+
+
+def overdue_summary(records, today=None):
+    """Per-student overdue counts for `records`, most overdue first, in one GROUP BY."""
+    today = today or timezone.localdate()
+    rows = (
+        records.filter(overdue_q(today))
+        .values('student', 'student__name', 'student__roll_number', 'student__class_name')
+        .annotate(overdue=Count('id'), oldest_return_date=Min('return_date'))
+        .order_by('oldest_return_date', 'student')
+    )
+    return [
+        {
+            'student': row['student'],
+            'name': row['student__name'],
+            'roll_number': row['student__roll_number'],
+            'class_name': row['student__class_name'],
+            'overdue': row['overdue'],
+            'oldest_return_date': row['oldest_return_date'],
+            'days_overdue': (today - row['oldest_return_date']).days,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,161 @@
+import base64
+import binascii
+import heapq
+import itertools
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _after(field, value):
+    """Q for rows after `value` in one ordering field. NULLs sort first, as in SQLite."""
+    if field.startswith('-'):
+        field = field[1:]
+        return Q(pk__in=[]) if value is None else Q(**{f'{field}__lt': value}) | Q(**{f'{field}__isnull': True})
+    return Q(**{f'{field}__isnull': False}) if value is None else Q(**{f'{field}__gt': value})
+
+
+def _equal(field, value):
+    field = field.lstrip('-')
+    return Q(**{f'{field}__isnull': True}) if value is None else Q(**{field: value})
+
+
+def keyset_after(ordering, key):
+    """
+    Q for rows strictly after `key` in `ordering`: (a, b) > (x, y) <=> a > x OR (a = x AND b > y),
+    with '-' fields compared the other way.
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        term = _after(field, key[i])
+        for prev_field, prev_value in zip(ordering[:i], key[:i]):
+            term &= _equal(prev_field, prev_value)
+        condition |= term
+    return condition
+
+
+class KeysetPagination:
+    """
+    Opt-in cursor pagination ordered by a fixed tuple of columns, e.g.
+    ('borrow_date', 'id'). The cursor holds the key of the last row sent, so
+    every page is a single indexed range scan no matter how deep it is.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def __init__(self, ordering, results_key='results'):
+        self.ordering = tuple(ordering)
+        self.results_key = results_key
+        self.page_size = getattr(settings, 'KEYSET_PAGE_SIZE', 50)
+        self.max_page_size = getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 500)
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw is None:
+            return self.page_size
+        try:
+            page_size = int(raw)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'A valid integer is required.'})
+        if page_size < 1:
+            raise ValidationError({self.page_size_query_param: 'Must be at least 1.'})
+        return min(page_size, self.max_page_size)
+
+    def row_key(self, instance):
+        """The ordering key of a model instance or a values() row."""
+        fields = [field.lstrip('-') for field in self.ordering]
+        if isinstance(instance, dict):
+            return tuple(instance[field] for field in fields)
+        return tuple(getattr(instance, field) for field in fields)
+
+    def encode_cursor(self, instance):
+        """Cursor for a model instance or a values() row."""
+        key = [
+            value.isoformat() if isinstance(value, (date, datetime)) else str(value) if isinstance(value, Decimal) else value
+            for value in self.row_key(instance)
+        ]
+        raw = json.dumps(key, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (binascii.Error, ValueError, UnicodeDecodeError):
+            raise NotFound('Invalid cursor.')
+        if not isinstance(key, list) or len(key) != len(self.ordering):
+            raise NotFound('Invalid cursor.')
+        return key
+
+    def cursor_key(self, model, cursor):
+        """The decoded cursor with each value checked and converted by its ordering field."""
+        key = []
+        for field, value in zip(self.ordering, self.decode_cursor(cursor)):
+            try:
+                model_field = model._meta.get_field(field.lstrip('-'))
+            except FieldDoesNotExist:
+                model_field = None
+            if value is not None and model_field is not None:
+                try:
+                    value = model_field.to_python(value)
+                except (DjangoValidationError, TypeError, ValueError):
+                    raise NotFound('Invalid cursor.')
+            if isinstance(value, (dict, list)):
+                raise NotFound('Invalid cursor.')
+            key.append(value)
+        return key
+
+    def get_page_queryset(self, queryset, request):
+        """The sliced queryset for the requested page, with one extra row to detect a next page."""
+        self.request = request
+        self.current_page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(keyset_after(self.ordering, self.cursor_key(queryset.model, cursor)))
+        return queryset[:self.current_page_size + 1]
+
+    def get_page(self, rows):
+        self.has_next = len(rows) > self.current_page_size
+        page = rows[:self.current_page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def paginate_queryset(self, queryset, request):
+        return self.get_page(list(self.get_page_queryset(queryset, request)))
+
+    def merge_pages(self, pages):
+        """get_page for the rows of several get_page_queryset() results over tables with disjoint rows (ascending, non-NULL keys)."""
+        rows = heapq.merge(*pages, key=self.row_key)
+        return self.get_page(list(itertools.islice(rows, self.current_page_size + 1)))
+
+    def paginate_querysets(self, querysets, request):
+        return self.merge_pages([list(self.get_page_queryset(queryset, request)) for queryset in querysets])
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            self.results_key: data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
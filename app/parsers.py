@@ -0,0 +1,15 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .provisioning import parse_csv
+
+
+class CSVParser(BaseParser):
+    """Parses a `text/csv` body into a list of row dicts keyed by the header line."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return parse_csv(stream.read().decode('utf-8-sig'))
+        except UnicodeDecodeError as exc:
+            raise ParseError(f'CSV parse error - {exc}')
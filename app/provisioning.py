@@ -0,0 +1,265 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
+
+from .cache import bump_version
+from .models import FeeHistory, Student, User
+from .serializers import BulkFeeSerializer, BulkUserSerializer
+from .counters import student_fees_added
+from .summaries import fees_added
+
+STUDENT_FIELDS = ('name', 'roll_number', 'class_name')
+
+
+def parse_csv(text):
+    return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+
+
+def parse_json(text):
+    rows = json.loads(text)
+    if not isinstance(rows, list):
+        raise ValueError('Expected a JSON array of user objects.')
+    return rows
+
+
+def normalize_row(row):
+    """Accept the student profile either nested under `student` or as flat columns (CSV)."""
+    row = {key: value for key, value in row.items() if value not in (None, '')}
+    if 'student' not in row:
+        student = {field: row.pop(field) for field in STUDENT_FIELDS if field in row}
+        if student:
+            row['student'] = student
+    return row
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    PBKDF2 is CPU bound, so hash in a process pool. `make_password` is pickled
+    by reference and only needs DJANGO_SETTINGS_MODULE in the workers.
+    """
+    if workers is None:
+        workers = getattr(settings, 'BULK_HASH_WORKERS', None) or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) < getattr(settings, 'BULK_HASH_MIN_PARALLEL', 16):
+        return [make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def hash_row_passwords(rows, workers=None):
+    """
+    `rows` with each plaintext `password` replaced by its hash, for rows that
+    are stored before they are provisioned (background jobs). Provision them
+    with `hashed=True`.
+    """
+    indexes = [
+        index for index, row in enumerate(rows)
+        if isinstance(row, dict) and isinstance(row.get('password'), (str, int, float)) and not isinstance(row['password'], bool)
+        and row['password'] != ''
+    ]
+    hashes = hash_passwords([str(rows[index]['password']) for index in indexes], workers=workers)
+    rows = list(rows)
+    for index, password in zip(indexes, hashes):
+        rows[index] = {**rows[index], 'password': password}
+    return rows
+
+
+def _existing(queryset, field, values, chunk=500):
+    values = list(values)
+    found = set()
+    for start in range(0, len(values), chunk):
+        found.update(queryset.filter(**{f'{field}__in': values[start:start + chunk]}).values_list(field, flat=True))
+    return found
+
+
+def _error(index, errors):
+    return {'row': index, 'status': 'error', 'errors': errors}
+
+
+def provision_users(rows, workers=None, hashed=False):
+    """
+    Validate, hash and insert a batch of users (and student profiles).
+
+    Rows that fail validation are reported and skipped; the valid rows are
+    inserted with bulk_create in one transaction, or one savepoint per row if
+    a concurrent write took a username or roll number in the meantime.
+    Returns one result per input row, in input order. With `hashed`, the
+    passwords are already hashes (see hash_row_passwords).
+    """
+    results = [None] * len(rows)
+    accepted = []
+
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[index] = _error(index, {'non_field_errors': ['Expected an object.']})
+            continue
+        serializer = BulkUserSerializer(data=normalize_row(row))
+        if serializer.is_valid():
+            accepted.append((index, serializer.validated_data))
+        else:
+            results[index] = _error(index, serializer.errors)
+
+    # Uniqueness for the whole batch in a handful of queries instead of one per row
+    for _, data in accepted:
+        data['username'] = User.normalize_username(data['username'])
+    taken_usernames = _existing(User.objects, 'username', {data['username'] for _, data in accepted})
+    student_keys = {
+        (data['student'].get('class_name'), data['student'].get('roll_number'))
+        for _, data in accepted if data['user_type'] == 'student' and data.get('student')
+    }
+    taken_rolls = set()
+    if student_keys:
+        taken_rolls = set(
+            Student.all_objects.filter(
+                class_name__in={class_name for class_name, _ in student_keys},
+                roll_number__in={roll_number for _, roll_number in student_keys},
+            ).values_list('class_name', 'roll_number')
+        )
+
+    unique = []
+    for index, data in accepted:
+        student_data = data.get('student') if data['user_type'] == 'student' else None
+        roll_key = None
+        if student_data and student_data.get('class_name') is not None and student_data.get('roll_number') is not None:
+            roll_key = (student_data['class_name'], student_data['roll_number'])
+
+        if data['username'] in taken_usernames:
+            results[index] = _error(index, {'username': ['A user with that username already exists.']})
+        elif roll_key in taken_rolls:
+            results[index] = _error(index, {'student': {'roll_number': ['This roll number is already taken in this class.']}})
+        else:
+            taken_usernames.add(data['username'])
+            if roll_key:
+                taken_rolls.add(roll_key)
+            unique.append((index, data, student_data))
+
+    passwords = [data['password'] for _, data, _ in unique]
+    hashes = passwords if hashed else hash_passwords(passwords, workers=workers)
+    users = []
+    for (index, data, _), password in zip(unique, hashes):
+        fields = {key: value for key, value in data.items() if key != 'student'}
+        fields['email'] = User.objects.normalize_email(fields.get('email', ''))
+        fields['password'] = password
+        users.append(User(**fields))
+
+    batch_size = getattr(settings, 'BULK_INSERT_BATCH_SIZE', 500)
+    pairs = [(user, student_data) for (_, _, student_data), user in zip(unique, users)]
+    try:
+        with transaction.atomic():
+            _insert_users(pairs, batch_size)
+    except IntegrityError:
+        # A concurrent request took a username or roll number after the checks above;
+        # insert row by row to find out which rows clash
+        clashes = _insert_rows(pairs)
+        for (index, data, student_data), clash in zip(unique, clashes):
+            if clash:
+                results[index] = _error(index, _clash_errors(data, student_data))
+    else:
+        clashes = [False] * len(unique)
+
+    for (index, _, _), user, clash in zip(unique, users, clashes):
+        if not clash:
+            results[index] = {'row': index, 'status': 'created', 'id': user.pk, 'username': user.username}
+    return results
+
+
+def _insert_users(pairs, batch_size):
+    users = [user for user, _ in pairs]
+    User.objects.bulk_create(users, batch_size=batch_size)
+    if users and users[0].pk is None:
+        # Backends that cannot return ids from a bulk insert
+        ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id'))
+        for user in users:
+            user.pk = ids[user.username]
+    Student.objects.bulk_create(
+        [Student(user=user, **student_data) for user, student_data in pairs if student_data],
+        batch_size=batch_size,
+    )
+    if users:
+        bump_version('user', 'student')
+
+
+def _insert_rows(pairs):
+    """Insert each (user, student_data) in its own savepoint; returns which ones clashed."""
+    clashes = []
+    with transaction.atomic():
+        for user, student_data in pairs:
+            # The failed bulk insert may have assigned ids before it was rolled back
+            user.pk, user._state.adding = None, True
+            try:
+                with transaction.atomic():
+                    _insert_users([(user, student_data)], 1)
+            except IntegrityError:
+                clashes.append(True)
+            else:
+                clashes.append(False)
+    return clashes
+
+
+def _clash_errors(data, student_data):
+    if User.objects.filter(username=data['username']).exists():
+        return {'username': ['A user with that username already exists.']}
+    if student_data and Student.all_objects.filter(
+        class_name=student_data.get('class_name'), roll_number=student_data.get('roll_number'),
+    ).exists():
+        return {'student': {'roll_number': ['This roll number is already taken in this class.']}}
+    return {'non_field_errors': ['This row clashed with a concurrent write; try it again.']}
+
+
+def post_fees(rows, student_id=None):
+    """
+    Validate and insert a batch of fee records in one transaction.
+
+    The referenced students are loaded with one query per 500 ids, the
+    fee summaries are updated once per (class, fee type, month) group and
+    the students' counters once per 100 students.
+    `student_id` posts every row for that student (a student posting their
+    own fees). Rows that fail validation are reported and skipped. Returns
+    one result per input row, in input order.
+    """
+    results = [None] * len(rows)
+    accepted = []
+
+    # One serializer for every row: building a ModelSerializer's fields costs more than validating a row
+    validator = BulkFeeSerializer()
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[index] = _error(index, {'non_field_errors': ['Expected an object.']})
+            continue
+        if student_id is not None:
+            row = {**row, 'student': student_id}
+        try:
+            accepted.append((index, validator.run_validation(row)))
+        except ValidationError as exc:
+            results[index] = _error(index, exc.detail)
+
+    ids = list({data['student'] for _, data in accepted})
+    students = {}
+    for start in range(0, len(ids), 500):
+        students.update(Student.objects.only('id', 'class_name').in_bulk(ids[start:start + 500]))
+
+    records = []
+    for index, data in accepted:
+        student = students.get(data['student'])
+        if student is None:
+            results[index] = _error(index, {'student': [f'Invalid pk "{data["student"]}" - object does not exist.']})
+            continue
+        records.append((index, FeeHistory(**{**data, 'student': student})))
+
+    with transaction.atomic():
+        FeeHistory.objects.bulk_create(
+            [record for _, record in records], batch_size=getattr(settings, 'BULK_INSERT_BATCH_SIZE', 500),
+        )
+        fees_added(record for _, record in records)
+        student_fees_added(record for _, record in records)
+
+    for index, record in records:
+        results[index] = {'row': index, 'status': 'created', 'id': record.pk}
+    return results
@@ -0,0 +1,118 @@
+"""
+Deferred student deletion.
+
+Deleting a student through the ORM collects every fee and library record
+into memory and deletes them in the request, holding SQLite's write lock
+throughout. `mark_deleted` instead flags the students (and deactivates their
+users) with two UPDATEs, which hides them from Student.objects at once.
+`purge_deleted_students`, run by a purge job (app.jobs) or `manage.py
+purge_students`, then removes their records with raw DELETEs of at most
+`chunk_size` rows, one short transaction each, and finally the students
+and users themselves.
+"""
+import time
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .authentication import revoke_user_tokens
+from .cache import bump_version
+from .models import ChangeLog, FeeHistory, FeeHistoryArchive, LibraryHistory, LibraryHistoryArchive, Student, User
+from .summaries import fees_removed, summary_key
+
+# Students handled per pass; their records are still deleted `chunk_size` rows at a time
+STUDENT_BATCH = 100
+
+
+def mark_deleted(students):
+    """Flag the not-yet-deleted students in the `students` queryset for purging. Returns how many."""
+    with transaction.atomic():
+        rows = list(students.filter(deleted_at__isnull=True).values_list('id', 'user_id'))
+        if not rows:
+            return 0
+        Student.all_objects.filter(pk__in=[student_id for student_id, _ in rows]).update(deleted_at=timezone.now())
+        user_ids = [user_id for _, user_id in rows if user_id is not None]
+        User.objects.filter(pk__in=user_ids).update(is_active=False)
+        bump_version('student', 'user')
+    revoke_user_tokens(*user_ids)
+    return len(rows)
+
+
+def _delete_ids(model, rows, resource):
+    """Delete `rows` ((id, student_id) pairs) of `model`; the archive tables have no change triggers, so log them here."""
+    ids = [object_id for object_id, _ in rows]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+    if model in (FeeHistoryArchive, LibraryHistoryArchive):
+        ChangeLog.objects.bulk_create(
+            ChangeLog(resource=resource, object_id=object_id, student_id=student_id, deleted=True)
+            for object_id, student_id in rows
+        )
+
+
+def _purge_fees(model, student_ids, class_names, chunk_size):
+    rows = list(
+        model.objects.filter(student_id__in=student_ids)
+        .values_list('id', 'student_id', 'fee_type', 'amount', 'payment_date')[:chunk_size]
+    )
+    if rows:
+        fees_removed(
+            (summary_key(class_names[student_id], fee_type, payment_date), amount)
+            for _, student_id, fee_type, amount, payment_date in rows
+        )
+        _delete_ids(model, [(row[0], row[1]) for row in rows], 'fees')
+    return len(rows)
+
+
+def _purge_library(model, student_ids, class_names, chunk_size):
+    rows = list(model.objects.filter(student_id__in=student_ids).values_list('id', 'student_id')[:chunk_size])
+    if rows:
+        _delete_ids(model, rows, 'library')
+    return len(rows)
+
+
+PURGES = [
+    ('fees', FeeHistory, _purge_fees),
+    ('fees', FeeHistoryArchive, _purge_fees),
+    ('library', LibraryHistory, _purge_library),
+    ('library', LibraryHistoryArchive, _purge_library),
+]
+
+
+def purge_deleted_students(chunk_size=500, pause=0.0, progress=None):
+    """
+    Remove every student marked by `mark_deleted`, with their records and
+    users. `pause` seconds between chunks leave room for other writers.
+    Returns {'fees': n, 'library': n, 'students': n} rows deleted.
+    """
+    chunk_size = min(chunk_size, 500)  # bound the number of query parameters
+    counts = {'fees': 0, 'library': 0, 'students': 0}
+    progress = progress or (lambda counts: None)
+    while True:
+        batch = list(
+            Student.all_objects.filter(deleted_at__isnull=False)
+            .order_by('deleted_at', 'id').values_list('id', 'user_id', 'class_name')[:STUDENT_BATCH]
+        )
+        if not batch:
+            return counts
+        student_ids = [student_id for student_id, _, _ in batch]
+        class_names = {student_id: class_name for student_id, _, class_name in batch}
+
+        for label, model, purge in PURGES:
+            while True:
+                with transaction.atomic():
+                    deleted = purge(model, student_ids, class_names, chunk_size)
+                if not deleted:
+                    break
+                counts[label] += deleted
+                progress(counts)
+                if pause:
+                    time.sleep(pause)
+
+        with transaction.atomic():
+            User.objects.filter(pk__in=[user_id for _, user_id, _ in batch if user_id is not None]).delete()
+            Student.all_objects.filter(pk__in=student_ids).delete()
+            bump_version('student', 'user')
+        counts['students'] += len(batch)
+        progress(counts)
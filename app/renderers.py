@@ -0,0 +1,180 @@
+"""
+Extra list formats for bulk consumers, chosen by content negotiation
+(`Accept:` or `?format=`) on the list endpoints.
+
+- NDJSON (`application/x-ndjson`, `?format=ndjson`): one JSON object per
+  line. Unpaginated lists are streamed from the database in chunks instead of
+  being built in memory first.
+- Columnar JSON (`application/vnd.columnar+json`, `?format=columnar`): one
+  array per field. String columns with few distinct values (class, fee type,
+  status) are dictionary-encoded as indexes into `dictionaries`:
+
+      {"count": 2, "fields": ["id", "status"],
+       "columns": {"id": [7, 9], "status": [0, 0]},
+       "dictionaries": {"status": ["returned"]}}
+
+Keyset pages keep their `next` / `next_cursor`: as keys next to the columns,
+or as a `Link: <...>; rel="next"` header for NDJSON. The async views render
+the same formats with alisting_response() and rendered_response().
+"""
+import itertools
+
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+# Rows fetched and encoded per step of a streamed response
+STREAM_CHUNK_SIZE = 2000
+
+
+def _encoder():
+    return JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def columnar(fields, rows):
+    """
+    The columnar document for `rows`, sequences of values in `fields` order.
+    Strings are dictionary-encoded as they are read; a column that turns out
+    to be mostly distinct (names, titles) is sent as plain values instead.
+    """
+    columns = [[] for _ in fields]
+    dictionaries = [{} for _ in fields]  # value -> code, or None once the column holds non-strings
+    count = 0
+    for row in rows:
+        count += 1
+        for index, value in enumerate(row):
+            dictionary = dictionaries[index]
+            if dictionary is not None and value is not None:
+                if isinstance(value, str):
+                    value = dictionary.setdefault(value, len(dictionary))
+                else:
+                    columns[index] = _decoded(columns[index], dictionary)
+                    dictionaries[index] = None
+            columns[index].append(value)
+
+    encoded = {}
+    for index, field in enumerate(fields):
+        dictionary = dictionaries[index]
+        if dictionary is None or not dictionary:
+            continue
+        if len(dictionary) * 2 > count:
+            columns[index] = _decoded(columns[index], dictionary)
+        else:
+            encoded[field] = list(dictionary)
+    return {'count': count, 'fields': list(fields), 'columns': dict(zip(fields, columns)), 'dictionaries': encoded}
+
+
+def _decoded(codes, dictionary):
+    words = list(dictionary)
+    return [None if code is None else words[code] for code in codes]
+
+
+def _split_page(data):
+    """(rows, other keys) for a keyset page or a plain list; (None, data) for anything else."""
+    if isinstance(data, list):
+        return data, {}
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return data['results'], {key: value for key, value in data.items() if key != 'results'}
+    return None, data
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows, extra = _split_page(data)
+        if rows is None:
+            rows = [data]
+        elif extra.get('next'):
+            response = (renderer_context or {}).get('response')
+            if response is not None:
+                response['Link'] = f'<{extra["next"]}>; rel="next"'
+        return _ndjson_lines(_encoder(), rows)
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    media_type = 'application/vnd.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows, extra = _split_page(data)
+        if rows is not None:
+            fields = list(rows[0]) if rows else []
+            data = {**extra, **columnar(fields, ([row.get(field) for field in fields] for row in rows))}
+        # Lists already built by listing_response(), and error bodies, go out as they are
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+LIST_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer, ColumnarJSONRenderer]
+
+
+def _ndjson_lines(encoder, rows):
+    return ''.join(encoder.encode(row) + '\n' for row in rows).encode()
+
+
+def _stream_ndjson(listing, querysets):
+    encoder = _encoder()
+    for queryset in querysets:
+        rows = queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)
+        while batch := list(itertools.islice(rows, STREAM_CHUNK_SIZE)):
+            yield _ndjson_lines(encoder, listing.represent(batch))
+
+
+async def _astream_ndjson(listing, querysets):
+    encoder = _encoder()
+    for queryset in querysets:
+        batch = []
+        async for row in queryset.aiterator(chunk_size=STREAM_CHUNK_SIZE):
+            batch.append(row)
+            if len(batch) == STREAM_CHUNK_SIZE:
+                yield _ndjson_lines(encoder, listing.represent(batch))
+                batch = []
+        if batch:
+            yield _ndjson_lines(encoder, listing.represent(batch))
+
+
+def listing_response(request, listing, sources, headers=None):
+    """
+    The unpaginated list of `sources` (one queryset per table) through the
+    ValuesListing `listing`, in the negotiated format. Rows are read with a
+    chunked cursor, NDJSON is streamed and columnar JSON is built column by
+    column, so no format holds every row as a dict at once except plain JSON.
+    """
+    # The stream is read after the view returns; keep the database (e.g. the replica) it picked
+    querysets = [listing.queryset(records).using(records.db) for records in sources]
+    renderer = getattr(request, 'accepted_renderer', None)
+    if isinstance(renderer, NDJSONRenderer):
+        return StreamingHttpResponse(_stream_ndjson(listing, querysets), content_type=renderer.media_type, headers=headers)
+
+    rows = itertools.chain.from_iterable(queryset.iterator(chunk_size=STREAM_CHUNK_SIZE) for queryset in querysets)
+    if isinstance(renderer, ColumnarJSONRenderer):
+        return Response(columnar(listing.names, listing.represent_values(rows)), headers=headers)
+    return Response(listing.represent(rows), headers=headers)
+
+
+def _content_type(renderer):
+    return f'{renderer.media_type}; charset={renderer.charset}' if renderer.charset else renderer.media_type
+
+
+def rendered_response(renderer, data, status=200, headers=None):
+    """A plain Django response with `data` rendered by `renderer`, for views outside DRF."""
+    response = HttpResponse(status=status, headers=headers, content_type=_content_type(renderer))
+    response.content = renderer.render(data, renderer.media_type, {'response': response})
+    return response
+
+
+async def alisting_response(request, listing, sources, headers=None):
+    """listing_response() for the async views, in `request.accepted_renderer`'s format."""
+    querysets = [listing.queryset(records).using(records.db) for records in sources]
+    renderer = request.accepted_renderer
+    if isinstance(renderer, NDJSONRenderer):
+        return StreamingHttpResponse(_astream_ndjson(listing, querysets), content_type=renderer.media_type, headers=headers)
+
+    rows = [row for queryset in querysets async for row in queryset.aiterator(chunk_size=STREAM_CHUNK_SIZE)]
+    if isinstance(renderer, ColumnarJSONRenderer):
+        return rendered_response(renderer, columnar(listing.names, listing.represent_values(rows)), headers=headers)
+    return rendered_response(renderer, listing.represent(rows), headers=headers)
@@ -0,0 +1,20 @@
+from .models import Student
+
+
+def visible_records(model, user):
+    """
+    The rows of a student-owned model (one with a `student` FK) that `user`
+    may see. Students only get their own rows, so ownership is part of the
+    same SELECT that loads the record instead of a follow-up check. Records
+    of students marked for purging are hidden from everyone, like the
+    students themselves.
+    """
+    # NOT IN over the partial deleted_at index: usually a handful of ids, and no join
+    queryset = model.objects.exclude(student__in=Student.all_objects.filter(deleted_at__isnull=False).values('pk'))
+    if user.user_type != 'student':
+        return queryset
+    student_id = getattr(user, 'student_id', None)
+    if student_id is not None:
+        # Stateless token users carry their profile id; no join needed
+        return queryset.filter(student_id=student_id)
+    return queryset.filter(student__user_id=user.id)
@@ -0,0 +1,214 @@
+"""
+Full-text search over students and library books with SQLite FTS5.
+
+app_student_fts and app_library_fts are external-content FTS5 tables: the
+text stays in app_student / app_libraryhistory, and triggers keep the
+index in step with every write, including bulk inserts and queryset updates
+that bypass model signals. Queries match every word as a prefix and rank
+with bm25. Where FTS5 is unavailable (another database, or a SQLite build
+without it) searches fall back to icontains.
+"""
+import re
+from dataclasses import dataclass
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.utils import OperationalError
+
+from .models import LibraryHistory, Student
+
+
+@dataclass
+class SearchIndex:
+    table: str
+    model: type
+    columns: tuple
+    weights: tuple  # bm25 column weights, in `columns` order
+
+
+INDEXES = {
+    'students': SearchIndex('app_student_fts', Student, ('name', 'roll_number', 'class_name'), (10.0, 5.0, 2.0)),
+    'books': SearchIndex('app_library_fts', LibraryHistory, ('book_name',), (1.0,)),
+}
+
+MAX_TERMS = 8
+
+# Copying or remaking app_student / app_libraryhistory (SQLite ALTERs) drops
+# the triggers; `migrate` (see install_search_index) and
+# `manage.py rebuild_search_index` put them back.
+SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS app_student_fts USING fts5(
+        name, roll_number, class_name,
+        content='app_student', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS app_student_fts_insert AFTER INSERT ON app_student BEGIN
+        INSERT INTO app_student_fts(rowid, name, roll_number, class_name)
+        VALUES (new.id, new.name, new.roll_number, new.class_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS app_student_fts_delete AFTER DELETE ON app_student BEGIN
+        INSERT INTO app_student_fts(app_student_fts, rowid, name, roll_number, class_name)
+        VALUES ('delete', old.id, old.name, old.roll_number, old.class_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS app_student_fts_update AFTER UPDATE OF name, roll_number, class_name ON app_student BEGIN
+        INSERT INTO app_student_fts(app_student_fts, rowid, name, roll_number, class_name)
+        VALUES ('delete', old.id, old.name, old.roll_number, old.class_name);
+        INSERT INTO app_student_fts(rowid, name, roll_number, class_name)
+        VALUES (new.id, new.name, new.roll_number, new.class_name);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS app_library_fts USING fts5(
+        book_name,
+        content='app_libraryhistory', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS app_library_fts_insert AFTER INSERT ON app_libraryhistory BEGIN
+        INSERT INTO app_library_fts(rowid, book_name) VALUES (new.id, new.book_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS app_library_fts_delete AFTER DELETE ON app_libraryhistory BEGIN
+        INSERT INTO app_library_fts(app_library_fts, rowid, book_name) VALUES ('delete', old.id, old.book_name);
+    END""",
+    # Status sweeps and returns don't touch book_name, so they don't reindex
+    """CREATE TRIGGER IF NOT EXISTS app_library_fts_update AFTER UPDATE OF book_name ON app_libraryhistory BEGIN
+        INSERT INTO app_library_fts(app_library_fts, rowid, book_name) VALUES ('delete', old.id, old.book_name);
+        INSERT INTO app_library_fts(rowid, book_name) VALUES (new.id, new.book_name);
+    END""",
+]
+
+DROP = [
+    'DROP TRIGGER IF EXISTS app_student_fts_insert',
+    'DROP TRIGGER IF EXISTS app_student_fts_delete',
+    'DROP TRIGGER IF EXISTS app_student_fts_update',
+    'DROP TABLE IF EXISTS app_student_fts',
+    'DROP TRIGGER IF EXISTS app_library_fts_insert',
+    'DROP TRIGGER IF EXISTS app_library_fts_delete',
+    'DROP TRIGGER IF EXISTS app_library_fts_update',
+    'DROP TABLE IF EXISTS app_library_fts',
+]
+
+
+
+
+def ensure_search_index(connection):
+    """Create the FTS tables and triggers if missing; False when FTS5 isn't available."""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)')
+        except OperationalError:
+            return False
+        cursor.execute('DROP TABLE temp.fts5_probe')
+        for statement in SCHEMA:
+            cursor.execute(statement)
+    return True
+
+
+def rebuild_search_index(connection, optimize=False):
+    """Recreate missing triggers and reindex every row; returns False without FTS5."""
+    if not ensure_search_index(connection):
+        return False
+    with connection.cursor() as cursor:
+        for index in INDEXES.values():
+            cursor.execute(f"INSERT INTO {index.table}({index.table}) VALUES ('rebuild')")
+            if optimize:
+                cursor.execute(f"INSERT INTO {index.table}({index.table}) VALUES ('optimize')")
+    return True
+
+
+def install_search_index(sender, using, **kwargs):
+    """post_migrate receiver: migrations that remake a table drop its triggers. Only once the index exists."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and {index.table for index in INDEXES.values()} <= set(connection.introspection.table_names()):
+        ensure_search_index(connection)
+
+
+def drop_search_index(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in DROP:
+            cursor.execute(statement)
+
+
+_available = {}
+
+
+def fts_available(using):
+    if using not in _available:
+        connection = connections[using]
+        _available[using] = (
+            connection.vendor == 'sqlite'
+            and {index.table for index in INDEXES.values()} <= set(connection.introspection.table_names())
+        )
+    return _available[using]
+
+
+def match_expression(text):
+    """FTS5 query for free text: every word as a quoted prefix, all required. None when there are no words."""
+    terms = re.findall(r'\w+', text or '')[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _fallback_q(index, text):
+    q = Q()
+    for term in re.findall(r'\w+', text or '')[:MAX_TERMS]:
+        q &= Q(*[Q(**{f'{column}__icontains': term}) for column in index.columns], _connector=Q.OR)
+    return q
+
+
+def search(index, text, limit, using='default', queryset=None):
+    """
+    Up to `limit` instances of `index.model` matching `text`, best match
+    first. `queryset` (all of `index.model.objects` by default) narrows the
+    rows that may be returned before the limit is applied.
+    """
+    match = match_expression(text)
+    if match is None:
+        return []
+    queryset = (index.model.objects.all() if queryset is None else queryset).using(using)
+    if not fts_available(using):
+        return list(queryset.filter(_fallback_q(index, text)).order_by('pk')[:limit])
+
+    weights = ', '.join(map(str, index.weights))
+    allowed, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s AND rowid IN ({allowed}) '
+            f'ORDER BY bm25({index.table}, {weights}) LIMIT %s',
+            [match, *params, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    found = queryset.in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
+
+
+def matching(index, text, using='default'):
+    """A filter selecting every row of `index.model` that matches `text`, for use in querysets."""
+    match = match_expression(text)
+    if match is None:
+        return Q(pk__in=[])
+    if not fts_available(using):
+        return _fallback_q(index, text)
+    return Q(pk__in=RawSQL(f'SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s', [match]))
+
+
+class FullTextSearchAdminMixin:
+    """
+    Admin search through the FTS index. `fts_search` lists (lookup, index)
+    pairs; a row is found when any of them matches, e.g. ('student', 'students')
+    finds library records by their student's name.
+    """
+    fts_search = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not self.fts_search or match_expression(search_term) is None:
+            return super().get_search_results(request, queryset, search_term)
+        q = Q()
+        for lookup, name in self.fts_search:
+            condition = matching(INDEXES[name], search_term, queryset.db)
+            if lookup == 'pk':
+                q |= condition
+            else:
+                q |= Q(**{f'{lookup}__in': INDEXES[name].model.objects.filter(condition).values('pk')})
+        return queryset.filter(q), False
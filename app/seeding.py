@@ -0,0 +1,179 @@
+"""
+Synthetic data for load tests and benchmarks. Everything is drawn from one
+seeded random.Random, so the same arguments produce the same rows on every
+machine (ids aside), and rows are generated and inserted one batch at a time
+so memory stays flat up to millions of records.
+"""
+import contextlib
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_version
+from .counters import recount_students
+from .models import FeeHistory, LibraryHistory, Student, User
+from .summaries import rebuild_fee_summary
+
+GRADES = range(1, 13)
+SECTIONS = 'ABCD'
+STAFF_ROLES = ('admin', 'office_staff', 'librarian')
+FEE_AMOUNTS = {
+    'tuition': [Decimal('1500.00'), Decimal('2500.00'), Decimal('4000.00')],
+    'transport': [Decimal('300.00'), Decimal('450.00')],
+    'library': [Decimal('50.00'), Decimal('75.00')],
+    'exam': [Decimal('200.00'), Decimal('350.00')],
+    'sports': [Decimal('120.00')],
+}
+REMARKS = [None, None, None, 'Paid online', 'Paid at office', 'Late payment']
+BOOK_TITLES = [
+    f'{adjective} {noun}'
+    for adjective in ('Modern', 'Applied', 'Introductory', 'Advanced', 'Practical', 'Illustrated', 'Concise')
+    for noun in ('Algebra', 'Physics', 'Chemistry', 'Biology', 'History', 'Geography', 'Literature', 'Economics')
+]
+
+
+def _insert_rows(model, fields, rows):
+    """
+    executemany with values already adapted for the database. bulk_create
+    spends most of its time preparing each value, which dominates at
+    millions of rows.
+    """
+    ops = connection.ops
+    columns = ', '.join(ops.quote_name(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {ops.quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})', rows)
+
+
+@contextlib.contextmanager
+def _bulk_load_pragmas():
+    """Skip fsyncs and enlarge the page cache while seeding SQLite; the data is synthetic and re-creatable."""
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        # synchronous can't change inside a transaction
+        yield
+        return
+    with connection.cursor() as cursor:
+        saved = {name: cursor.execute(f'PRAGMA {name}').fetchone()[0] for name in ('synchronous', 'cache_size')}
+        cursor.execute('PRAGMA synchronous=OFF')
+        cursor.execute('PRAGMA cache_size=-262144')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for name, value in saved.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+
+
+@contextlib.contextmanager
+def _deferred_indexes(models):
+    """Drop the models' Meta indexes for the load and build them once at the end."""
+    with connection.schema_editor() as editor:
+        for model in models:
+            for index in model._meta.indexes:
+                editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for model in models:
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+
+
+def _batches(count, batch_size):
+    for start in range(0, count, batch_size):
+        yield start, min(batch_size, count - start)
+
+
+@_bulk_load_pragmas()
+def seed_data(students, library, fees, staff=3, prefix='seed', password='password', seed=0,
+              days=730, batch_size=5000, defer_indexes=False, progress=None):
+    """
+    Insert `staff` users per staff role, `students` student users with
+    profiles, and `library` / `fees` records spread over those students and
+    the last `days` days. Every user shares `password` (hashed once).
+    `defer_indexes` builds the record tables' indexes after the load instead
+    of row by row, which is faster when the tables start out (nearly) empty.
+    Returns {table: rows inserted}.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    password_hash = make_password(password)
+    classes = [f'{grade}-{section}' for grade in GRADES for section in SECTIONS]
+    progress = progress or (lambda table, done, total: None)
+    counts = {'users': 0, 'students': 0, 'library': 0, 'fees': 0}
+
+    staff_users = [
+        User(username=f'{prefix}_{role}_{n}', password=password_hash, user_type=role, is_staff=role == 'admin')
+        for role in STAFF_ROLES for n in range(staff)
+    ]
+    User.objects.bulk_create(staff_users, batch_size=batch_size)
+    counts['users'] += len(staff_users)
+
+    student_ids = []
+    for start, size in _batches(students, batch_size):
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f'{prefix}_student_{n}', password=password_hash, user_type='student')
+                for n in range(start, start + size)
+            ])
+            profiles = Student.objects.bulk_create([
+                Student(
+                    user_id=user.pk,
+                    name=f'Student {n}',
+                    # Consecutive students go round the classes, so rolls are unique per class
+                    roll_number=f'{prefix}{n // len(classes) + 1}',
+                    class_name=classes[n % len(classes)],
+                )
+                for n, user in enumerate(users, start)
+            ])
+        student_ids.extend(profile.pk for profile in profiles)
+        counts['users'] += size
+        counts['students'] += size
+        progress('students', start + size, students)
+
+    if not student_ids and (library or fees):
+        raise ValueError('Library and fee records need at least one student.')
+
+    ops = connection.ops
+    now = ops.adapt_datetimefield_value(timezone.now())
+    # dates[14 + n] is n days ago; loans fall due 14 days after they are borrowed
+    dates = [ops.adapt_datefield_value(today - timedelta(days=n)) for n in range(-14, days)]
+
+    with _deferred_indexes([LibraryHistory, FeeHistory]) if defer_indexes else contextlib.nullcontext():
+        for start, size in _batches(library, batch_size):
+            rows = []
+            for _ in range(size):
+                age = rng.randrange(days)
+                # Most overdue loans have come back; recent ones are still out
+                status = 'returned' if age > 14 and rng.random() < 0.9 else 'borrowed'
+                rows.append((rng.choice(student_ids), rng.choice(BOOK_TITLES), dates[14 + age], dates[age], status, now))
+            _insert_rows(LibraryHistory, ('student', 'book_name', 'borrow_date', 'return_date', 'status', 'updated_at'), rows)
+            counts['library'] += size
+            progress('library', start + size, library)
+
+        amounts = {fee_type: [ops.adapt_decimalfield_value(amount, 10, 2) for amount in choices]
+                   for fee_type, choices in FEE_AMOUNTS.items()}
+        fee_types = list(FEE_AMOUNTS)
+        for start, size in _batches(fees, batch_size):
+            rows = []
+            for _ in range(size):
+                fee_type = rng.choice(fee_types)
+                rows.append((
+                    rng.choice(student_ids), fee_type, rng.choice(amounts[fee_type]), dates[14 + rng.randrange(days)],
+                    rng.choice(REMARKS), now, now,
+                ))
+            _insert_rows(FeeHistory, ('student', 'fee_type', 'amount', 'payment_date', 'remarks', 'created_at', 'updated_at'), rows)
+            counts['fees'] += size
+            progress('fees', start + size, fees)
+
+    if fees:
+        rebuild_fee_summary()
+    if library or fees:
+        recount_students()
+    bump_version('user', 'student')
+    return counts
@@ -1,12 +1,29 @@
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from rest_framework import serializers
-from .models import FeeHistory, Student, User,LibraryHistory
+from .fieldsets import SparseFieldsMixin
+from .instrumentation import TimedSerializerMixin
+from .models import FeeHistory, FeeSummary, Job, Student, User,LibraryHistory
 
-class StudentSerializer(serializers.ModelSerializer):
+class StudentSerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Student
-        fields = ['name', 'roll_number', 'class_name']
+        fields = ['name', 'roll_number', 'class_name', 'active_loans', 'fees_paid', 'last_payment_date']
+        # Both columns stay optional; uniqueness is only checked once both are known
+        validators = []
 
-class UserSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        class_name = attrs.get('class_name', getattr(self.instance, 'class_name', None))
+        roll_number = attrs.get('roll_number', getattr(self.instance, 'roll_number', None))
+        if class_name is not None and roll_number is not None:
+            # Students awaiting purge still hold their roll number
+            clashes = Student.all_objects.filter(class_name=class_name, roll_number=roll_number)
+            if self.instance is not None:
+                clashes = clashes.exclude(pk=self.instance.pk)
+            if clashes.exists():
+                raise serializers.ValidationError({'roll_number': 'This roll number is already taken in this class.'})
+        return attrs
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     student = StudentSerializer(required=False)  
 
     class Meta:
@@ -27,15 +44,33 @@ class UserSerializer(serializers.ModelSerializer):
 
         return user
 
-    
 
-class LibrarySerializer(serializers.ModelSerializer):
+
+class BulkStudentSerializer(StudentSerializer):
+    # Roll number clashes are checked for the whole batch in app.provisioning
+    def validate(self, attrs):
+        return attrs
+
+
+class BulkUserSerializer(UserSerializer):
+    student = BulkStudentSerializer(required=False)
+
+    class Meta(UserSerializer.Meta):
+        # Username uniqueness is checked for the whole batch in app.provisioning
+        extra_kwargs = {
+            'password': {'write_only': True},
+            'username': {'validators': [UnicodeUsernameValidator()]},
+        }
+
+
+class LibrarySerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = LibraryHistory
         fields = '__all__'
 
-class FeeHistorySerializer(serializers.ModelSerializer):
-    student_name = serializers.ReadOnlyField(source="student.username") 
+class FeeHistorySerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    # Views load `student` with select_related() so this costs no extra query per row
+    student_name = serializers.ReadOnlyField(source="student.name")
 
     class Meta:
         model = FeeHistory
@@ -44,3 +79,47 @@ class FeeHistorySerializer(serializers.ModelSerializer):
             "payment_date", "remarks",  "created_at", "updated_at"
         ]
         read_only_fields = [ "created_at", "updated_at"]
+
+
+class BulkFeeSerializer(serializers.ModelSerializer):
+    # A plain id: students are resolved for the whole batch in app.provisioning
+    student = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = FeeHistory
+        fields = ['student', 'fee_type', 'amount', 'payment_date', 'remarks']
+
+
+class FeeTotalSerializer(serializers.Serializer):
+    fee_type = serializers.CharField()
+    total = serializers.DecimalField(max_digits=14, decimal_places=2)
+    count = serializers.IntegerField()
+
+
+class FeeSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    month = serializers.DateField(format='%Y-%m')
+
+    class Meta:
+        model = FeeSummary
+        fields = ['class_name', 'fee_type', 'month', 'total', 'count']
+
+
+class JobStatusSerializer(serializers.ModelSerializer):
+    percent = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'status', 'progress', 'total', 'percent', 'attempts', 'max_attempts', 'error',
+            'cancel_requested', 'created_at', 'started_at', 'finished_at',
+        ]
+
+    def get_percent(self, job):
+        if job.status == 'succeeded':
+            return 100
+        return min(100, job.progress * 100 // job.total) if job.total else None
+
+
+class JobSerializer(JobStatusSerializer):
+    class Meta(JobStatusSerializer.Meta):
+        fields = JobStatusSerializer.Meta.fields + ['result']
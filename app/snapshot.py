@@ -0,0 +1,327 @@
+"""
+Snapshot export of fee, library and student tables.
+
+Each table is written per academic year as CSV and as a small typed columnar
+file (`.scol`). A `.scol` file is a magic line followed by row groups:
+
+    b'SCOL1\\n' ( <uint32 length> <zlib(header_len, header JSON, column blobs)> )*
+
+Column blobs are little-endian: `int` as int64, `decimal` as int64 scaled by
+10**scale, `date` as int32 days since 1970-01-01, `datetime` as int64
+microseconds since the epoch (UTC), and `str` as a dictionary plus uint32
+codes. Every column carries a one-byte-per-row null mask.
+
+Runs are driven by the change log (app.changes): a full export records the
+newest ChangeLog id and writes every row, and each later run replays the
+entries after it, appending the current state of the rows they name, or a
+tombstone to `deleted.*` for rows deleted or students marked for purging.
+SQLite serializes writers, so a change committed late still gets an id past
+the cursor and is never skipped. Every row and tombstone carries the
+`change_id` it was exported at; a row whose year changed, or that changed
+twice, appears in more than one place, and readers (see `load_table`) keep
+the entry with the highest change_id for each id and drop tombstoned ids.
+"""
+import csv
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+
+from .changes import pruned_after
+from .models import ChangeLog, FeeHistory, FeeHistoryArchive, LibraryHistory, LibraryHistoryArchive, Student
+
+MAGIC = b'SCOL1\n'
+EPOCH_DATE = date(1970, 1, 1)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+CHANGE_COLUMN = ('change_id', 'int')
+TOMBSTONE_COLUMNS = [('id', 'int'), CHANGE_COLUMN]
+
+
+@dataclass
+class SnapshotTable:
+    name: str
+    model: type
+    columns: list  # (field, type) pairs; type is int, str, date, datetime or decimal:<scale>
+    partition_field: str = None  # date column that picks the academic year
+    archive_model: type = None  # closed years moved out of `model` (app.archive), exported with it
+
+    @property
+    def rows(self):
+        """Querysets of the rows to export; students marked for purging count as deleted."""
+        if self.model is Student:
+            return [Student.all_objects.filter(deleted_at__isnull=True)]
+        return [model.objects.all() for model in (self.model, self.archive_model) if model]
+
+
+TABLES = [
+    SnapshotTable(
+        'students', Student,
+        [('id', 'int'), ('user_id', 'int'), ('name', 'str'), ('roll_number', 'str'), ('class_name', 'str')],
+    ),
+    SnapshotTable(
+        'library', LibraryHistory,
+        [('id', 'int'), ('student_id', 'int'), ('book_name', 'str'), ('borrow_date', 'date'),
+         ('return_date', 'date'), ('status', 'str'), ('updated_at', 'datetime')],
+        partition_field='borrow_date', archive_model=LibraryHistoryArchive,
+    ),
+    SnapshotTable(
+        'fees', FeeHistory,
+        [('id', 'int'), ('student_id', 'int'), ('fee_type', 'str'), ('amount', 'decimal:2'),
+         ('payment_date', 'date'), ('remarks', 'str'), ('created_at', 'datetime'), ('updated_at', 'datetime')],
+        partition_field='payment_date', archive_model=FeeHistoryArchive,
+    ),
+]
+
+
+def academic_year(value):
+    """'2024-25' for any date from the configured start month of 2024 up to the month before it in 2025."""
+    start_month = getattr(settings, 'ACADEMIC_YEAR_START_MONTH', 6)
+    start = value.year if value.month >= start_month else value.year - 1
+    return f'{start}-{(start + 1) % 100:02d}'
+
+
+# Columnar encoding
+
+def _le(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _encode_column(kind, values):
+    mask = bytes(value is None for value in values)
+    if kind == 'str':
+        dictionary, codes = {}, array('I')
+        for value in values:
+            codes.append(dictionary.setdefault(value or '', len(dictionary)))
+        words = [word.encode() for word in dictionary]
+        body = struct.pack('<I', len(words)) + b''.join(struct.pack('<I', len(w)) + w for w in words) + _le(codes)
+    elif kind == 'date':
+        body = _le(array('i', [(v - EPOCH_DATE).days if v is not None else 0 for v in values]))
+    elif kind == 'datetime':
+        body = _le(array('q', [(v - EPOCH) // timedelta(microseconds=1) if v is not None else 0 for v in values]))
+    elif kind.startswith('decimal:'):
+        scale = 10 ** int(kind.split(':')[1])
+        body = _le(array('q', [int(v * scale) if v is not None else 0 for v in values]))
+    else:
+        body = _le(array('q', [v if v is not None else 0 for v in values]))
+    return mask + body
+
+
+def _decode_column(kind, data, rows):
+    mask, body = data[:rows], data[rows:]
+    if kind == 'str':
+        (count,), offset, words = struct.unpack_from('<I', body), 4, []
+        for _ in range(count):
+            (length,) = struct.unpack_from('<I', body, offset)
+            words.append(body[offset + 4:offset + 4 + length].decode())
+            offset += 4 + length
+        values = [words[code] for code in _from_le('I', body[offset:])]
+    elif kind == 'date':
+        values = [EPOCH_DATE + timedelta(days=v) for v in _from_le('i', body)]
+    elif kind == 'datetime':
+        values = [EPOCH + timedelta(microseconds=v) for v in _from_le('q', body)]
+    elif kind.startswith('decimal:'):
+        scale = int(kind.split(':')[1])
+        values = [Decimal(v).scaleb(-scale) for v in _from_le('q', body)]
+    else:
+        values = list(_from_le('q', body))
+    return [None if null else value for null, value in zip(mask, values)]
+
+
+def write_row_group(path, columns, rows):
+    blobs = [_encode_column(kind, [row[i] for row in rows]) for i, (_, kind) in enumerate(columns)]
+    header = json.dumps({
+        'rows': len(rows),
+        'columns': [{'name': name, 'type': kind} for name, kind in columns],
+        'lengths': [len(blob) for blob in blobs],
+    }).encode()
+    payload = zlib.compress(struct.pack('<I', len(header)) + header + b''.join(blobs))
+    new = not path.exists()
+    with open(path, 'ab') as fh:
+        if new:
+            fh.write(MAGIC)
+        fh.write(struct.pack('<I', len(payload)) + payload)
+
+
+def read_columnar(path):
+    """Load a `.scol` file into {column: [values]}, concatenating every row group."""
+    data = Path(path).read_bytes()
+    if not data.startswith(MAGIC):
+        raise ValueError(f'{path} is not a snapshot column file')
+    offset, result = len(MAGIC), {}
+    while offset < len(data):
+        (length,) = struct.unpack_from('<I', data, offset)
+        payload = zlib.decompress(data[offset + 4:offset + 4 + length])
+        offset += 4 + length
+        (header_len,) = struct.unpack_from('<I', payload)
+        header = json.loads(payload[4:4 + header_len])
+        position = 4 + header_len
+        for column, size in zip(header['columns'], header['lengths']):
+            values = _decode_column(column['type'], payload[position:position + size], header['rows'])
+            result.setdefault(column['name'], []).extend(values)
+            position += size
+    return result
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def write_csv_rows(path, columns, rows):
+    new = not path.exists()
+    with open(path, 'a', newline='', encoding='utf-8') as fh:
+        writer = csv.writer(fh)
+        if new:
+            writer.writerow([name for name, _ in columns])
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+
+
+# Export
+
+def _load_manifest(path):
+    if path.exists():
+        return json.loads(path.read_text())
+    return {'version': 1, 'tables': {}, 'runs': []}
+
+
+def _save_manifest(path, manifest):
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, path)
+
+
+def _write(table_dir, partition, columns, rows, formats, state):
+    if 'csv' in formats:
+        write_csv_rows(table_dir / f'{partition}.csv', columns, rows)
+    if 'columnar' in formats:
+        write_row_group(table_dir / f'{partition}.scol', columns, rows)
+    files = state.setdefault('partitions', {})
+    files[partition] = files.get(partition, 0) + len(rows)
+
+
+def _write_rows(table, table_dir, rows, formats, state):
+    partitions = {}
+    if table.partition_field:
+        index = [name for name, _ in table.columns].index(table.partition_field)
+        for row in rows:
+            partitions.setdefault(f'year={academic_year(row[index])}', []).append(row)
+    else:
+        partitions['all'] = rows
+    for partition, partition_rows in partitions.items():
+        _write(table_dir, partition, table.columns + [CHANGE_COLUMN], partition_rows, formats, state)
+
+
+def export_table(table, out_dir, state, formats, chunk_size):
+    """Append the rows changed since `state['since']` (a ChangeLog id), or all of them on the first run."""
+    fields = [name for name, _ in table.columns]
+    resource = ChangeLog.objects.filter(resource=table.name)
+    table_dir = out_dir / table.name
+    table_dir.mkdir(parents=True, exist_ok=True)
+    since = state.get('since')
+    # A new layout, or entries after the cursor pruned from the change log: start the table over
+    if state.get('columns') != fields or since is None or pruned_after(since):
+        for path in table_dir.glob('*.*'):
+            path.unlink()
+        state.clear()
+        since = None
+    state['columns'] = fields
+    exported = 0
+
+    if since is None:
+        # Anything committed after this id is replayed by the next run
+        since = ChangeLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        for queryset in table.rows:
+            last_id = 0
+            while True:
+                rows = list(queryset.filter(id__gt=last_id).order_by('id').values_list(*fields)[:chunk_size])
+                if not rows:
+                    break
+                _write_rows(table, table_dir, [row + (since,) for row in rows], formats, state)
+                last_id = rows[-1][0]
+                exported += len(rows)
+
+    while True:
+        entries = list(resource.filter(id__gt=since).order_by('id').values_list('id', 'object_id', 'deleted')[:chunk_size])
+        if not entries:
+            break
+        latest = {object_id: (change_id, deleted) for change_id, object_id, deleted in entries}
+        found = {}
+        for queryset in table.rows:
+            missing = [object_id for object_id, (_, deleted) in latest.items() if not deleted and object_id not in found]
+            found.update((row[0], row) for row in queryset.filter(id__in=missing).values_list(*fields))
+        # A row missing from both tables was deleted by a later entry, which tombstones it
+        rows = [row + (latest[object_id][0],) for object_id, row in sorted(found.items())]
+        tombstones = [(object_id, change_id) for object_id, (change_id, deleted) in latest.items() if deleted]
+        if rows:
+            _write_rows(table, table_dir, rows, formats, state)
+        if tombstones:
+            _write(table_dir, 'deleted', TOMBSTONE_COLUMNS, tombstones, formats, state)
+        since = entries[-1][0]
+        exported += len(rows) + len(tombstones)
+
+    state['since'] = since
+    state['rows'] = state.get('rows', 0) + exported
+    return exported
+
+
+def load_table(out_dir, name):
+    """The current rows of an exported table from its columnar files, as {id: {column: value}}."""
+    latest, removed = {}, {}
+    for path in sorted((Path(out_dir) / name).glob('*.scol')):
+        columns = read_columnar(path)
+        names = list(columns)
+        for values in zip(*columns.values()):
+            row = dict(zip(names, values))
+            target = removed if path.stem == 'deleted' else latest
+            if row['change_id'] >= target.get(row['id'], {}).get('change_id', -1):
+                target[row['id']] = row
+    return {
+        object_id: row for object_id, row in latest.items()
+        if row['change_id'] > removed.get(object_id, {}).get('change_id', -1)
+    }
+
+
+def export_snapshot(out_dir, formats=('csv', 'columnar'), full=False, chunk_size=5000, tables=None):
+    """Export every table (or `tables`) to `out_dir`; returns {table: rows written this run}."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / 'manifest.json'
+    manifest = _load_manifest(manifest_path)
+    if full or manifest.get('formats', list(formats)) != list(formats):
+        for table in TABLES:
+            for path in (out_dir / table.name).glob('*.*'):
+                path.unlink()
+        manifest = {'version': 1, 'tables': {}, 'runs': []}
+    manifest['formats'] = list(formats)
+
+    written = {}
+    for table in TABLES:
+        if tables and table.name not in tables:
+            continue
+        state = manifest['tables'].setdefault(table.name, {})
+        written[table.name] = export_table(table, out_dir, state, formats, chunk_size)
+
+    manifest['runs'] = manifest['runs'][-29:] + [{'at': datetime.now(timezone.utc).isoformat(), 'rows': written}]
+    _save_manifest(manifest_path, manifest)
+    return written
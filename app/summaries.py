@@ -0,0 +1,153 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import FeeHistory, FeeHistoryArchive, FeeSummary, Student
+
+
+def fee_summary_key(record):
+    """The FeeSummary group a FeeHistory row belongs to, as of now."""
+    return summary_key(record.student.class_name, record.fee_type, record.payment_date)
+
+
+def summary_key(class_name, fee_type, payment_date):
+    return (class_name or '', fee_type, payment_date.replace(day=1))
+
+
+def bump_fee_summary(key, amount, count):
+    class_name, fee_type, month = key
+    group = FeeSummary.objects.filter(class_name=class_name, fee_type=fee_type, month=month)
+    if group.update(total=F('total') + amount, count=F('count') + count):
+        if count < 0:
+            group.filter(count__lte=0).delete()
+        return
+    if count <= 0:
+        # Nothing to take the fees out of: never start a group below zero
+        return
+    try:
+        with transaction.atomic():
+            FeeSummary.objects.create(class_name=class_name, fee_type=fee_type, month=month, total=amount, count=count)
+    except IntegrityError:
+        # Another writer created the group first
+        group.update(total=F('total') + amount, count=F('count') + count)
+
+
+def fee_added(record):
+    bump_fee_summary(fee_summary_key(record), record.amount, 1)
+
+
+def _bump_groups(keyed_amounts, sign):
+    groups = {}
+    for key, amount in keyed_amounts:
+        total, count = groups.get(key, (0, 0))
+        groups[key] = (total + amount, count + 1)
+    for key, (total, count) in groups.items():
+        bump_fee_summary(key, sign * total, sign * count)
+
+
+def fees_added(records):
+    """fee_added for a batch, with one update (or insert) per group instead of one per record."""
+    _bump_groups(((fee_summary_key(record), record.amount) for record in records), 1)
+
+
+def fees_removed(keyed_amounts):
+    """fee_removed for a batch of (summary_key(...), amount) pairs, one update per group."""
+    _bump_groups(keyed_amounts, -1)
+
+
+def fee_removed(record):
+    bump_fee_summary(fee_summary_key(record), -record.amount, -1)
+
+
+def fee_changed(record, old_key, old_amount):
+    """Move an edited fee between groups, or adjust its group's total in place."""
+    new_key = fee_summary_key(record)
+    if new_key == old_key:
+        if record.amount != old_amount:
+            bump_fee_summary(new_key, record.amount - old_amount, 0)
+    else:
+        bump_fee_summary(old_key, -old_amount, -1)
+        bump_fee_summary(new_key, record.amount, 1)
+
+
+def _group_totals(**filters):
+    """(summary key, total, count) per group of the fees matching `filters`, over FeeHistory and its archive."""
+    merged = {}
+    for model in (FeeHistory, FeeHistoryArchive):
+        groups = (
+            model.objects.filter(**filters)
+            .annotate(month=TruncMonth('payment_date'))
+            .values('student__class_name', 'fee_type', 'month')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+        )
+        for group in groups:
+            key = (group['student__class_name'] or '', group['fee_type'], group['month'])
+            total, count = merged.get(key, (0, 0))
+            merged[key] = (total + group['total'], count + group['count'])
+    return merged
+
+
+def students_deleted(student_ids):
+    """Take the fees of students about to be deleted (their records go by cascade) out of the summary."""
+    student_ids = list(student_ids)
+    for start in range(0, len(student_ids), 500):
+        for key, (total, count) in _group_totals(student_id__in=student_ids[start:start + 500]).items():
+            bump_fee_summary(key, -total, -count)
+
+
+def student_class_changed(student_id, old_class_name):
+    """
+    Move a student's fees from the groups of `old_class_name` to those of
+    their current class: groups are keyed by the student's class as of now,
+    as rebuild_fee_summary computes them.
+    """
+    for (class_name, fee_type, month), (total, count) in _group_totals(student_id=student_id).items():
+        if class_name != (old_class_name or ''):
+            bump_fee_summary((old_class_name or '', fee_type, month), -total, -count)
+            bump_fee_summary((class_name, fee_type, month), total, count)
+
+
+class FeeSummaryAdminMixin:
+    """
+    Keeps the fee summary in step with admin class changes and deletes of
+    students, or of users whose student profile goes with them by cascade.
+    """
+    student_lookup = 'pk'  # the Student field that holds this admin's object, e.g. 'user'
+
+    def _students(self, **lookup):
+        return Student.all_objects.filter(**lookup).values_list('pk', flat=True)
+
+    def save_model(self, request, obj, form, change):
+        if not (change and isinstance(obj, Student) and 'class_name' in form.changed_data):
+            return super().save_model(request, obj, form, change)
+        with transaction.atomic():
+            old_class_name = Student.all_objects.filter(pk=obj.pk).values_list('class_name', flat=True).get()
+            super().save_model(request, obj, form, change)
+            student_class_changed(obj.pk, old_class_name)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            students_deleted(self._students(**{self.student_lookup: obj.pk}))
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            students_deleted(self._students(**{f'{self.student_lookup}__in': queryset.values('pk')}))
+            super().delete_queryset(request, queryset)
+
+
+def rebuild_fee_summary():
+    """Recompute every group from FeeHistory and its archive, with one aggregate query per table."""
+    merged = _group_totals()
+
+    with transaction.atomic():
+        FeeSummary.objects.all().delete()
+        FeeSummary.objects.bulk_create(
+            [
+                FeeSummary(class_name=class_name, fee_type=fee_type, month=month, total=total, count=count)
+                for (class_name, fee_type, month), (total, count) in merged.items()
+            ],
+            batch_size=500,
+        )
+    return len(merged)
@@ -1,3 +1,1391 @@
-from django.test import TestCase
+import json
+import tempfile
+import time
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .cache import listing_cache
+from .models import FeeHistory, FeeHistoryArchive, FeeSummary, Job, LibraryHistory, Student, User
+
+
+class QueryBudgetMixin:
+    """
+    Fails a test when an endpoint's query count depends on how many rows it
+    returns. `grow` adds rows between the two measured calls. The listing
+    cache is cleared first so both calls measure the database path.
+    """
+
+    def assertQueryBudget(self, fetch, grow, max_queries=None):
+        listing_cache().clear()
+        with CaptureQueriesContext(connection) as before:
+            fetch()
+        grow()
+        listing_cache().clear()
+        with CaptureQueriesContext(connection) as after:
+            fetch()
+        self.assertEqual(
+            len(before), len(after),
+            f'query count grew with rows: {len(before)} -> {len(after)}\n'
+            + '\n'.join(q['sql'] for q in after.captured_queries),
+        )
+        if max_queries is not None:
+            self.assertLessEqual(len(after), max_queries)
+
+
+def make_student(username, class_name='10A'):
+    user = User.objects.create_user(username=username, user_type='student')
+    return Student.objects.create(user=user, name=username.title(), roll_number=username, class_name=class_name)
+
+
+class ListQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', user_type='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.counter = 0
+
+    def add_records(self, count=5):
+        for _ in range(count):
+            self.counter += 1
+            student = make_student(f'student{self.counter}')
+            LibraryHistory.objects.create(
+                student=student, book_name='Book', borrow_date=date(2024, 6, 1), return_date=date(2024, 6, 15),
+            )
+            FeeHistory.objects.create(student=student, fee_type='tuition', amount=100, payment_date=date(2024, 6, 1))
+
+    def test_list_endpoints(self):
+        self.add_records(1)
+        for url in ['/api/add-users/', '/api/students/', '/api/library/', '/api/fees/', '/api/fees/?page_size=20']:
+            with self.subTest(url=url):
+                self.assertQueryBudget(lambda: self.client.get(url), self.add_records)
+
+    def test_fee_student_name(self):
+        self.add_records(1)
+        response = self.client.get('/api/fees/')
+        self.assertEqual(response.data[0]['student_name'], 'Student1')
+
+    def test_admin_changelists(self):
+        superuser = User.objects.create_superuser(username='root', password='pass1234', email='root@example.com')
+        self.client.force_login(superuser)
+        self.add_records(1)
+        for url in ['/admin/app/user/', '/admin/app/student/', '/admin/app/libraryhistory/', '/admin/app/feehistory/']:
+            with self.subTest(url=url):
+                self.assertQueryBudget(lambda: self.client.get(url), self.add_records)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user(username='admin', user_type='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        student = make_student('student1')
+        for day in [3, 1, 2, 1, 3]:
+            LibraryHistory.objects.create(
+                student=student, book_name='Book', borrow_date=date(2024, 6, day), return_date=date(2024, 6, 20),
+            )
+
+    def test_walks_every_row_once_in_order(self):
+        url, seen = '/api/library/?page_size=2', []
+        while url:
+            response = self.client.get(url)
+            seen.extend((row['borrow_date'], row['id']) for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), 5)
+
+    def test_invalid_cursor(self):
+        import base64
+
+        self.assertEqual(self.client.get('/api/library/?cursor=bogus').status_code, 404)
+        tampered = [
+            ('/api/library/', ['2024-13-45', 1]), ('/api/library/', ['2024-06-01', 'x']), ('/api/library/', [[1], {'a': 1}]),
+            ('/api/add-users/', ['yesterday', 1]), ('/api/students/', ['x']), ('/api/students/', [[1]]),
+        ]
+        for url, key in tampered:
+            cursor = base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+            self.assertEqual(self.client.get(f'{url}?cursor={cursor}').status_code, 404, (url, key))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], BULK_HASH_WORKERS=1)
+class BulkProvisionTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user(username='admin', user_type='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        make_student('taken', class_name='10A')
+
+    def test_reports_row_errors_without_aborting(self):
+        rows = [
+            {'username': 'new1', 'password': 'pw', 'user_type': 'student', 'name': 'New', 'roll_number': '1', 'class_name': '10A'},
+            {'username': 'taken', 'password': 'pw', 'user_type': 'student'},
+            {'username': 'new2', 'password': 'pw', 'user_type': 'student', 'roll_number': 'taken', 'class_name': '10A'},
+            {'username': 'new3', 'user_type': 'librarian'},
+        ]
+        response = self.client.post('/api/students/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error', 'error', 'error'])
+        user = User.objects.get(username='new1')
+        self.assertTrue(user.check_password('pw'))
+        self.assertEqual(user.student_profile.roll_number, '1')
+
+    def test_rows_taken_by_a_concurrent_request_are_reported(self):
+        rows = [
+            {'username': 'new1', 'password': 'pw', 'user_type': 'student', 'roll_number': '1', 'class_name': '10A'},
+            {'username': 'taken', 'password': 'pw', 'user_type': 'student', 'roll_number': '2', 'class_name': '10A'},
+            {'username': 'new2', 'password': 'pw', 'user_type': 'student', 'roll_number': 'taken', 'class_name': '10A'},
+        ]
+        filter_students = Student.all_objects.filter
+
+        def no_rolls_taken(**lookups):
+            return Student.all_objects.none() if 'roll_number__in' in lookups else filter_students(**lookups)
+
+        # As if the clashing rows were inserted between the uniqueness checks and the insert
+        with mock.patch('app.provisioning._existing', return_value=set()), \
+                mock.patch.object(Student.all_objects, 'filter', side_effect=no_rolls_taken):
+            response = self.client.post('/api/students/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'error', 'error'])
+        self.assertIn('username', results[1]['errors'])
+        self.assertIn('student', results[2]['errors'])
+        self.assertEqual(Student.objects.get(user__username='new1').roll_number, '1')
+        self.assertFalse(User.objects.filter(username='new2').exists())
+
+    def test_csv_body(self):
+        body = 'username,password,user_type,name,roll_number,class_name\ncsv1,pw,student,Csv,7,10B\n'
+        response = self.client.generic('POST', '/api/students/bulk/', body, content_type='text/csv')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Student.objects.get(user__username='csv1').class_name, '10B')
+
+
+class SnapshotExportTests(TestCase):
+    def test_incremental_export_round_trips(self):
+        from .snapshot import export_snapshot, read_columnar
+
+        student = make_student('student1')
+        fee = FeeHistory.objects.create(student=student, fee_type='tuition', amount='12.50', payment_date=date(2024, 7, 1))
+        FeeHistory.objects.create(student=student, fee_type='bus', amount='3.00', payment_date=date(2024, 3, 1))
+        with tempfile.TemporaryDirectory() as out:
+            self.assertEqual(export_snapshot(out, chunk_size=1)['fees'], 2)
+            fee.amount = Decimal('20.00')
+            fee.save()
+            self.assertEqual(export_snapshot(out)['fees'], 1)
+
+            columns = read_columnar(Path(out) / 'fees' / 'year=2024-25.scol')
+            self.assertEqual(columns['id'], [fee.id, fee.id])
+            self.assertEqual(columns['amount'], [Decimal('12.50'), Decimal('20.00')])
+            self.assertTrue((Path(out) / 'fees' / 'year=2023-24.csv').exists())
+
+    def test_edits_and_deletions_converge(self):
+        from .archive import archive_closed_years
+        from .purge import mark_deleted, purge_deleted_students
+        from .snapshot import export_snapshot, load_table
+
+        student, other = make_student('student1'), make_student('student2')
+        fee = FeeHistory.objects.create(student=student, fee_type='tuition', amount='12.50', payment_date=date(2024, 7, 1))
+        kept = FeeHistory.objects.create(student=other, fee_type='bus', amount='3.00', payment_date=date(2024, 7, 2))
+        with tempfile.TemporaryDirectory() as out:
+            export_snapshot(out)
+            other.name = 'Renamed'
+            other.save()
+            fee.payment_date = date(2024, 3, 1)
+            fee.save()
+            export_snapshot(out)
+            self.assertEqual(load_table(out, 'students')[other.id]['name'], 'Renamed')
+            self.assertEqual(load_table(out, 'fees')[fee.id]['payment_date'], date(2024, 3, 1))
+
+            archive_closed_years(date(2024, 6, 1))
+            mark_deleted(Student.objects.filter(pk=student.pk))
+            export_snapshot(out)
+            self.assertEqual(list(load_table(out, 'students')), [other.id])
+            self.assertEqual(sorted(load_table(out, 'fees')), [fee.id, kept.id])
+            purge_deleted_students()
+            export_snapshot(out)
+            self.assertEqual(list(load_table(out, 'fees')), [kept.id])
+
+    def test_change_with_an_older_timestamp_is_not_skipped(self):
+        from .snapshot import export_snapshot, load_table
+
+        student = make_student('student1')
+        with tempfile.TemporaryDirectory() as out:
+            export_snapshot(out)
+            # Stamped before the last run, as a transaction that commits late would be
+            late = FeeHistory.objects.create(student=student, fee_type='tuition', amount='1.00', payment_date=date(2024, 7, 1))
+            FeeHistory.objects.filter(pk=late.pk).update(updated_at=timezone.now() - timedelta(days=1))
+            export_snapshot(out)
+            self.assertEqual(list(load_table(out, 'fees')), [late.id])
+
+
+class FeeSummaryTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user(username='admin', user_type='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        self.student = make_student('student1', class_name='10A')
+
+    def post_fee(self, amount, payment_date, fee_type='tuition'):
+        data = {'student': self.student.id, 'fee_type': fee_type, 'amount': amount, 'payment_date': payment_date}
+        return self.client.post('/api/fees/', data, format='json').data['id']
+
+    def test_writes_keep_summary_in_step_with_rebuild(self):
+        from .summaries import rebuild_fee_summary
+
+        first = self.post_fee('10.00', '2024-06-03')
+        second = self.post_fee('15.00', '2024-06-20')
+        self.post_fee('5.00', '2024-07-01', fee_type='bus')
+        self.client.put(f'/api/fees/{first}/', {'payment_date': '2024-07-02'}, format='json')
+        self.client.delete(f'/api/fees/{second}/?confirm=true')
+
+        live = self.client.get('/api/fees/summary/').data
+        self.assertEqual(
+            [(row['fee_type'], row['month'], row['total'], row['count']) for row in live],
+            [('bus', '2024-07', '5.00', 1), ('tuition', '2024-07', '10.00', 1)],
+        )
+        self.assertFalse(FeeSummary.objects.filter(month=date(2024, 6, 1)).exists())
+        rebuild_fee_summary()
+        self.assertEqual(self.client.get('/api/fees/summary/').data, live)
+
+
+    def summary(self):
+        return list(FeeSummary.objects.order_by('class_name', 'fee_type').values_list('class_name', 'fee_type', 'total', 'count'))
+
+    def test_class_changes_and_deletes_keep_summary_in_step_with_rebuild(self):
+        from django.contrib import admin
+        from .summaries import rebuild_fee_summary
+
+        self.post_fee('100.00', '2024-06-03')
+        second = self.post_fee('50.00', '2024-06-04', fee_type='bus')
+        self.student.class_name = '11A'
+        admin.site._registry[Student].save_model(None, self.student, mock.Mock(changed_data=['class_name']), True)
+        self.client.delete(f'/api/fees/{second}/?confirm=true')
+        self.assertEqual(self.summary(), [('11A', 'tuition', Decimal('100.00'), 1)])
+        rebuild_fee_summary()
+        self.assertEqual(self.summary(), [('11A', 'tuition', Decimal('100.00'), 1)])
+
+        other = make_student('student2', class_name='11A')
+        self.student, first_student = other, self.student
+        self.post_fee('30.00', '2024-06-05')
+        self.client.delete(f'/api/students/{first_student.pk}/?confirm=true')
+        self.assertEqual(self.summary(), [('11A', 'tuition', Decimal('30.00'), 1)])
+        self.client.delete(f'/api/delete-users/{other.user_id}/?confirm=true')
+        self.assertEqual(self.summary(), [])
+        rebuild_fee_summary()
+        self.assertEqual(self.summary(), [])
+
+
+class ListingCacheTests(TestCase):
+    def setUp(self):
+        listing_cache().clear()
+        self.admin = User.objects.create_user(username='admin', user_type='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_hits_until_a_write_bumps_the_version(self):
+        self.assertEqual(self.client.get('/api/students/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/students/')['X-Cache'], 'HIT')
+
+        data = {'username': 'new', 'password': 'pw', 'user_type': 'student',
+                'student': {'name': 'New', 'roll_number': '1', 'class_name': '10A'}}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/students/', data, format='json')
+        response = self.client.get('/api/students/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data), 1)
+
+    def test_counter_writes_only_invalidate_listings_that_use_counters(self):
+        student = make_student('student1')
+        urls = {'/api/students/?fields=name,class_name': 'HIT', '/api/students/': 'MISS', '/api/students/?ordering=active_loans&fields=name': 'MISS'}
+        for url in urls:
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/api/library/', {'student': student.pk, 'book_name': 'Book', 'borrow_date': '2024-07-01', 'return_date': '2024-07-15'}, format='json',
+            )
+        for url, outcome in urls.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url)['X-Cache'], outcome)
+        self.assertEqual(self.client.get('/api/students/').data[0]['active_loans'], 1)
+
+    def test_refused_roles_are_not_served_from_cache(self):
+        self.client.get('/api/students/')
+        student = make_student('student1')
+        self.client.force_authenticate(student.user)
+        self.assertEqual(self.client.get('/api/students/').status_code, 403)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user(username='admin', user_type='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        self.student = make_student('student1')
+        self.record = LibraryHistory.objects.create(
+            student=self.student, book_name='Book', borrow_date=date(2024, 6, 1), return_date=date(2024, 6, 15),
+        )
+
+    def test_matching_etag_returns_304_without_serializing(self):
+        etag = self.client.get('/api/library/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/library/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.record.status = 'returned'
+        self.record.save()
+        self.assertEqual(self.client.get('/api/library/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_delete_is_not_hidden_by_if_modified_since(self):
+        LibraryHistory.objects.create(
+            student=self.student, book_name='Other', borrow_date=date(2024, 6, 2), return_date=date(2024, 6, 16),
+        )
+        response = self.client.get('/api/library/')
+        self.assertNotIn('Last-Modified', response)
+        etag, since = response['ETag'], 'Fri, 01 Jan 2100 00:00:00 GMT'
+        self.record.delete()
+        response = self.client.get('/api/library/', HTTP_IF_NONE_MATCH=etag, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/library/', HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+    def test_fee_etag_follows_joined_student_name(self):
+        from .cache import bump_version
+
+        FeeHistory.objects.create(student=self.student, fee_type='tuition', amount=100, payment_date=date(2024, 6, 1))
+        etag, amounts_etag = self.client.get('/api/fees/')['ETag'], self.client.get('/api/fees/?fields=amount')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.filter(pk=self.student.pk).update(name='Renamed')
+            bump_version('student')
+        response = self.client.get('/api/fees/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data[0]['student_name']), (200, 'Renamed'))
+        self.assertEqual(self.client.get('/api/fees/?fields=amount', HTTP_IF_NONE_MATCH=amounts_etag).status_code, 304)
+
+    def test_etag_depends_on_query_and_caller(self):
+        etag = self.client.get('/api/library/')['ETag']
+        self.assertNotEqual(self.client.get('/api/library/?status=borrowed')['ETag'], etag)
+        self.client.force_authenticate(self.student.user)
+        self.assertNotEqual(self.client.get('/api/library/')['ETag'], etag)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class StatelessJWTTests(TestCase):
+    def setUp(self):
+        from .authentication import StatelessJWTAuthentication
+        from .views import ManageLibrary, RevokeToken
+
+        for view in (ManageLibrary, RevokeToken):
+            patcher = mock.patch.object(view, 'authentication_classes', [StatelessJWTAuthentication])
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        caches['default'].clear()
+        self.student = make_student('student1')
+        self.student.user.set_password('pw')
+        self.student.user.save()
+        self.client = APIClient()
+        self.tokens = self.client.post('/api/token/', {'username': 'student1', 'password': 'pw'}, format='json').data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+
+    def test_requests_skip_the_user_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/library/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries.captured_queries if 'FROM "app_user"' in q['sql']])
+
+        response = self.client.post(
+            '/api/library/', {'book_name': 'Book', 'borrow_date': '2024-06-01', 'return_date': '2024-06-15'}, format='json',
+        )
+        self.assertEqual(response.data['student'], self.student.id)
+
+    def test_revoked_token_is_rejected(self):
+        self.assertEqual(self.client.post('/api/token/revoke/').status_code, 200)
+        self.assertEqual(self.client.get('/api/library/').status_code, 401)
+
+    def test_signing_in_right_after_a_revocation_works(self):
+        from .authentication import revoke_user_tokens
+
+        revoke_user_tokens(self.student.user_id)
+        self.assertEqual(self.client.get('/api/library/').status_code, 401)
+        tokens = self.client.post('/api/token/', {'username': 'student1', 'password': 'pw'}, format='json').data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get('/api/library/').status_code, 200)
+        # Access tokens minted later from a refresh token issued before the revocation stay denied
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken(self.tokens['refresh']).access_token}")
+        self.assertEqual(self.client.get('/api/library/').status_code, 401)
+
+
+class RowScopingTests(TestCase):
+    def setUp(self):
+        self.owner = make_student('student1')
+        self.other = make_student('student2')
+        self.record = FeeHistory.objects.create(
+            student=self.owner, fee_type='tuition', amount=100, payment_date=date(2024, 6, 1),
+        )
+        self.client = APIClient()
+
+    def test_other_students_records_are_not_found_in_one_query(self):
+        self.client.force_authenticate(self.other.user)
+        for method in (self.client.get, self.client.put, self.client.delete):
+            with self.subTest(method=method.__name__), self.assertNumQueries(1):
+                self.assertEqual(method(f'/api/fees/{self.record.id}/').status_code, 404)
+
+    def test_owner_detail_is_one_query(self):
+        self.client.force_authenticate(self.owner.user)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/fees/{self.record.id}/')
+        self.assertEqual(response.data['student_name'], 'Student1')
+
+
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        from .authentication import ClaimsTokenObtainPairSerializer
+
+        self.student = make_student('student1')
+        other = make_student('student2')
+        for owner in (self.student, other):
+            FeeHistory.objects.create(student=owner, fee_type='tuition', amount=100, payment_date=date(2024, 6, 1))
+        token = ClaimsTokenObtainPairSerializer.get_token(self.student.user).access_token
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    async def test_matches_sync_view_output(self):
+        response = await self.async_client.get('/api/async/fees/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+        sync_client = APIClient()
+        sync_client.credentials(HTTP_AUTHORIZATION=self.headers['Authorization'])
+        expected = await sync_to_async(lambda: sync_client.get('/api/fees/').content)()
+        self.assertEqual(response.json(), json.loads(expected))
+
+    async def test_student_lists_match_sync_view(self):
+        from .authentication import ClaimsTokenObtainPairSerializer
+        from .counters import recount_students
+
+        def setup():
+            FeeHistory.objects.create(student=Student.objects.get(name='Student2'), fee_type='bus', amount=80, payment_date=date(2024, 6, 2))
+            recount_students()
+            admin = User.objects.create_user(username='admin', user_type='admin')
+            return ClaimsTokenObtainPairSerializer.get_token(admin).access_token
+
+        headers = {'Authorization': f'Bearer {await sync_to_async(setup)()}'}
+        sync_client = APIClient()
+        sync_client.credentials(HTTP_AUTHORIZATION=headers['Authorization'])
+        for query in ['ordering=-fees_paid', 'fees_paid_min=150&format=columnar', 'ordering=-fees_paid&format=ndjson']:
+            with self.subTest(query=query):
+                response = await self.async_client.get(f'/api/async/students/?{query}', headers=headers)
+                content = b''.join([chunk async for chunk in response]) if response.streaming else response.content
+                expected = await sync_to_async(lambda: sync_client.get(f'/api/students/?{query}'))()
+                self.assertEqual(response['Content-Type'], expected['Content-Type'])
+                expected = await sync_to_async(lambda: expected.getvalue())()
+                parse = (lambda body: body.decode().splitlines()) if 'ndjson' in query else json.loads
+                self.assertEqual(parse(content), parse(expected))
+        page = await self.async_client.get('/api/async/students/?ordering=-fees_paid&page_size=1', headers=headers)
+        self.assertEqual([row['name'] for row in page.json()['results']], ['Student2'])
+        response = await self.async_client.get('/api/async/students/?ordering=name', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    async def test_role_and_auth_checks(self):
+        response = await self.async_client.get('/api/async/students/', headers=self.headers)
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.get('/api/async/fees/')
+        self.assertEqual(response.status_code, 401)
+
+
+class ReplicaRouterTests(TestCase):
+    def test_only_reads_inside_replica_reads_are_routed(self):
+        from .replica import ReplicaRouter, replica_reads
+
+        router = ReplicaRouter()
+        with mock.patch('app.replica.replica_configured', return_value=True):
+            self.assertIsNone(router.db_for_read(Student))
+            with replica_reads():
+                self.assertEqual(router.db_for_read(Student), 'replica')
+                self.assertEqual(router.db_for_write(Student), 'default')
+            self.assertIsNone(router.db_for_read(Student))
+
+    def test_reads_stay_on_default_without_a_replica(self):
+        from .replica import replica_reads
+
+        with replica_reads():
+            self.assertEqual(Student.objects.all().db, 'default')
+
+    def test_cache_fills_read_the_primary_until_the_replica_catches_up(self):
+        from .cache import bump_version, cache_response, replica_refreshed
+        from rest_framework.response import Response
+        from .replica import ReplicaRouter, read_from_replica
+
+        listing_cache().clear()
+        routed = []
+
+        class View:
+            @cache_response('student')
+            @read_from_replica
+            def get(self, request):
+                routed.append(ReplicaRouter().db_for_read(Student) or 'default')
+                return Response([])
+
+        request = mock.Mock(user=mock.Mock(user_type='admin'), accepted_renderer=None)
+        request.get_full_path.side_effect = lambda: f'/api/students/?page={len(routed)}'
+        with mock.patch('app.replica.replica_configured', return_value=True), \
+                mock.patch('app.cache.replica_configured', return_value=True):
+            replica_refreshed(time.time())
+            View().get(request)
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_version('student')
+            View().get(request)
+            replica_refreshed(time.time())
+            View().get(request)
+        self.assertEqual(routed, ['replica', 'default', 'replica'])
+
+    def test_refresh_requires_a_replica(self):
+        from django.core.management import CommandError, call_command
+
+        with self.assertRaises(CommandError):
+            call_command('refresh_replica')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SeedAndBenchmarkTests(TestCase):
+    def test_seed_is_deterministic(self):
+        from .seeding import seed_data
+
+        counts = seed_data(students=20, library=30, fees=40, staff=1, prefix='a', seed=7, batch_size=8)
+        self.assertEqual(counts, {'users': 23, 'students': 20, 'library': 30, 'fees': 40})
+        first = list(FeeHistory.objects.order_by('id').values_list('fee_type', 'amount', 'payment_date'))
+        self.assertEqual(FeeSummary.objects.aggregate(n=Sum('count'))['n'], 40)
+        self.assertTrue(self.client.login(username='a_student_0', password='password'))
+
+        FeeHistory.objects.all().delete()
+        seed_data(students=20, library=30, fees=40, staff=1, prefix='b', seed=7, batch_size=8)
+        again = list(FeeHistory.objects.order_by('id').values_list('fee_type', 'amount', 'payment_date'))
+        self.assertEqual(first, again)
+
+    def test_benchmark_covers_every_get_route_per_role(self):
+        from .benchmarks import ROLES, routes, run_benchmarks
+        from .seeding import seed_data
+
+        seed_data(students=5, library=10, fees=10, staff=1)
+        report = run_benchmarks(iterations=1, warmup=0)
+        self.assertEqual(len(report['results']), len(routes()) * len(ROLES))
+        self.assertNotIn('/api/delete-users/<int:pk>/', {template for template, _ in routes()})
+        result = report['results']['student GET /api/fees/<int:pk>/']
+        self.assertEqual(result['status'], 200)
+        self.assertGreater(result['queries'], 0)
+        self.assertEqual(report['results']['librarian GET /api/fees/']['status'], 403)
+
+
+@override_settings(
+    MIDDLEWARE=['app.instrumentation.PerformanceMiddleware', *settings.MIDDLEWARE],
+    PERF_SAMPLE_RATE=1,
+)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        from .instrumentation import reset_route_stats
+
+        reset_route_stats()
+        self.admin = User.objects.create(username='admin', user_type='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_server_timing_and_route_histogram(self):
+        student = make_student('student1')
+        FeeHistory.objects.create(student=student, fee_type='tuition', amount=100, payment_date=date(2024, 6, 1))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/fees/')
+        query_count = len(queries)
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn(f'"{query_count} queries"', timing)
+        for phase in ('auth;dur=', 'serialize;dur=', 'total;dur='):
+            self.assertIn(phase, timing)
+
+        stats = self.client.get('/api/perf/stats/').json()
+        fees = stats['routes']['GET /api/fees/']
+        self.assertEqual(fees['samples'], 1)
+        self.assertEqual(fees['mean_queries'], query_count)
+        self.assertEqual(sum(fees['histogram'].values()), 1)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_untouched(self):
+        response = self.client.get('/api/fees/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_server_timing_only_for_staff_or_debug(self):
+        self.client.force_authenticate(make_student('student1').user)
+        response = self.client.get('/api/fees/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+        with override_settings(DEBUG=True):
+            self.assertIn('total;dur=', self.client.get('/api/fees/')['Server-Timing'])
+        self.client.force_authenticate(None)
+        self.assertNotIn('Server-Timing', self.client.get('/api/fees/'))
+
+    def test_stats_are_admin_only(self):
+        self.client.force_authenticate(make_student('student1').user)
+        self.assertEqual(self.client.get('/api/perf/stats/').status_code, 403)
+
+
+class OverdueTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.ann, self.bob = make_student('ann'), make_student('bob')
+        self.late = self.loan(self.ann, -10)
+        self.later = self.loan(self.ann, -3)
+        self.loan(self.ann, -30, status='returned')
+        self.loan(self.bob, -1)
+        self.loan(self.bob, 5)
+
+    def loan(self, student, due_in_days, status='borrowed'):
+        due = self.today + timedelta(days=due_in_days)
+        return LibraryHistory.objects.create(
+            student=student, book_name='Book', borrow_date=due - timedelta(days=14), return_date=due, status=status,
+        )
+
+    def test_sweep_flags_in_two_updates(self):
+        from .overdue import sweep_overdue
+
+        LibraryHistory.objects.filter(pk=self.late.pk).update(status='overdue')
+        LibraryHistory.objects.filter(pk=self.later.pk).update(status='overdue', return_date=self.today + timedelta(days=7))
+        before = LibraryHistory.objects.get(pk=self.later.pk).updated_at
+
+        with self.assertNumQueries(2):
+            self.assertEqual(sweep_overdue(self.today), (1, 1))
+        self.assertEqual(LibraryHistory.objects.filter(status='overdue').count(), 2)
+        later = LibraryHistory.objects.get(pk=self.later.pk)
+        self.assertEqual(later.status, 'borrowed')
+        self.assertGreater(later.updated_at, before)
+
+    def test_lookup_uses_status_return_index(self):
+        from .overdue import overdue_q
+
+        plan = LibraryHistory.objects.filter(overdue_q(self.today)).explain()
+        self.assertIn('library_status_return_idx', plan)
+
+    def test_endpoint_summarises_per_student(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='lib', user_type='librarian'))
+        with self.assertNumQueries(1):
+            data = client.get('/api/library/overdue/').json()
+        self.assertEqual((data['students'], data['overdue']), (2, 3))
+        ann = data['results'][0]
+        self.assertEqual((ann['student'], ann['overdue'], ann['days_overdue']), (self.ann.pk, 2, 10))
+
+        client.force_authenticate(self.bob.user)
+        data = client.get('/api/library/overdue/').json()
+        self.assertEqual([row['student'] for row in data['results']], [self.bob.pk])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.ann = make_student('ann', class_name='9B')
+        self.ann.name = 'Annabel Lee'
+        self.ann.save()
+        self.bob = make_student('bob')
+        self.algebra = LibraryHistory.objects.create(
+            student=self.bob, book_name='Applied Algebra', borrow_date=date(2024, 6, 1), return_date=date(2024, 6, 15),
+        )
+        LibraryHistory.objects.create(
+            student=self.ann, book_name='Modern Physics', borrow_date=date(2024, 6, 1), return_date=date(2024, 6, 15),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='lib', user_type='librarian'))
+
+    def test_prefix_search_follows_writes(self):
+        data = self.client.get('/api/search/', {'q': 'annab'}).json()
+        self.assertEqual([row['id'] for row in data['students']], [self.ann.pk])
+        self.assertEqual([row['id'] for row in data['books']], [])
+
+        Student.objects.filter(pk=self.ann.pk).update(name='Anna Smith')
+        self.assertEqual(self.client.get('/api/search/', {'q': 'annab'}).json()['students'], [])
+        self.algebra.delete()
+        self.assertEqual(self.client.get('/api/search/', {'q': 'alg', 'type': 'books'}).json(), {'books': []})
+
+    def test_books_and_bad_requests(self):
+        data = self.client.get('/api/search/', {'q': 'alg', 'type': 'books'}).json()
+        self.assertEqual([row['id'] for row in data['books']], [self.algebra.pk])
+        self.assertEqual(self.client.get('/api/search/', {'q': ' '}).status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'a', 'type': 'fees'}).status_code, 400)
+        self.client.force_authenticate(self.bob.user)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'alg'}).status_code, 403)
+
+    def test_books_of_students_marked_for_purging_are_hidden(self):
+        from .purge import mark_deleted
+
+        self.addCleanup(caches['default'].clear)
+        mark_deleted(Student.objects.filter(pk=self.bob.pk))
+        self.assertEqual(self.client.get('/api/search/', {'q': 'alg', 'type': 'books'}).json(), {'books': []})
+        with mock.patch('app.search.fts_available', return_value=False):
+            self.assertEqual(self.client.get('/api/search/', {'q': 'alg', 'type': 'books'}).json(), {'books': []})
+        data = self.client.get('/api/search/', {'q': 'phys', 'type': 'books', 'limit': 1}).json()
+        self.assertEqual([row['book_name'] for row in data['books']], ['Modern Physics'])
+
+    def test_limit_must_be_positive(self):
+        for limit in ('0', '-1'):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.client.get('/api/search/', {'q': 'alg', 'limit': limit}).status_code, 400)
+        with mock.patch('app.search.fts_available', return_value=False):
+            self.assertEqual(self.client.get('/api/search/', {'q': 'alg', 'limit': '-1'}).status_code, 400)
+
+    def test_admin_search_uses_index(self):
+        admin_user = User.objects.create_superuser(username='root', password=None, user_type='admin')
+        self.client.force_login(admin_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/app/libraryhistory/', {'q': 'annab'})
+        self.assertContains(response, 'Modern Physics')
+        self.assertNotContains(response, 'Applied Algebra')
+        self.assertTrue(any('app_student_fts' in query['sql'] for query in queries.captured_queries))
+        self.assertFalse(any('LIKE' in query['sql'] for query in queries.captured_queries))
+
+    def test_migrate_puts_back_dropped_triggers(self):
+        from django.core.management.sql import emit_post_migrate_signal
+
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER app_student_fts_update')
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        Student.objects.filter(pk=self.ann.pk).update(name='Anna Smith')
+        self.assertEqual(self.client.get('/api/search/', {'q': 'annab'}).json()['students'], [])
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.student = make_student('ann')
+        LibraryHistory.objects.create(
+            student=self.student, book_name='Book', borrow_date=date(2024, 6, 1), return_date=date(2024, 6, 15),
+        )
+        FeeHistory.objects.create(student=self.student, fee_type='tuition', amount=Decimal('99.5'), payment_date=date(2024, 6, 1))
+        FeeHistory.objects.create(
+            student=self.student, fee_type='exam', amount=Decimal('120.00'), payment_date=date(2024, 6, 2), remarks='Late',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', user_type='admin'))
+
+    def test_values_listing_matches_serializer(self):
+        from rest_framework.renderers import JSONRenderer
+
+        from .fieldsets import ValuesListing
+        from .serializers import FeeHistorySerializer, LibrarySerializer, StudentSerializer
+
+        renderer = JSONRenderer()
+        for serializer_class, queryset in [
+            (StudentSerializer, Student.objects.order_by('id')),
+            (LibrarySerializer, LibraryHistory.objects.order_by('id')),
+            (FeeHistorySerializer, FeeHistory.objects.order_by('id')),
+        ]:
+            for zone in ['UTC', 'Asia/Kolkata']:
+                with self.subTest(serializer=serializer_class.__name__, zone=zone), timezone.override(zone):
+                    listing = ValuesListing(serializer_class)
+                    self.assertEqual(
+                        renderer.render(listing.represent(listing.queryset(queryset))),
+                        renderer.render(serializer_class(queryset, many=True).data),
+                    )
+
+    def test_fields_limit_columns_and_keys(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.client.get('/api/fees/', {'fields': 'amount,student_name'}).json()
+        self.assertEqual(rows[0], {'student_name': 'Ann', 'amount': '99.50'})
+        select = next(query['sql'] for query in queries.captured_queries if 'app_feehistory' in query['sql'])
+        self.assertNotIn('remarks', select)
+
+        detail = self.client.get(f'/api/students/{self.student.pk}/', {'fields': 'name'}).json()
+        self.assertEqual(detail, {'name': 'Ann'})
+        self.assertEqual(self.client.get('/api/fees/', {'fields': 'amount,password'}).status_code, 400)
+
+    def test_pagination_without_cursor_fields(self):
+        url, seen = '/api/fees/?page_size=1&fields=fee_type', []
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(data['results'])
+            url = data['next']
+        self.assertEqual(seen, [{'fee_type': 'tuition'}, {'fee_type': 'exam'}])
+
+
+class BulkFeePostingTests(TestCase):
+    def setUp(self):
+        self.ann, self.bob = make_student('ann', class_name='9B'), make_student('bob')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='office', user_type='office_staff'))
+
+    def test_batch_inserts_valid_rows_and_reports_the_rest(self):
+        from .summaries import rebuild_fee_summary
+
+        rows = [
+            {'student': student.pk, 'fee_type': 'tuition', 'amount': '100.00', 'payment_date': f'2024-06-{day:02}'}
+            for day in range(1, 29) for student in (self.ann, self.bob)
+        ]
+        rows += [{'student': 9999, 'fee_type': 'tuition', 'amount': '1', 'payment_date': '2024-06-01'}, {'amount': 'x'}, 'row']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/fees/bulk/', rows, format='json')
+        query_count = len(queries)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (56, 3))
+        self.assertIn('student', response.data['results'][56]['errors'])
+        self.assertEqual(FeeHistory.objects.filter(pk=response.data['results'][0]['id']).get().student, self.ann)
+        # Student lookup, the insert and the summary writes for two groups, not a query per row
+        self.assertLess(query_count, 20)
+        live = list(FeeSummary.objects.order_by('class_name').values_list('class_name', 'total', 'count'))
+        self.assertEqual(live, [('10A', Decimal('2800.00'), 28), ('9B', Decimal('2800.00'), 28)])
+        rebuild_fee_summary()
+        self.assertEqual(list(FeeSummary.objects.order_by('class_name').values_list('class_name', 'total', 'count')), live)
+
+    def test_students_post_for_themselves(self):
+        self.client.force_authenticate(self.ann.user)
+        rows = [{'student': self.bob.pk, 'fee_type': 'exam', 'amount': '20.00', 'payment_date': '2024-06-01'}]
+        self.assertEqual(self.client.post('/api/fees/bulk/', rows, format='json').status_code, 201)
+        self.assertEqual(list(FeeHistory.objects.values_list('student', flat=True)), [self.ann.pk])
+        self.assertEqual(self.client.post('/api/fees/bulk/', rows[0], format='json').status_code, 400)
+
+        self.client.force_authenticate(User.objects.create_user(username='lib', user_type='librarian'))
+        self.assertEqual(self.client.post('/api/fees/bulk/', rows, format='json').status_code, 403)
+
+
+class StudentPurgeTests(TestCase):
+    def setUp(self):
+        # Purging revokes tokens; user ids are reused by later tests
+        self.addCleanup(caches['default'].clear)
+        self.ann, self.bob, self.cy = make_student('ann', '12A'), make_student('bob', '12A'), make_student('cy', '11A')
+        for student in (self.ann, self.bob, self.cy):
+            for day in range(1, 8):
+                FeeHistory.objects.create(student=student, fee_type='tuition', amount=10, payment_date=date(2024, 6, day))
+                LibraryHistory.objects.create(
+                    student=student, book_name='Book', borrow_date=date(2024, 6, day), return_date=date(2024, 6, 20),
+                )
+        from .summaries import rebuild_fee_summary
+        rebuild_fee_summary()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', user_type='admin'))
+
+    def test_background_delete_hides_then_purges_in_chunks(self):
+        from .purge import purge_deleted_students
+
+        response = self.client.delete(f'/api/students/{self.ann.pk}/?purge=background')
+        self.assertTrue(response.data['confirm_url'].endswith('?confirm=true&purge=background'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/students/{self.ann.pk}/?confirm=true&purge=background')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(f'/api/students/{self.ann.pk}/').status_code, 404)
+        self.assertFalse(User.objects.get(pk=self.ann.user_id).is_active)
+        self.assertEqual(FeeHistory.objects.filter(student=self.ann).count(), 7)
+
+        with CaptureQueriesContext(connection) as queries:
+            counts = purge_deleted_students(chunk_size=3)
+        self.assertEqual(counts, {'fees': 7, 'library': 7, 'students': 1})
+        deletes = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('DELETE FROM "app_feehistory" WHERE id IN')]
+        self.assertEqual(len(deletes), 3)
+        self.assertFalse(Student.all_objects.filter(pk=self.ann.pk).exists())
+        self.assertFalse(User.objects.filter(pk=self.ann.user_id).exists())
+        self.assertEqual(LibraryHistory.objects.count(), 14)
+        self.assertEqual(FeeSummary.objects.get(class_name='12A', fee_type='tuition').count, 7)
+
+    def test_marked_students_records_are_hidden_from_staff(self):
+        from .purge import mark_deleted
+
+        fee = FeeHistory.objects.filter(student=self.ann).first()
+        loan = LibraryHistory.objects.filter(student=self.ann).first()
+        mark_deleted(Student.objects.filter(pk=self.ann.pk))
+        for url in ['/api/fees/', '/api/library/']:
+            with self.subTest(url=url):
+                self.assertEqual(len(self.client.get(url).data), 14)
+        self.assertEqual(self.client.get(f'/api/fees/{fee.pk}/').status_code, 404)
+        self.assertEqual(self.client.put(f'/api/fees/{fee.pk}/', {'amount': 1}, format='json').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/library/{loan.pk}/').status_code, 404)
+
+    def test_graduate_class(self):
+        from .purge import purge_deleted_students
+        from .summaries import rebuild_fee_summary
+
+        self.assertEqual(self.client.post('/api/students/graduate/', {'class_name': '12A'}, format='json').data['students'], 2)
+        self.assertEqual([row['class_name'] for row in self.client.get('/api/students/').data], ['11A'])
+        self.assertEqual(self.client.post('/api/students/graduate/', {'class_name': '12A'}, format='json').status_code, 404)
+
+        purge_deleted_students()
+        live = list(FeeSummary.objects.values_list('class_name', 'total', 'count'))
+        self.assertEqual(live, [('11A', Decimal('70.00'), 7)])
+        rebuild_fee_summary()
+        self.assertEqual(list(FeeSummary.objects.values_list('class_name', 'total', 'count')), live)
+        self.assertEqual(FeeHistory.objects.count(), 7)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        from .summaries import rebuild_fee_summary
+
+        self.ann, self.bob = make_student('ann'), make_student('bob')
+        for student in (self.ann, self.bob):
+            for year in (2022, 2023, 2024):
+                FeeHistory.objects.create(student=student, fee_type='tuition', amount=100, payment_date=date(year, 7, 1))
+                LibraryHistory.objects.create(
+                    student=student, book_name='Book', borrow_date=date(year, 7, 1), return_date=date(year, 7, 15),
+                    status='returned' if year < 2024 else 'borrowed',
+                )
+        self.addCleanup(caches['default'].clear)
+        # A loan from a closed year still out stays hot
+        self.open_loan = LibraryHistory.objects.create(
+            student=self.ann, book_name='Lost', borrow_date=date(2022, 8, 1), return_date=date(2022, 8, 15),
+        )
+        rebuild_fee_summary()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', user_type='admin'))
+
+    def archive(self):
+        from .archive import archive_closed_years
+
+        return archive_closed_years(date(2024, 6, 1), batch_size=3)
+
+    def test_moves_closed_years_and_keeps_summary(self):
+        summary = list(FeeSummary.objects.order_by('month').values_list('month', 'total', 'count'))
+        self.assertEqual(self.archive(), {'fees': 4, 'library': 4})
+        self.assertEqual(FeeHistory.objects.count(), 2)
+        self.assertEqual(FeeHistoryArchive.objects.count(), 4)
+        self.assertTrue(LibraryHistory.objects.filter(pk=self.open_loan.pk).exists())
+        self.assertEqual(list(FeeSummary.objects.order_by('month').values_list('month', 'total', 'count')), summary)
+
+        from .summaries import rebuild_fee_summary
+        rebuild_fee_summary()
+        self.assertEqual(list(FeeSummary.objects.order_by('month').values_list('month', 'total', 'count')), summary)
+
+    def test_lists_read_archive_on_request(self):
+        before = self.client.get('/api/fees/').json()
+        self.archive()
+        self.assertEqual(len(self.client.get('/api/fees/').json()), 2)
+        self.assertEqual(
+            sorted(self.client.get('/api/fees/?include_archive=true').json(), key=lambda row: row['id']), before,
+        )
+
+        url, seen = '/api/library/?include_archive=true&page_size=2', []
+        while url:
+            data = self.client.get(url).json()
+            seen.extend((row['borrow_date'], row['id']) for row in data['results'])
+            url = data['next']
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), 7)
+
+        archived = FeeHistoryArchive.objects.first()
+        self.assertEqual(self.client.get(f'/api/fees/{archived.pk}/').status_code, 404)
+        detail = self.client.get(f'/api/fees/{archived.pk}/?include_archive=true').json()
+        self.assertEqual((detail['id'], detail['student_name']), (archived.pk, archived.student.name))
+
+        self.client.force_authenticate(self.bob.user)
+        rows = self.client.get('/api/library/?include_archive=true').json()
+        self.assertEqual({row['student'] for row in rows}, {self.bob.pk})
+        self.assertEqual(len(rows), 3)
+
+    def test_purge_covers_archive(self):
+        from .purge import mark_deleted, purge_deleted_students
+
+        self.archive()
+        mark_deleted(Student.objects.filter(pk=self.ann.pk))
+        self.assertEqual(purge_deleted_students(), {'fees': 3, 'library': 4, 'students': 1})
+        self.assertFalse(FeeHistoryArchive.objects.filter(student_id=self.ann.pk).exists())
+        self.assertEqual(sum(FeeSummary.objects.values_list('count', flat=True)), 3)
+
+
+class ListFormatTests(TestCase):
+    def setUp(self):
+        for n in range(6):
+            student = make_student(f'student{n}', class_name='10A' if n % 2 else '9B')
+            FeeHistory.objects.create(
+                student=student, fee_type='tuition' if n % 3 else 'exam', amount=Decimal('12.50'), payment_date=date(2024, 6, n + 1),
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', user_type='admin'))
+
+    def decode_columns(self, document):
+        columns = {
+            field: [document['dictionaries'][field][code] for code in values] if field in document['dictionaries'] else values
+            for field, values in document['columns'].items()
+        }
+        return [dict(zip(document['fields'], values)) for values in zip(*(columns[field] for field in document['fields']))]
+
+    def test_ndjson_streams_the_same_rows(self):
+        expected = self.client.get('/api/fees/').json()
+        response = self.client.get('/api/fees/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+        response = self.client.get('/api/fees/?format=ndjson&page_size=4')
+        self.assertEqual(len(response.content.decode().splitlines()), 4)
+        self.assertIn('rel="next"', response['Link'])
+
+    def test_columnar_encodes_repeated_strings(self):
+        for url in ['/api/fees/', '/api/students/', '/api/fees/?page_size=4']:
+            with self.subTest(url=url):
+                expected = self.client.get(url).json()
+                document = self.client.get(url, HTTP_ACCEPT='application/vnd.columnar+json').json()
+                if 'results' in expected:
+                    self.assertEqual(document['next_cursor'], expected['next_cursor'])
+                    expected = expected['results']
+                self.assertEqual(self.decode_columns(document), expected)
+
+        document = self.client.get('/api/students/?format=columnar').json()
+        self.assertEqual(document['dictionaries'], {'class_name': ['9B', '10A'], 'fees_paid': ['0.00']})
+        document = self.client.get('/api/fees/?format=columnar').json()
+        self.assertEqual(sorted(document['dictionaries']), ['amount', 'fee_type'])
+
+
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+        self.ann, self.bob = make_student('ann'), make_student('bob')
+        self.fee = FeeHistory.objects.create(student=self.ann, fee_type='tuition', amount=100, payment_date=date(2024, 7, 1))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', user_type='admin'))
+
+    def changes(self, resource, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = self.client.get(f'/api/{resource}/changes/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_writes_and_deletes_since_a_sequence(self):
+        head = self.changes('fees')['next_since']
+        self.assertEqual(self.changes('fees', head)['results'], [])
+
+        created = self.client.post('/api/fees/', {'student': self.bob.pk, 'fee_type': 'bus', 'amount': '20.00', 'payment_date': '2024-07-02'}, format='json').data
+        self.client.post('/api/fees/bulk/', [{'student': self.bob.pk, 'fee_type': 'lab', 'amount': '5', 'payment_date': '2024-07-03'}], format='json')
+        self.client.put(f'/api/fees/{self.fee.pk}/', {'amount': '120.00'}, format='json')
+        self.client.delete(f'/api/fees/{created["id"]}/?confirm=true')
+
+        page = self.changes('fees', head)
+        self.assertEqual([(row['fee_type'], row['amount']) for row in page['results']], [('lab', '5.00'), ('tuition', '120.00')])
+        self.assertEqual(page['deleted'], [created['id']])
+        self.assertFalse(page['has_more'])
+        self.assertEqual(self.changes('fees', page['next_since']), {**page, 'since': page['next_since'], 'results': [], 'deleted': []})
+
+        first = self.changes('fees', head, limit=2)
+        rest = self.changes('fees', first['next_since'])
+        self.assertTrue(first['has_more'])
+        self.assertEqual((first['results'][0]['fee_type'], rest['results'][0]['fee_type'], rest['deleted']), ('lab', 'tuition', [created['id']]))
+        self.assertEqual(self.changes('fees', head, fields='amount')['results'][0], {'id': page['results'][0]['id'], 'amount': '5.00'})
+        self.assertEqual(self.client.get('/api/fees/changes/', {'since': 'x'}).status_code, 400)
+
+    def test_students_only_see_their_own_records(self):
+        head = self.changes('fees')['next_since']
+        FeeHistory.objects.create(student=self.bob, fee_type='bus', amount=20, payment_date=date(2024, 7, 2))
+        self.client.put(f'/api/fees/{self.fee.pk}/', {'student': self.bob.pk}, format='json')
+
+        self.client.force_authenticate(self.ann.user)
+        with CaptureQueriesContext(connection) as queries:
+            page = self.changes('fees', head)
+        self.assertEqual((page['results'], page['deleted']), ([], [self.fee.pk]))
+        self.assertEqual(len(queries), 3)  # student id, oldest kept entry, log entries; no rows left to load
+        self.assertEqual(self.client.get('/api/students/changes/').status_code, 403)
+
+    def test_sweeps_purges_and_archiving(self):
+        from .archive import archive_closed_years
+        from .overdue import sweep_overdue
+        from .purge import mark_deleted, purge_deleted_students
+
+        loan = LibraryHistory.objects.create(student=self.bob, book_name='Book', borrow_date=date(2024, 6, 1), return_date=date(2024, 6, 15))
+        heads = {resource: self.changes(resource)['next_since'] for resource in ('students', 'library', 'fees')}
+        sweep_overdue(date(2024, 7, 1))
+        self.assertEqual([row['status'] for row in self.changes('library', heads['library'])['results']], ['overdue'])
+
+        # A changed row moved to the archive is not a deletion
+        FeeHistory.objects.filter(pk=self.fee.pk).update(amount=110)
+        archive_closed_years(date(2025, 6, 1))
+        self.assertEqual(self.changes('fees', heads['fees'])['deleted'], [])
+        self.assertEqual(FeeHistoryArchive.objects.count(), 1)
+
+        mark_deleted(Student.objects.filter(pk=self.bob.pk))
+        self.assertEqual(self.changes('students', heads['students'])['deleted'], [self.bob.pk])
+        purge_deleted_students()
+        self.assertEqual(self.changes('library', heads['library'])['deleted'], [loan.pk])
+        self.assertEqual(self.changes('students', heads['students'])['deleted'], [self.bob.pk])
+
+
+    def test_pruned_changes_are_gone(self):
+        from .changes import prune_change_log
+
+        head = self.changes('fees')['next_since']
+        for amount in (1, 2, 3):
+            FeeHistory.objects.filter(pk=self.fee.pk).update(amount=amount)
+        self.assertEqual(prune_change_log(keep=2), head + 1)
+        response = self.client.get('/api/fees/changes/', {'since': head})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(self.changes('fees', head + 1)['results'][0]['amount'], '3.00')
+        self.assertEqual(prune_change_log(keep=0), 1)  # the newest entry stays
+
+class DashboardTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+        # Fee totals cover the academic year running on 2024-09-01
+        patcher = mock.patch('app.dashboard.current_year_start', return_value=date(2024, 6, 1))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ann = make_student('ann')
+        self.client = APIClient()
+        self.client.force_authenticate(self.ann.user)
+        self.day = 0
+
+    def add_history(self, count=3):
+        for _ in range(count):
+            self.day += 1
+            FeeHistory.objects.create(student=self.ann, fee_type='tuition', amount=100, payment_date=date(2024, 7, self.day))
+            LibraryHistory.objects.create(
+                student=self.ann, book_name=f'Book {self.day}', borrow_date=date(2024, 7, self.day), return_date=date(2024, 8, self.day),
+            )
+
+    def test_constant_queries_and_totals(self):
+        self.add_history()
+        FeeHistory.objects.create(student=self.ann, fee_type='bus', amount=20, payment_date=date(2024, 6, 1))
+        FeeHistory.objects.create(student=self.ann, fee_type='bus', amount=20, payment_date=date(2024, 5, 31))
+        LibraryHistory.objects.create(student=self.ann, book_name='Old', borrow_date=date(2024, 6, 1), return_date=date(2024, 6, 5), status='returned')
+        self.assertQueryBudget(lambda: self.client.get('/api/me/dashboard/'), self.add_history)
+
+        from .counters import recount_students
+        recount_students([self.ann.pk])
+
+        with override_settings(DASHBOARD_RECENT_PAYMENTS=2):
+            listing_cache().clear()
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get('/api/me/dashboard/').data
+        self.assertEqual(len(queries), 6)  # student id, version, profile, loans, payments, totals
+        self.assertEqual(data['profile'], {
+            'id': self.ann.pk, 'name': 'Ann', 'roll_number': 'ann', 'class_name': '10A',
+            'active_loans': 6, 'fees_paid': '640.00', 'last_payment_date': '2024-07-06',
+        })
+        self.assertEqual([loan['book_name'] for loan in data['borrowed']][:2], ['Book 1', 'Book 2'])
+        self.assertEqual(len(data['borrowed']), 6)
+        self.assertEqual([payment['payment_date'] for payment in data['recent_payments']], ['2024-07-06', '2024-07-05'])
+        self.assertEqual(data['recent_payments'][0]['student_name'], 'Ann')
+        self.assertEqual(data['fee_totals'], {
+            'total': '620.00', 'count': 7,
+            'by_type': [{'fee_type': 'bus', 'total': '20.00', 'count': 1}, {'fee_type': 'tuition', 'total': '600.00', 'count': 6}],
+        })
+
+    def test_cached_until_a_write(self):
+        from .overdue import sweep_overdue
+
+        self.add_history(1)
+        self.assertEqual(self.client.get('/api/me/dashboard/')['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/me/dashboard/')['X-Cache'], 'HIT')
+        self.assertEqual(len(queries), 2)
+
+        self.client.post('/api/fees/', {'fee_type': 'lab', 'amount': '5.00', 'payment_date': '2024-07-09'}, format='json')
+        response = self.client.get('/api/me/dashboard/')
+        self.assertEqual((response['X-Cache'], response.data['fee_totals']['count']), ('MISS', 2))
+
+        sweep_overdue(date(2024, 9, 1))
+        response = self.client.get('/api/me/dashboard/')
+        self.assertEqual((response['X-Cache'], response.data['overdue']), ('MISS', 1))
+
+        # Another student's writes leave the entry alone
+        FeeHistory.objects.create(student=make_student('bob'), fee_type='bus', amount=20, payment_date=date(2024, 7, 1))
+        self.assertEqual(self.client.get('/api/me/dashboard/')['X-Cache'], 'HIT')
+
+        self.client.force_authenticate(User.objects.create_user(username='staff', user_type='office_staff'))
+        self.assertEqual(self.client.get('/api/me/dashboard/').status_code, 403)
+
+
+class StudentCounterTests(TestCase):
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+        self.ann, self.bob = make_student('ann'), make_student('bob')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', user_type='admin'))
+
+    def counters(self, student):
+        student.refresh_from_db()
+        return student.active_loans, student.fees_paid, student.last_payment_date
+
+    def post_fee(self, student, amount, day):
+        return self.client.post(
+            '/api/fees/', {'student': student.pk, 'fee_type': 'tuition', 'amount': amount, 'payment_date': f'2024-07-{day:02}'}, format='json',
+        ).data['id']
+
+    def test_writes_keep_counters_in_step(self):
+        from .archive import archive_closed_years
+        from .counters import check_student_counters
+
+        loan = self.client.post(
+            '/api/library/', {'student': self.ann.pk, 'book_name': 'Book', 'borrow_date': '2024-07-01', 'return_date': '2024-07-15'}, format='json',
+        ).data['id']
+        first, second = self.post_fee(self.ann, '100.00', 1), self.post_fee(self.ann, '50.00', 9)
+        self.client.post('/api/fees/bulk/', [
+            {'student': self.ann.pk, 'fee_type': 'bus', 'amount': '5', 'payment_date': '2024-07-03'},
+            {'student': self.bob.pk, 'fee_type': 'bus', 'amount': '5', 'payment_date': '2024-07-04'},
+        ], format='json')
+        self.assertEqual(self.counters(self.ann), (1, Decimal('155.00'), date(2024, 7, 9)))
+        self.assertEqual(self.counters(self.bob), (0, Decimal('5.00'), date(2024, 7, 4)))
+
+        self.client.put(f'/api/library/{loan}/', {'status': 'returned'}, format='json')
+        self.client.put(f'/api/fees/{first}/', {'amount': '80.00'}, format='json')
+        self.client.delete(f'/api/fees/{second}/?confirm=true')
+        self.assertEqual(self.counters(self.ann), (0, Decimal('85.00'), date(2024, 7, 3)))
+        self.client.put(f'/api/fees/{first}/', {'student': self.bob.pk, 'payment_date': '2024-07-10'}, format='json')
+        self.assertEqual(self.counters(self.ann), (0, Decimal('5.00'), date(2024, 7, 3)))
+        self.assertEqual(self.counters(self.bob), (0, Decimal('85.00'), date(2024, 7, 10)))
+
+        archive_closed_years(date(2024, 7, 5))
+        self.assertEqual(self.counters(self.ann), (0, Decimal('0.00'), date(2024, 7, 3)))
+        self.assertEqual(self.counters(self.bob), (0, Decimal('80.00'), date(2024, 7, 10)))
+        self.assertEqual(check_student_counters(), [])
+
+    def test_list_filters_and_sorts_without_joins(self):
+        cy = make_student('cy')
+        for student, amount in ((self.ann, '30.00'), (self.bob, '10.00'), (cy, '20.00')):
+            self.post_fee(student, amount, 1)
+        LibraryHistory.objects.create(student=self.bob, book_name='Book', borrow_date=date(2024, 7, 1), return_date=date(2024, 7, 15))
+
+        with CaptureQueriesContext(connection) as queries:
+            names = [row['name'] for row in self.client.get('/api/students/?ordering=-fees_paid&fees_paid_min=15').data]
+        self.assertEqual(names, ['Ann', 'Cy'])
+        self.assertNotIn('JOIN', queries.captured_queries[-1]['sql'])
+
+        page = self.client.get('/api/students/?ordering=-fees_paid&page_size=2').data
+        rest = self.client.get(f"/api/students/?ordering=-fees_paid&page_size=2&cursor={page['next_cursor']}").data
+        self.assertEqual([row['name'] for row in page['results'] + rest['results']], ['Ann', 'Cy', 'Bob'])
+        self.assertEqual(self.client.get('/api/students/?ordering=name').status_code, 400)
+        self.assertEqual(self.client.get('/api/students/?active_loans_min=x').status_code, 400)
+
+        # Drift (an ORM write that skips app.counters) is reported, then repaired
+        self.assertEqual([row['name'] for row in self.client.get('/api/students/?active_loans_min=1').data], [])
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        with self.assertRaises(CommandError):
+            call_command('check_student_counters', stdout=mock.Mock())
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('check_student_counters', repair=True, stdout=mock.Mock())
+        self.assertEqual([row['name'] for row in self.client.get('/api/students/?active_loans_min=1').data], ['Bob'])
+        call_command('check_student_counters', stdout=mock.Mock())
+
+
+class BackgroundJobTests(TestCase):
+    def setUp(self):
+        # Purging revokes tokens; user ids are reused by later tests
+        self.addCleanup(caches['default'].clear)
+        self.ann, self.bob = make_student('ann', '12A'), make_student('bob', '11A')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='office', user_type='office_staff'))
+
+    def test_bulk_import_returns_202_and_runs_in_a_worker(self):
+        from .jobs import drain
+
+        rows = [
+            {'student': self.ann.pk, 'fee_type': 'tuition', 'amount': '100.00', 'payment_date': '2024-06-01'},
+            {'student': 9999, 'fee_type': 'tuition', 'amount': '1', 'payment_date': '2024-06-01'},
+        ]
+        response = self.client.post('/api/fees/bulk/?background=true', rows, format='json')
+        self.assertEqual(response.status_code, 202)
+        job = response.data['job']
+        self.assertTrue(response['Location'].endswith(f"/api/jobs/{job['id']}/"))
+        self.assertEqual((job['kind'], job['status']), ('post_fees', 'queued'))
+        self.assertFalse(FeeHistory.objects.exists())
+
+        self.assertEqual(drain(), 1)
+        progress = self.client.get(f"/api/jobs/{job['id']}/progress/").data
+        self.assertEqual((progress['status'], progress['progress'], progress['total'], progress['percent']), ('succeeded', 2, 2, 100))
+        result = self.client.get(f"/api/jobs/{job['id']}/").data['result']
+        self.assertEqual((result['created'], result['failed']), (1, 1))
+        self.assertEqual(self.ann.fee_records.get().amount, Decimal('100.00'))
+        self.assertEqual([row['id'] for row in self.client.get('/api/jobs/?status=succeeded').data], [job['id']])
+
+        self.client.force_authenticate(self.ann.user)
+        self.assertEqual(self.client.get(f"/api/jobs/{job['id']}/").status_code, 404)
+        self.assertEqual(self.client.get('/api/jobs/').data, [])
+
+    def test_jobs_of_token_users(self):
+        from .authentication import StatelessJWTAuthentication
+        from .views import BulkPostFees, JobProgress, ManageJobs
+
+        for view in (BulkPostFees, ManageJobs, JobProgress):
+            patcher = mock.patch.object(view, 'authentication_classes', [StatelessJWTAuthentication])
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.ann.user.set_password('pw')
+        self.ann.user.save()
+        client = APIClient()
+        access = client.post('/api/token/', {'username': 'ann', 'password': 'pw'}, format='json').data['access']
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        rows = [{'fee_type': 'tuition', 'amount': '10.00', 'payment_date': '2024-06-01'}]
+        response = client.post('/api/fees/bulk/?background=true', rows, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Job.objects.get().created_by_id, self.ann.user_id)
+        self.assertEqual([job['id'] for job in client.get('/api/jobs/').data], [response.data['job']['id']])
+        self.assertEqual(client.get(f"/api/jobs/{response.data['job']['id']}/progress/").status_code, 200)
+
+    def test_background_provisioning_stores_no_plaintext_passwords(self):
+        from .jobs import drain
+
+        self.client.force_authenticate(User.objects.create_user(username='admin', user_type='admin'))
+        rows = [{'username': 'cy', 'password': 's3cret-pw', 'user_type': 'student', 'class_name': '9A', 'roll_number': '1'}]
+        response = self.client.post('/api/students/bulk/?background=true', rows, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertNotIn('s3cret-pw', json.dumps(Job.objects.get().params))
+
+        drain()
+        self.assertEqual(Job.objects.get().result['created'], 1)
+        self.assertTrue(User.objects.get(username='cy').check_password('s3cret-pw'))
+
+    def test_graduation_purge_is_one_job(self):
+        from .jobs import drain
+
+        self.client.force_authenticate(User.objects.create_user(username='admin', user_type='admin'))
+        first = self.client.post('/api/students/graduate/', {'class_name': '12A'}, format='json')
+        second = self.client.post('/api/students/graduate/', {'class_name': '11A'}, format='json')
+        self.assertEqual((first.status_code, first.data['students']), (202, 1))
+        self.assertEqual(first.data['job']['id'], second.data['job']['id'])
+
+        drain()
+        job = self.client.get(f"/api/jobs/{first.data['job']['id']}/").data
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['result']['students'], 2)
+        self.assertFalse(Student.all_objects.exists())
+
+    @override_settings(JOB_RETRY_DELAY=0)
+    def test_retries_cancellation_and_stale_workers(self):
+        from .jobs import KINDS, JobKind, cancel, drain, enqueue, recover_stale_jobs
+
+        def flaky(context, fail=0, cancel_midway=False):
+            if context.job.attempts <= fail:
+                raise RuntimeError('database is locked')
+            if cancel_midway:
+                cancel(context.job)
+                context.progress(1, 2)
+            return 'done'
+
+        user = User.objects.get(username='office')
+        with mock.patch.dict(KINDS, flaky=JobKind('flaky', flaky, max_attempts=2)):
+            retried = enqueue('flaky', {'fail': 1}, user=user)
+            failed = enqueue('flaky', {'fail': 2}, user=user)
+            with self.assertLogs('app.jobs', 'ERROR'):
+                drain()
+            retried.refresh_from_db()
+            failed.refresh_from_db()
+            self.assertEqual((retried.status, retried.attempts, retried.result), ('succeeded', 2, 'done'))
+            self.assertEqual((failed.status, failed.attempts, failed.error), ('failed', 2, 'RuntimeError: database is locked'))
+            self.assertEqual(self.client.post(f'/api/jobs/{failed.pk}/retry/').data['status'], 'queued')
+
+            queued = enqueue('flaky', user=user)
+            self.assertEqual(self.client.post(f'/api/jobs/{queued.pk}/cancel/').data['status'], 'cancelled')
+            self.assertEqual(self.client.post(f'/api/jobs/{queued.pk}/cancel/').status_code, 409)
+            self.client.post(f'/api/jobs/{failed.pk}/cancel/')
+
+            stopped = enqueue('flaky', {'cancel_midway': True}, user=user)
+            drain()
+            stopped.refresh_from_db()
+            self.assertEqual((stopped.status, stopped.progress, stopped.total), ('cancelled', 1, 2))
+
+        stale = enqueue('purge_students', user=user)
+        Job.objects.filter(pk=stale.pk).update(status='running', attempts=1, heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(recover_stale_jobs(), 1)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'queued')
+        self.assertIn('stopped responding', stale.error)
@@ -1,16 +1,40 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView
-from . import views  
+from . import async_views, views
 
 urlpatterns = [
     path('token/', TokenObtainPairView.as_view(), name='token'),
+    path('token/revoke/', views.RevokeToken.as_view(), name='token_revoke'),
     path('add-users/', views.ManageUsers.as_view(), name='manage_users'),
     path('delete-users/<int:pk>/', views.ManageUsers.as_view(), name='manage_users'),
     path('students/', views.ManageStudents.as_view(), name='manage_students'),
     path('students/<int:pk>/', views.ManageStudents.as_view(), name='manage_student_detail'),
+    path('students/changes/', views.ListChanges.as_view(resource='students'), name='student_changes'),
+    path('students/graduate/', views.GraduateClass.as_view(), name='graduate_class'),
+    path('students/bulk/', views.BulkProvisionStudents.as_view(), name='bulk_provision_students'),
     path('library/', views.ManageLibrary.as_view(), name='manage_library'),
+    path('library/changes/', views.ListChanges.as_view(resource='library'), name='library_changes'),
+    path('library/overdue/', views.LibraryOverdue.as_view(), name='library_overdue'),
     path('library/<int:pk>/', views.ManageLibrary.as_view(), name='manage_library_details'),
     path('fees/', views.ManageFees.as_view(), name='manage_fees'),
+    path('fees/bulk/', views.BulkPostFees.as_view(), name='bulk_post_fees'),
+    path('fees/changes/', views.ListChanges.as_view(resource='fees'), name='fee_changes'),
+    path('fees/summary/', views.FeeSummaryReport.as_view(), name='fee_summary'),
     path('fees/<int:pk>/', views.ManageFees.as_view(), name='manage_fees_details'),
-
+    # Async read-only mirrors of the list/detail GETs, for ASGI deployments
+    path('async/students/', async_views.AsyncStudentsView.as_view(), name='async_students'),
+    path('async/students/<int:pk>/', async_views.AsyncStudentsView.as_view(), name='async_student_detail'),
+    path('async/library/', async_views.AsyncLibraryView.as_view(), name='async_library'),
+    path('async/library/<int:pk>/', async_views.AsyncLibraryView.as_view(), name='async_library_details'),
+    path('async/fees/', async_views.AsyncFeesView.as_view(), name='async_fees'),
+    path('async/fees/<int:pk>/', async_views.AsyncFeesView.as_view(), name='async_fees_details'),
+    path('jobs/', views.ManageJobs.as_view(), name='jobs'),
+    path('jobs/<int:pk>/', views.ManageJobs.as_view(), name='job_detail'),
+    path('jobs/<int:pk>/progress/', views.JobProgress.as_view(), name='job_progress'),
+    path('jobs/<int:pk>/cancel/', views.JobAction.as_view(action='cancel'), name='job_cancel'),
+    path('jobs/<int:pk>/retry/', views.JobAction.as_view(action='retry'), name='job_retry'),
+    path('me/dashboard/', views.MyDashboard.as_view(), name='my_dashboard'),
+    path('search/', views.Search.as_view(), name='search'),
+    path('cache/stats/', views.ListingCacheStats.as_view(), name='listing_cache_stats'),
+    path('perf/stats/', views.PerformanceStats.as_view(), name='performance_stats'),
 ]
@@ -1,16 +1,61 @@
+from django.conf import settings
+from django.db import router, transaction
 from django.urls import reverse
-from rest_framework.views import APIView
+from django.utils import timezone
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import  FeeHistory, LibraryHistory, Student, User
-from rest_framework.exceptions import NotFound,PermissionDenied
-from .serializers import FeeHistorySerializer, StudentSerializer, UserSerializer,LibrarySerializer
+from .models import  FeeHistory, FeeSummary, Job, LibraryHistory, Student, User
+from rest_framework.exceptions import NotFound,ParseError,PermissionDenied
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .serializers import (
+    FeeHistorySerializer, FeeSummarySerializer, JobSerializer, JobStatusSerializer, StudentSerializer, UserSerializer,
+    LibrarySerializer,
+)
+from .archive import record_sources
+from .authentication import revoke_token, revoke_user_tokens, student_id_for
+from .cache import bump_version, cache_response, cache_stats
+from .changes import FEEDS as CHANGE_FEEDS, change_page
+from .conditional import joined_versions, not_modified_response
+from .counters import (
+    COUNTERS_VERSION, counter_state, student_fee_changed, student_fee_removed, student_fees_added,
+    student_loan_added, student_loan_changed, student_loan_removed, uses_counters,
+)
+from .dashboard import student_dashboard
+from .fieldsets import ValuesListing, requested_fields
+from .filters import filter_records, filter_students
+from .instrumentation import InstrumentedAPIView, route_stats
+from .jobs import cancel as cancel_job, enqueue, retry as retry_job, visible_jobs
+from .overdue import overdue_summary
+from .pagination import KeysetPagination
+from .parsers import CSVParser
+from .renderers import LIST_RENDERERS, listing_response
+from .replica import read_from_replica
+from .scoping import visible_records
+from .search import INDEXES as SEARCH_INDEXES, search
+from .purge import mark_deleted
+from .provisioning import hash_row_passwords, parse_csv, parse_json, post_fees, provision_users
+from .summaries import fee_added, fee_changed, fee_removed, fee_summary_key, students_deleted
 from rest_framework import status
 
 
-class ManageUsers(APIView):
+def job_accepted(request, job, **data):
+    """202 for work handed to a background job, with the job's status and its URL in `Location`."""
+    location = request.build_absolute_uri(reverse('job_detail', kwargs={'pk': job.pk}))
+    return Response({**data, 'job': JobStatusSerializer(job).data}, status=status.HTTP_202_ACCEPTED, headers={'Location': location})
+
+
+def run_in_background(request):
+    return request.query_params.get('background', '').lower() == 'true'
+
+
+class ManageUsers(InstrumentedAPIView):
     permission_classes = [IsAuthenticated]
 
+    @cache_response('user')
+    @read_from_replica
     def get(self, request):
         if not request.user.is_authenticated:
             return Response({'error': 'Authentication credentials were not provided'}, status=status.HTTP_401_UNAUTHORIZED)
@@ -18,7 +63,10 @@ class ManageUsers(APIView):
         if request.user.user_type != 'admin':
             return Response({'error': 'only admin can get the details of users'}, status=status.HTTP_403_FORBIDDEN)
 
-        users = User.objects.all()
+        users = filter_records(User.objects.all(), request.query_params, 'date_joined__date', fields=['user_type'])
+        paginator = KeysetPagination(('date_joined', 'id'), results_key='users')
+        if paginator.is_requested(request):
+            users = paginator.paginate_queryset(users, request)
         user_data = [
             {
                 'id': user.id,
@@ -28,6 +76,8 @@ class ManageUsers(APIView):
             }
             for user in users
         ]
+        if paginator.is_requested(request):
+            return paginator.get_paginated_response(user_data)
         return Response({'users': user_data}, status=status.HTTP_200_OK)
 
 
@@ -37,6 +87,7 @@ class ManageUsers(APIView):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
+            bump_version('user', 'student')
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -47,6 +98,8 @@ class ManageUsers(APIView):
         serializer = UserSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            bump_version('user', 'student')
+            revoke_user_tokens(user.pk)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -64,28 +117,41 @@ class ManageUsers(APIView):
                 },
                 status=status.HTTP_200_OK
             )
-        user.delete()
+        with transaction.atomic():
+            # The student profile and its fees go by cascade
+            students_deleted(Student.all_objects.filter(user=user).values_list('pk', flat=True))
+            user.delete()
+        bump_version('user', 'student')
+        revoke_user_tokens(pk)
         return Response({'message': 'Deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
 
 
-class ManageStudents(APIView):
+class ManageStudents(InstrumentedAPIView):
     permission_classes = [IsAuthenticated]  
+    renderer_classes = LIST_RENDERERS
     
+    @cache_response('student', depends_on={COUNTERS_VERSION: uses_counters})
+    @read_from_replica
     def get(self, request, pk=None):
         if request.user.user_type not in ['office_staff', 'librarian', 'admin']:
             raise PermissionDenied("You do not have permission to view student details.")
 
+        fields = requested_fields(request, StudentSerializer)
         if pk:
             try:
                 student = Student.objects.get(pk=pk)  
-                serializer = StudentSerializer(student)  
+                serializer = StudentSerializer(student, fields=fields)  
                 return Response(serializer.data, status=200)
             except Student.DoesNotExist:
                 raise NotFound("Student not found.")
         else:
-            students = Student.objects.all()  
-            serializer = StudentSerializer(students, many=True) 
-            return Response(serializer.data, status=200)
+            students, ordering = filter_students(Student.objects.all(), request.query_params)
+            listing = ValuesListing(StudentSerializer, fields)
+            paginator = KeysetPagination(ordering)
+            if paginator.is_requested(request):
+                page = paginator.paginate_queryset(listing.queryset(students, ordering), request)
+                return paginator.get_paginated_response(listing.represent(page))
+            return listing_response(request, listing, [students])
     
     def post(self, request):
         if request.user.user_type != 'admin':
@@ -94,6 +160,7 @@ class ManageStudents(APIView):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
+            bump_version('student', 'user')
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -109,6 +176,7 @@ class ManageStudents(APIView):
         serializer = UserSerializer(student, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            bump_version('student', 'user')
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -117,10 +185,13 @@ class ManageStudents(APIView):
             return Response({"detail": "Only admins can delete student details."}, status=403)
         
         try:
-            student = Student.objects.get(pk=pk)
+            student = Student.objects.select_related('user').get(pk=pk)
             confirm = request.query_params.get('confirm', 'false').lower()
+            background = request.query_params.get('purge', '').lower() == 'background'
             if confirm != 'true':
                 confirm_url = request.build_absolute_uri(reverse('manage_student_detail', kwargs={'pk': pk})) + '?confirm=true'
+                if background:
+                    confirm_url += '&purge=background'
                 return Response(
                 {
                     'message': f'Are you sure you want to delete the student "{student.user.username}"?',
@@ -128,55 +199,121 @@ class ManageStudents(APIView):
                 },
                 status=status.HTTP_200_OK
             )
+            if background:
+                # Hidden at once; a purge job removes the records in chunks
+                mark_deleted(Student.objects.filter(pk=student.pk))
+                return job_accepted(request, enqueue('purge_students', user=request.user), detail="Student scheduled for deletion.")
             user = student.user
-            student.delete() 
-            user.delete()  
+            with transaction.atomic():
+                students_deleted([student.pk])
+                student.delete()
+                user.delete()
+            bump_version('student', 'user')
+            revoke_user_tokens(user.pk)
             return Response({"detail": "Student deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
         except Student.DoesNotExist:
             raise NotFound(detail="Student not found")
-        
 
 
+class GraduateClass(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
 
+    def post(self, request):
+        if request.user.user_type != 'admin':
+            return Response({"detail": "Only admins can delete student details."}, status=403)
+        class_name = request.data.get('class_name')
+        if not isinstance(class_name, str) or not class_name.strip():
+            raise ParseError('Expected a "class_name".')
+        marked = mark_deleted(Student.objects.filter(class_name=class_name.strip()))
+        if not marked:
+            raise NotFound("No students in this class.")
+        return job_accepted(request, enqueue('purge_students', user=request.user), class_name=class_name.strip(), students=marked)
 
-class ManageLibrary(APIView):
+
+class BulkProvisionStudents(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, CSVParser, MultiPartParser]
+
+    def post(self, request):
+        if request.user.user_type != 'admin':
+            return Response({"detail": "Only admins can add student details."}, status=403)
+
+        rows = request.data
+        if 'file' in request.FILES:
+            upload = request.FILES['file']
+            try:
+                text = upload.read().decode('utf-8-sig')
+                rows = parse_csv(text) if upload.name.lower().endswith('.csv') else parse_json(text)
+            except (UnicodeDecodeError, ValueError) as exc:
+                raise ParseError(f'Could not read uploaded file - {exc}')
+
+        if not isinstance(rows, list):
+            raise ParseError('Expected a JSON array, a text/csv body or a "file" upload.')
+        max_rows = getattr(settings, 'BULK_PROVISION_MAX_ROWS', 10000)
+        if len(rows) > max_rows:
+            raise ParseError(f'At most {max_rows} rows can be provisioned per request.')
+        if run_in_background(request):
+            # The job's params stay in the database: never store plaintext passwords there
+            params = {'rows': hash_row_passwords(rows), 'hashed': True}
+            return job_accepted(request, enqueue('provision_students', params, user=request.user))
+
+        results = provision_users(rows)
+        created = sum(1 for result in results if result['status'] == 'created')
+        return Response(
+            {'created': created, 'failed': len(results) - created, 'results': results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
+
+
+
+
+
+class ManageLibrary(InstrumentedAPIView):
     permission_classes = [IsAuthenticated]  # Ensure the user is authenticated
+    renderer_classes = LIST_RENDERERS
     
+    @read_from_replica
     def get(self, request, pk=None):
         if request.user.user_type not in ['student', 'office_staff', 'librarian', 'admin']:
             raise PermissionDenied("You do not have permission to view library records.")
         
+        fields = requested_fields(request, LibrarySerializer)
         if pk:
-            try:
-                record = LibraryHistory.objects.get(pk=pk)
-                if request.user.user_type == 'student' and record.student.user != request.user:
-                    raise PermissionDenied("You can only view your own library records.")
-                serializer = LibrarySerializer(record)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            except LibraryHistory.DoesNotExist:
-                raise NotFound("Library record not found.")
+            for records in record_sources(request, LibraryHistory, lambda model: visible_records(model, request.user)):
+                record = records.filter(pk=pk).first()
+                if record is not None:
+                    serializer = LibrarySerializer(record, fields=fields)
+                    return Response(serializer.data, status=status.HTTP_200_OK)
+            raise NotFound("Library record not found.")
         else:
-            if request.user.user_type == 'student':
-                records = LibraryHistory.objects.filter(student__user=request.user)
-            else:
-                records = LibraryHistory.objects.all()
-            serializer = LibrarySerializer(records, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            sources = record_sources(request, LibraryHistory, lambda model: filter_records(
+                visible_records(model, request.user), request.query_params, 'borrow_date', fields=['student', 'status'],
+            ))
+            not_modified, validators = not_modified_response(request, *sources)
+            if not_modified:
+                return not_modified
+            listing = ValuesListing(LibrarySerializer, fields)
+            paginator = KeysetPagination(('borrow_date', 'id'))
+            if paginator.is_requested(request):
+                page = paginator.paginate_querysets([listing.queryset(records, paginator.ordering) for records in sources], request)
+                response = paginator.get_paginated_response(listing.represent(page))
+                for header, value in validators.items():
+                    response[header] = value
+                return response
+            return listing_response(request, listing, sources, headers=validators)
     
     def post(self, request):
         if request.user.user_type not in ['student', 'admin']:
             raise PermissionDenied("You do not have permission to add library records.")
 
         if request.user.user_type == 'student':
-            try:
-                student = Student.objects.get(user=request.user)
-                request.data['student'] = student.id
-            except Student.DoesNotExist:
-                raise NotFound("Student profile not found for the current user.")
+            request.data['student'] = student_id_for(request.user)
         
         serializer = LibrarySerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                record = serializer.save()
+                student_loan_added(record)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -186,16 +323,16 @@ class ManageLibrary(APIView):
             raise PermissionDenied("You do not have permission to edit library records.")
 
         try:
-            record = LibraryHistory.objects.get(pk=pk)
+            record = visible_records(LibraryHistory, request.user).get(pk=pk)
         except LibraryHistory.DoesNotExist:
             raise NotFound("Library record not found.")
 
-        if request.user.user_type == 'student' and record.student.user != request.user:
-            raise PermissionDenied("You can only edit your own library records.")
-
+        old = counter_state(record)
         serializer = LibrarySerializer(record, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                record = serializer.save()
+                student_loan_changed(record, old)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -204,7 +341,7 @@ class ManageLibrary(APIView):
             raise PermissionDenied("You do not have permission to delete library records.")
 
         try:
-            record = LibraryHistory.objects.get(pk=pk)
+            record = visible_records(LibraryHistory, request.user).get(pk=pk)
             confirm = request.query_params.get('confirm', 'false').lower()
 
             if confirm != 'true':
@@ -217,10 +354,9 @@ class ManageLibrary(APIView):
                     status=status.HTTP_200_OK
                 )
 
-            if request.user.user_type == 'student' and record.student.user != request.user:
-                raise PermissionDenied("You can only delete your own library records.")
-
-            record.delete()
+            with transaction.atomic():
+                student_loan_removed(record)
+                record.delete()
 
             return Response({"detail": "Library record deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
@@ -230,44 +366,78 @@ class ManageLibrary(APIView):
 
 
 
-class ManageFees(APIView):
+class LibraryOverdue(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+
+    @read_from_replica
+    def get(self, request):
+        if request.user.user_type not in ['student', 'office_staff', 'librarian', 'admin']:
+            raise PermissionDenied("You do not have permission to view library records.")
+
+        today = timezone.localdate()
+        records = filter_records(visible_records(LibraryHistory, request.user), request.query_params, fields=['student'])
+        summary = overdue_summary(records, today)
+        return Response(
+            {
+                'as_of': today,
+                'students': len(summary),
+                'overdue': sum(row['overdue'] for row in summary),
+                'results': summary,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class ManageFees(InstrumentedAPIView):
     permission_classes = [IsAuthenticated]  
+    renderer_classes = LIST_RENDERERS
     
+    @read_from_replica
     def get(self, request, pk=None):
         if request.user.user_type not in ['student', 'office_staff',  'admin']:
             raise PermissionDenied("You do not have permission to view fee records.")
         
+        fields = requested_fields(request, FeeHistorySerializer)
         if pk:
-            try:
-                record = FeeHistory.objects.get(pk=pk)
-                if request.user.user_type == 'student' and record.student.user != request.user:
-                    raise PermissionDenied("You can only view your own fees records.")
-                serializer = FeeHistorySerializer(record)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            except FeeHistory.DoesNotExist:
-                raise NotFound("fee record not found.")
+            for records in record_sources(request, FeeHistory, lambda model: visible_records(model, request.user)):
+                record = records.select_related('student').filter(pk=pk).first()
+                if record is not None:
+                    serializer = FeeHistorySerializer(record, fields=fields)
+                    return Response(serializer.data, status=status.HTTP_200_OK)
+            raise NotFound("fee record not found.")
         else:
-            if request.user.user_type == 'student':
-                records = FeeHistory.objects.filter(student__user=request.user)
-            else:
-                records = FeeHistory.objects.all()
-            serializer = FeeHistorySerializer(records, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            sources = record_sources(request, FeeHistory, lambda model: filter_records(
+                visible_records(model, request.user), request.query_params, 'payment_date', fields=['student', 'fee_type'],
+            ))
+            # Renaming a student changes student_name without touching the fee rows
+            joined = joined_versions(fields, {'student_name': 'student'})
+            not_modified, validators = not_modified_response(request, *sources, versions=joined)
+            if not_modified:
+                return not_modified
+            # student_name is read through a join in the values() query
+            listing = ValuesListing(FeeHistorySerializer, fields)
+            paginator = KeysetPagination(('payment_date', 'id'))
+            if paginator.is_requested(request):
+                page = paginator.paginate_querysets([listing.queryset(records, paginator.ordering) for records in sources], request)
+                response = paginator.get_paginated_response(listing.represent(page))
+                for header, value in validators.items():
+                    response[header] = value
+                return response
+            return listing_response(request, listing, sources, headers=validators)
     
     def post(self, request):
         if request.user.user_type not in ['student', 'office_staff',  'admin']:
             raise PermissionDenied("You do not have permission to add fee records.")
 
         if request.user.user_type == 'student':
-            try:
-                student = Student.objects.get(user=request.user)
-                request.data['student'] = student.id
-            except Student.DoesNotExist:
-                raise NotFound("Student profile not found for the current user.")
+            request.data['student'] = student_id_for(request.user)
         
         serializer = FeeHistorySerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                record = serializer.save()
+                fee_added(record)
+                student_fees_added([record])
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -277,16 +447,17 @@ class ManageFees(APIView):
             raise PermissionDenied("You do not have permission to edit fee records.")
 
         try:
-            record = FeeHistory.objects.get(pk=pk)
+            record = visible_records(FeeHistory, request.user).select_related('student').get(pk=pk)
         except FeeHistory.DoesNotExist:
             raise NotFound("fee record not found.")
 
-        if request.user.user_type == 'student' and record.student.user != request.user:
-            raise PermissionDenied("You can only edit your own fee records.")
-
+        old_key, old_amount, old = fee_summary_key(record), record.amount, counter_state(record)
         serializer = FeeHistorySerializer(record, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                record = serializer.save()
+                fee_changed(record, old_key, old_amount)
+                student_fee_changed(record, old)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -295,7 +466,7 @@ class ManageFees(APIView):
             raise PermissionDenied("You do not have permission to delete fee records.")
 
         try:
-            record = FeeHistory.objects.get(pk=pk)
+            record = visible_records(FeeHistory, request.user).select_related('student__user').get(pk=pk)
             confirm = request.query_params.get('confirm', 'false').lower()
 
             if confirm != 'true':
@@ -308,13 +479,199 @@ class ManageFees(APIView):
                     status=status.HTTP_200_OK
                 )
 
-            if request.user.user_type == 'student' and record.student.user != request.user:
-                raise PermissionDenied("You can only delete your own fee records.")
-
-            record.delete()
+            with transaction.atomic():
+                fee_removed(record)
+                record.delete()
+                student_fee_removed(record)
 
             return Response({"detail": "Fee record deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
         except FeeHistory.DoesNotExist:
             raise NotFound("Fee record not found.")
         
+
+
+class BulkPostFees(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, CSVParser]
+
+    def post(self, request):
+        if request.user.user_type not in ['student', 'office_staff', 'admin']:
+            raise PermissionDenied("You do not have permission to add fee records.")
+
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ParseError('Expected a JSON array of fee records or a text/csv body.')
+        max_rows = getattr(settings, 'BULK_FEE_MAX_ROWS', 10000)
+        if len(rows) > max_rows:
+            raise ParseError(f'At most {max_rows} fee records can be posted per request.')
+
+        student_id = student_id_for(request.user) if request.user.user_type == 'student' else None
+        if run_in_background(request):
+            return job_accepted(request, enqueue('post_fees', {'rows': rows, 'student_id': student_id}, user=request.user))
+        results = post_fees(rows, student_id=student_id)
+        created = sum(1 for result in results if result['status'] == 'created')
+        return Response(
+            {'created': created, 'failed': len(results) - created, 'results': results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
+
+
+class ListChanges(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+    resource = None  # a key of app.changes.FEEDS, set in urls.py
+
+    @read_from_replica
+    def get(self, request):
+        feed = CHANGE_FEEDS[self.resource]
+        if request.user.user_type not in feed.roles:
+            raise PermissionDenied(f"You do not have permission to view {self.resource} changes.")
+
+        listing = ValuesListing(feed.serializer, requested_fields(request, feed.serializer))
+        student_id = student_id_for(request.user) if feed.owned and request.user.user_type == 'student' else None
+        page = change_page(feed, listing, request.user, request.query_params, student_id=student_id)
+        return Response(page, status=status.HTTP_200_OK)
+
+
+class FeeSummaryReport(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+
+    @read_from_replica
+    def get(self, request):
+        if request.user.user_type not in ['office_staff', 'admin']:
+            raise PermissionDenied("You do not have permission to view fee summaries.")
+
+        groups = filter_records(FeeSummary.objects.all(), request.query_params, 'month', fields=['class_name', 'fee_type'])
+        groups = groups.order_by('month', 'class_name', 'fee_type')
+        serializer = FeeSummarySerializer(groups, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class Search(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+
+    @read_from_replica
+    def get(self, request):
+        if request.user.user_type not in ['office_staff', 'librarian', 'admin']:
+            raise PermissionDenied("You do not have permission to search records.")
+
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise ParseError("Provide a search term with ?q=.")
+        kinds = request.query_params.get('type', 'students,books').split(',')
+        if not set(kinds) <= set(SEARCH_INDEXES):
+            raise ParseError(f"type must be one or more of: {', '.join(SEARCH_INDEXES)}.")
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise ParseError("limit must be an integer.")
+        if limit < 1:
+            raise ParseError("limit must be at least 1.")
+        limit = min(limit, 100)
+
+        using = router.db_for_read(Student) or 'default'
+        results = {}
+        if 'students' in kinds:
+            students = search(SEARCH_INDEXES['students'], text, limit, using)
+            results['students'] = [{'id': student.pk, **StudentSerializer(student).data} for student in students]
+        if 'books' in kinds:
+            # Loans of students marked for purging are hidden like the students
+            books = search(SEARCH_INDEXES['books'], text, limit, using, queryset=visible_records(LibraryHistory, request.user))
+            results['books'] = LibrarySerializer(books, many=True).data
+        return Response(results, status=status.HTTP_200_OK)
+
+
+class MyDashboard(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.user.user_type != 'student':
+            raise PermissionDenied("Only students have a dashboard.")
+        data, cached = student_dashboard(student_id_for(request.user))
+        return Response(data, status=status.HTTP_200_OK, headers={'X-Cache': 'HIT' if cached else 'MISS'})
+
+
+def get_job(user, pk, *deferred):
+    try:
+        return visible_jobs(user).defer(*deferred).get(pk=pk)
+    except Job.DoesNotExist:
+        raise NotFound("Job not found.")
+
+
+class ManageJobs(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk=None):
+        if pk is not None:
+            return Response(JobSerializer(get_job(request.user, pk, 'params')).data, status=status.HTTP_200_OK)
+
+        jobs = visible_jobs(request.user).defer('params', 'result')
+        jobs = filter_records(jobs, request.query_params, 'created_at__date', fields=['status', 'kind'])
+        paginator = KeysetPagination(('-id',))
+        if paginator.is_requested(request):
+            return paginator.get_paginated_response(JobStatusSerializer(paginator.paginate_queryset(jobs, request), many=True).data)
+        return Response(JobStatusSerializer(jobs.order_by('-id'), many=True).data, status=status.HTTP_200_OK)
+
+
+class JobProgress(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        return Response(JobStatusSerializer(get_job(request.user, pk, 'params', 'result')).data, status=status.HTTP_200_OK)
+
+
+class JobAction(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+    action = None  # 'cancel' or 'retry', set in urls.py
+
+    def post(self, request, pk):
+        job = get_job(request.user, pk, 'params', 'result')
+        if not (cancel_job(job) if self.action == 'cancel' else retry_job(job)):
+            verb = 'cancelled' if self.action == 'cancel' else 'retried'
+            return Response({"detail": f"A {job.status} job cannot be {verb}."}, status=status.HTTP_409_CONFLICT)
+        job = get_job(request.user, pk, 'params', 'result')
+        return Response(JobStatusSerializer(job).data, status=status.HTTP_200_OK if job.status == 'cancelled' else status.HTTP_202_ACCEPTED)
+
+
+class ListingCacheStats(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.user.user_type != 'admin':
+            raise PermissionDenied("Only admins can view cache statistics.")
+        return Response(cache_stats(), status=status.HTTP_200_OK)
+
+
+class PerformanceStats(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.user.user_type != 'admin':
+            raise PermissionDenied("Only admins can view performance statistics.")
+        return Response(route_stats(), status=status.HTTP_200_OK)
+
+
+class RevokeToken(InstrumentedAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if request.auth is not None:
+            revoke_token(request.auth)
+
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                token = RefreshToken(refresh)
+            except TokenError:
+                raise ParseError("Invalid refresh token.")
+            if token[jwt_settings.USER_ID_CLAIM] != request.user.id and request.user.user_type != 'admin':
+                raise PermissionDenied("You can only revoke your own tokens.")
+            revoke_token(token)
+
+        user_id = request.data.get('user')
+        if user_id is not None:
+            if request.user.user_type != 'admin':
+                raise PermissionDenied("Only admins can revoke another user's tokens.")
+            revoke_user_tokens(user_id)
+
+        return Response({"detail": "Token revoked."}, status=status.HTTP_200_OK)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -62,8 +63,60 @@ from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    # Adds user_type and student_id claims so requests can be authorized without a User lookup
+    'TOKEN_OBTAIN_SERIALIZER': 'app.authentication.ClaimsTokenObtainPairSerializer',
 }
 
+# To skip the per-request User SELECT, replace JWTAuthentication in
+# REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'] with
+# 'app.authentication.StatelessJWTAuthentication'. Revoked tokens are kept in
+# this cache, so use a backend shared by all workers in production.
+JWT_DENYLIST_CACHE_ALIAS = 'default'
+
+# Add 'app.instrumentation.PerformanceMiddleware' first in MIDDLEWARE to time
+# a sample of requests (db / auth / serialize / total) into a Server-Timing
+# header (staff users only, unless DEBUG) and per-route histograms at
+# /api/perf/stats/ (admins only). The histograms live in each worker process.
+PERF_SAMPLE_RATE = 0.1
+PERF_WINDOW_SECONDS = 600
+
+# Cursor pagination for list endpoints (opt-in with ?page_size= or ?cursor=)
+KEYSET_PAGE_SIZE = 50
+KEYSET_MAX_PAGE_SIZE = 500
+
+# Bulk student/user provisioning (POST /api/students/bulk/, manage.py provision_students)
+# and batch fee posting (POST /api/fees/bulk/)
+BULK_PROVISION_MAX_ROWS = 10000
+BULK_INSERT_BATCH_SIZE = 500
+BULK_FEE_MAX_ROWS = 10000
+BULK_HASH_WORKERS = None  # None = one process per CPU
+BULK_HASH_MIN_PARALLEL = 16  # smaller batches are hashed in-process
+
+# Change feeds (GET /api/<students|library|fees>/changes/?since=): log entries per page
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_MAX_PAGE_SIZE = 5000
+# Log entries kept by manage.py prune_change_log (None keeps them all); older `since` values get 410
+CHANGE_FEED_RETENTION = 1_000_000
+
+# GET /api/me/dashboard/: payments listed, and how long an unchanged dashboard stays cached (seconds)
+DASHBOARD_RECENT_PAYMENTS = 10
+DASHBOARD_CACHE_TIMEOUT = 3600
+
+# Background jobs (manage.py run_jobs): seconds an idle worker thread waits between polls, between
+# progress writes of a job, before the first retry (doubled per attempt) and without a heartbeat
+# before a running job counts as abandoned; days finished jobs are kept
+JOB_POLL_INTERVAL = 1.0
+JOB_PROGRESS_INTERVAL = 1.0
+JOB_RETRY_DELAY = 30
+JOB_STALE_AFTER = 300
+JOB_RETENTION_DAYS = 7
+
+# Academic years run from this month to the month before it in the next year
+ACADEMIC_YEAR_START_MONTH = 6
+
+# Default output directory of manage.py export_snapshot
+SNAPSHOT_DIR = BASE_DIR / 'snapshots'
+
 
 AUTH_USER_MODEL = 'app.User'
 
@@ -98,6 +151,77 @@ DATABASES = {
     }
 }
 
+# DJANGO_DB_PROFILE=production switches to WAL journaling, tuned pragmas,
+# persistent connections and a read replica for list/detail GETs. The
+# replica is a copy of the primary; refresh it with `manage.py refresh_replica`
+# (e.g. from cron), and expect those reads to lag writes until the next refresh.
+DATABASE_PROFILE = os.environ.get('DJANGO_DB_PROFILE', 'development')
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # readers no longer block on the writer
+    'synchronous': 'NORMAL',  # durable at each WAL checkpoint; safe with WAL
+    'cache_size': -64000,  # KiB, i.e. 64 MB of page cache per connection
+    'mmap_size': 268435456,  # 256 MB
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,  # ms
+}
+
+if DATABASE_PROFILE == 'production':
+    def _pragmas(**overrides):
+        return ';'.join(f'PRAGMA {name}={value}' for name, value in {**SQLITE_PRAGMAS, **overrides}.items())
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': _pragmas(),
+                # Take the write lock at BEGIN so concurrent writers wait on
+                # busy_timeout instead of failing to upgrade a read lock
+                'transaction_mode': 'IMMEDIATE',
+            },
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_REPLICA_PATH', BASE_DIR / 'db.replica.sqlite3'),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': _pragmas(query_only='ON'),
+            },
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+
+DATABASE_ROUTERS = ['app.replica.ReplicaRouter']
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# LocMemCache is per process and evicts least recently used entries past
+# MAX_ENTRIES. With several worker processes, switch 'listings' to
+# django.core.cache.backends.filebased.FileBasedCache so version bumps are shared.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'listings': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'listings',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+# Cache alias used for student and user list/detail responses and student dashboards
+LISTING_CACHE_ALIAS = 'listings'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators